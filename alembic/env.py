@@ -10,9 +10,10 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Load SYNC_DATABASE_URL and Base
 from app.database import SYNC_DATABASE_URL, Base
+from app.partitions import partition_month
 
 # Import all models for 'autogenerate' support
-from app.models import User, Company, Plan, CompanySubscription, APIUsage, Invoice, AllowedDomain, NavigationLog, NavigationLogHistory, TurnLog
+from app.models import User, Company, Plan, CompanySubscription, APIUsage, APIUsageMonthly, APIUsageRollup, Invoice, AllowedDomain, NavigationLog, NavigationLogHistory, TurnLog
 
 # Alembic config object
 config = context.config
@@ -29,6 +30,10 @@ def include_object(object, name, type_, reflected, compare_to):
     # Only manage your own tables, not 'auth_*' etc.
     if type_ == "table" and name.startswith("auth_"):
         return False
+    # Monthly partitions are created and dropped by app.partitions
+    table_name = name if type_ == "table" else getattr(getattr(object, "table", None), "name", "")
+    if reflected and partition_month(table_name) is not None:
+        return False
     return True
 
 def run_migrations_offline() -> None:
@@ -0,0 +1,39 @@
+"""API usage monthly rollup for quota checks
+
+Revision ID: 3f2a9c71d5e8
+Revises: 8c1419b7e66c
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a9c71d5e8'
+down_revision: Union[str, Sequence[str], None] = '8c1419b7e66c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('api_usage_monthly',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('company_id', sa.Integer(), nullable=True),
+    sa.Column('subscription_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.TIMESTAMP(), nullable=False),
+    sa.Column('hit_count', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['company_id'], ['companies.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['subscription_id'], ['company_subscriptions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('subscription_id', 'month')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('api_usage_monthly')
@@ -0,0 +1,60 @@
+"""Geo cell columns and indexes on navigation_log_history
+
+Revision ID: 4b7e0c93f1a5
+Revises: e9f3b1a6c284
+Create Date: 2026-10-18 16:02:44.381572
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.geo_cells import encode_cell
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b7e0c93f1a5'
+down_revision: Union[str, Sequence[str], None] = 'e9f3b1a6c284'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('navigation_log_history', sa.Column('start_cell', sa.BigInteger(), nullable=True))
+    op.add_column('navigation_log_history', sa.Column('end_cell', sa.BigInteger(), nullable=True))
+
+    # Backfill and index outside the migration transaction, so the table is
+    # never locked for the whole run.
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        last_id = 0
+        while True:
+            rows = bind.execute(sa.text(
+                "SELECT id, start_lat, start_lng, end_lat, end_lng FROM navigation_log_history "
+                "WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+            if not rows:
+                break
+            bind.execute(
+                sa.text("UPDATE navigation_log_history SET start_cell = :start_cell, end_cell = :end_cell WHERE id = :id"),
+                [{"id": row[0], "start_cell": encode_cell(row[1], row[2]), "end_cell": encode_cell(row[3], row[4])}
+                 for row in rows]
+            )
+            last_id = rows[-1][0]
+
+        op.create_index('ix_navigation_log_history_user_start_cell', 'navigation_log_history',
+                        ['user_id', 'start_cell'], postgresql_concurrently=True)
+        op.create_index('ix_navigation_log_history_user_end_cell', 'navigation_log_history',
+                        ['user_id', 'end_cell'], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_navigation_log_history_user_end_cell', table_name='navigation_log_history')
+    op.drop_index('ix_navigation_log_history_user_start_cell', table_name='navigation_log_history')
+    op.drop_column('navigation_log_history', 'end_cell')
+    op.drop_column('navigation_log_history', 'start_cell')
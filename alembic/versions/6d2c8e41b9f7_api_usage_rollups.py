@@ -0,0 +1,49 @@
+"""API usage rollups with latency histograms
+
+Revision ID: 6d2c8e41b9f7
+Revises: 4b7e0c93f1a5
+Create Date: 2026-10-18 17:24:09.530816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2c8e41b9f7'
+down_revision: Union[str, Sequence[str], None] = '4b7e0c93f1a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('api_usage_rollups',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('company_id', sa.Integer(), nullable=True),
+    sa.Column('subscription_id', sa.Integer(), nullable=False),
+    sa.Column('granularity', sa.String(length=8), nullable=False),
+    sa.Column('bucket', sa.TIMESTAMP(), nullable=False),
+    sa.Column('endpoint', sa.String(length=255), nullable=False),
+    sa.Column('status_class', sa.SmallInteger(), nullable=False),
+    sa.Column('hits', sa.BigInteger(), nullable=False),
+    sa.Column('latency_sum_ms', sa.BigInteger(), nullable=False),
+    sa.Column('latency_max_ms', sa.Integer(), nullable=False),
+    sa.Column('latency_histogram', postgresql.ARRAY(sa.BigInteger()), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['company_id'], ['companies.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['subscription_id'], ['company_subscriptions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('subscription_id', 'granularity', 'bucket', 'endpoint', 'status_class')
+    )
+    op.create_index('ix_api_usage_rollups_company_granularity_bucket', 'api_usage_rollups',
+                    ['company_id', 'granularity', 'bucket'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_api_usage_rollups_company_granularity_bucket', table_name='api_usage_rollups')
+    op.drop_table('api_usage_rollups')
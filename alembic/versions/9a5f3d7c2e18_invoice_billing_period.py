@@ -0,0 +1,34 @@
+"""Billing period, hit count and overage on invoices
+
+Revision ID: 9a5f3d7c2e18
+Revises: 6d2c8e41b9f7
+Create Date: 2026-10-18 18:41:27.209453
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a5f3d7c2e18'
+down_revision: Union[str, Sequence[str], None] = '6d2c8e41b9f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('invoices', sa.Column('period', sa.TIMESTAMP(), nullable=True))
+    op.add_column('invoices', sa.Column('api_hits', sa.BigInteger(), nullable=True))
+    op.add_column('invoices', sa.Column('overage_amount', sa.Numeric(precision=10, scale=2), nullable=True))
+    op.create_unique_constraint('invoices_subscription_id_period_key', 'invoices', ['subscription_id', 'period'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('invoices_subscription_id_period_key', 'invoices', type_='unique')
+    op.drop_column('invoices', 'overage_amount')
+    op.drop_column('invoices', 'api_hits')
+    op.drop_column('invoices', 'period')
@@ -0,0 +1,60 @@
+"""Pack navigation_logs.directions into a compact binary column
+
+Revision ID: a7d4e2b9c613
+Revises: 3f2a9c71d5e8
+Create Date: 2026-10-18 11:40:03.552917
+
+"""
+from typing import Sequence, Union
+
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.directions_codec import encode_directions, decode_directions
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d4e2b9c613'
+down_revision: Union[str, Sequence[str], None] = '3f2a9c71d5e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def _convert_in_batches(select_sql: str, update_sql: str, convert) -> None:
+    """Rewrite rows in id order, BATCH_SIZE at a time, outside the migration
+    transaction so the table is never locked for the whole conversion."""
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        last_id = 0
+        while True:
+            rows = bind.execute(sa.text(select_sql), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+            if not rows:
+                break
+            bind.execute(sa.text(update_sql), [convert(row) for row in rows])
+            last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('navigation_logs', sa.Column('directions_packed', sa.LargeBinary(), nullable=True))
+    _convert_in_batches(
+        "SELECT id, directions FROM navigation_logs "
+        "WHERE id > :last_id AND directions IS NOT NULL ORDER BY id LIMIT :limit",
+        "UPDATE navigation_logs SET directions_packed = :packed, directions = NULL WHERE id = :id",
+        lambda row: {"id": row[0], "packed": encode_directions(row[1] or [])},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _convert_in_batches(
+        "SELECT id, directions_packed FROM navigation_logs "
+        "WHERE id > :last_id AND directions_packed IS NOT NULL ORDER BY id LIMIT :limit",
+        "UPDATE navigation_logs SET directions = CAST(:directions AS JSONB) WHERE id = :id",
+        lambda row: {"id": row[0], "directions": json.dumps(decode_directions(row[1])[0])},
+    )
+    op.drop_column('navigation_logs', 'directions_packed')
@@ -0,0 +1,28 @@
+"""Routing admission priority on plans
+
+Revision ID: b3e7a1c5d920
+Revises: 9a5f3d7c2e18
+Create Date: 2026-10-18 21:07:53.514306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e7a1c5d920'
+down_revision: Union[str, Sequence[str], None] = '9a5f3d7c2e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('plans', sa.Column('priority', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('plans', 'priority')
@@ -0,0 +1,132 @@
+"""Monthly range partitions for api_usages and navigation_logs
+
+Revision ID: c51e8f0a2d47
+Revises: a7d4e2b9c613
+Create Date: 2026-10-18 13:05:27.904311
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.partitions import add_months, partition_ddl, PARTITION_MONTHS_AHEAD
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c51e8f0a2d47'
+down_revision: Union[str, Sequence[str], None] = 'a7d4e2b9c613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _column_names(columns_sql: str) -> list:
+    return [column.split()[0] for column in columns_sql.split(", ")]
+
+
+def _partition(table: str, key: str, columns_sql: str, constraints_sql: str) -> None:
+    """Swap ``table`` for a copy range-partitioned by month on ``key``.
+
+    The old rows are copied into partitions covering their months, the id
+    sequence is handed over to the new table and the old one is dropped.
+    """
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+    op.execute(f"ALTER TABLE {table}_unpartitioned RENAME CONSTRAINT {table}_pkey TO {table}_unpartitioned_pkey")
+    op.execute(
+        f"CREATE TABLE {table} ({columns_sql}, "
+        f"PRIMARY KEY (id, {key}){constraints_sql}) "
+        f"PARTITION BY RANGE ({key})"
+    )
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+    first = op.get_bind().execute(sa.text(f"SELECT min({key}) FROM {table}_unpartitioned")).scalar()
+    this_month = add_months(datetime.utcnow(), 0)
+    month = add_months(first, 0) if first and first < this_month else this_month
+    while month <= add_months(this_month, PARTITION_MONTHS_AHEAD):
+        op.execute(partition_ddl(table, month))
+        month = add_months(month, 1)
+
+    columns = _column_names(columns_sql)
+    # Rows without a timestamp (possible before the column was NOT NULL)
+    # land in the current month.
+    select_list = ", ".join(f"COALESCE({c}, now())" if c == key else c for c in columns)
+    op.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"SELECT {select_list} FROM {table}_unpartitioned"
+    )
+    op.execute(f"DROP TABLE {table}_unpartitioned")
+
+
+def _unpartition(table: str, columns_sql: str, constraints_sql: str) -> None:
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_partitioned")
+    op.execute(f"ALTER TABLE {table}_partitioned RENAME CONSTRAINT {table}_pkey TO {table}_partitioned_pkey")
+    op.execute(f"CREATE TABLE {table} ({columns_sql}, PRIMARY KEY (id){constraints_sql})")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    columns = ", ".join(_column_names(columns_sql))
+    op.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_partitioned")
+    op.execute(f"DROP TABLE {table}_partitioned")
+
+
+API_USAGES_COLUMNS = (
+    "id integer NOT NULL DEFAULT nextval('api_usages_id_seq'), "
+    "company_id integer, "
+    "subscription_id integer, "
+    "endpoint varchar(255), "
+    "timestamp timestamp without time zone NOT NULL DEFAULT now(), "
+    "status_code integer, "
+    "response_time_ms integer"
+)
+API_USAGES_CONSTRAINTS = (
+    ", CONSTRAINT api_usages_company_id_fkey FOREIGN KEY (company_id) REFERENCES companies (id) ON DELETE CASCADE"
+    ", CONSTRAINT api_usages_subscription_id_fkey FOREIGN KEY (subscription_id) REFERENCES company_subscriptions (id) ON DELETE CASCADE"
+)
+NAVIGATION_LOGS_COLUMNS = (
+    "id integer NOT NULL DEFAULT nextval('navigation_logs_id_seq'), "
+    "user_id integer, "
+    "start_place varchar(255), "
+    "destination varchar(255), "
+    "start_time timestamp without time zone, "
+    "end_time timestamp without time zone, "
+    "time_taken interval, "
+    "directions jsonb, "
+    "status boolean, "
+    "message varchar(255), "
+    "error varchar(255), "
+    "created_at timestamp without time zone NOT NULL DEFAULT now(), "
+    "directions_packed bytea"
+)
+NAVIGATION_LOGS_CONSTRAINTS = (
+    ", CONSTRAINT navigation_logs_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A foreign key must reference a unique key that includes the partition
+    # column, so navigation_log_history.navigation_log_id becomes a plain
+    # (indexed) reference.
+    op.execute(
+        "ALTER TABLE navigation_log_history "
+        "DROP CONSTRAINT IF EXISTS navigation_log_history_navigation_log_id_fkey"
+    )
+    op.create_index('ix_navigation_log_history_navigation_log_id', 'navigation_log_history', ['navigation_log_id'])
+
+    _partition('api_usages', 'timestamp', API_USAGES_COLUMNS, API_USAGES_CONSTRAINTS)
+    _partition('navigation_logs', 'created_at', NAVIGATION_LOGS_COLUMNS, NAVIGATION_LOGS_CONSTRAINTS)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _unpartition('navigation_logs', NAVIGATION_LOGS_COLUMNS, NAVIGATION_LOGS_CONSTRAINTS)
+    _unpartition('api_usages', API_USAGES_COLUMNS, API_USAGES_CONSTRAINTS)
+
+    op.drop_index('ix_navigation_log_history_navigation_log_id', table_name='navigation_log_history')
+    op.execute(
+        "UPDATE navigation_log_history SET navigation_log_id = NULL "
+        "WHERE navigation_log_id NOT IN (SELECT id FROM navigation_logs)"
+    )
+    op.create_foreign_key(
+        'navigation_log_history_navigation_log_id_fkey', 'navigation_log_history', 'navigation_logs',
+        ['navigation_log_id'], ['id'], ondelete='SET NULL'
+    )
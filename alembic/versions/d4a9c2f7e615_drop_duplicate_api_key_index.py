@@ -0,0 +1,34 @@
+"""Drop the partial api_key index that duplicates the unique one
+
+Revision ID: d4a9c2f7e615
+Revises: b3e7a1c5d920
+Create Date: 2026-10-18 22:12:40.318527
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a9c2f7e615'
+down_revision: Union[str, Sequence[str], None] = 'b3e7a1c5d920'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The API key lookup loads whole subscription rows, so it is never an
+    # index-only scan; the unique index on api_key serves it as well.
+    op.drop_index('ix_company_subscriptions_active_api_key', table_name='company_subscriptions')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(
+        'ix_company_subscriptions_active_api_key', 'company_subscriptions', ['api_key'],
+        postgresql_include=['id', 'company_id', 'plan_id'],
+        postgresql_where=sa.text("status = 'active'")
+    )
@@ -0,0 +1,50 @@
+"""Composite and partial indexes for the per-request lookups
+
+Revision ID: e9f3b1a6c284
+Revises: c51e8f0a2d47
+Create Date: 2026-10-18 14:21:09.640117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9f3b1a6c284'
+down_revision: Union[str, Sequence[str], None] = 'c51e8f0a2d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # API key auth: WHERE api_key = ? AND status = 'active'
+    op.create_index(
+        'ix_company_subscriptions_active_api_key', 'company_subscriptions', ['api_key'],
+        postgresql_include=['id', 'company_id', 'plan_id'],
+        postgresql_where=sa.text("status = 'active'")
+    )
+    # Domain check: WHERE api_key = ? AND domain_name = ? AND is_active
+    op.create_index(
+        'ix_allowed_domains_active_api_key_domain', 'allowed_domains', ['api_key', 'domain_name'],
+        postgresql_where=sa.text('is_active')
+    )
+    # Quota seeding and usage reports: WHERE subscription_id = ? AND timestamp in [from, to).
+    # Created on the partitioned parent, so every partition (current and
+    # future) gets its own copy.
+    op.create_index(
+        'ix_api_usages_subscription_timestamp', 'api_usages', ['subscription_id', 'timestamp'],
+        postgresql_include=['company_id', 'status_code', 'response_time_ms']
+    )
+    # A user's recent trips: WHERE user_id = ? ORDER BY created_at DESC
+    op.create_index('ix_navigation_logs_user_created_at', 'navigation_logs', ['user_id', 'created_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_navigation_logs_user_created_at', table_name='navigation_logs')
+    op.drop_index('ix_api_usages_subscription_timestamp', table_name='api_usages')
+    op.drop_index('ix_allowed_domains_active_api_key_domain', table_name='allowed_domains')
+    op.drop_index('ix_company_subscriptions_active_api_key', table_name='company_subscriptions')
@@ -0,0 +1,206 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+
+from app.config import ROUTING_MAX_CONCURRENCY, ROUTING_MAX_QUEUE, ROUTING_MAX_WAIT
+from app.latency_histogram import LatencyHistogram
+
+# Weight of the latest call in the moving average of slot hold times
+_SERVICE_EWMA_ALPHA = 0.1
+
+
+class Overloaded(Exception):
+    """No slot could be had in time; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"Overloaded, retry after {self.retry_after}s")
+
+
+class AdmissionTicket:
+    """Handle on one caller's place in the queue, for ``promote``; can be
+    promoted before the caller has even reached ``acquire``."""
+    __slots__ = ("priority", "entry")
+
+    def __init__(self, priority: int = 0):
+        self.priority = priority
+        self.entry = None
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded, prioritised wait queue.
+
+    At most ``limit`` callers hold a slot at once. The others wait, highest
+    ``priority`` first (FIFO within a priority), for at most ``max_wait``
+    seconds. A caller is turned away with Overloaded instead of queueing
+    when the queue is full of equal or higher priority waiters (a lower
+    priority waiter is evicted to make room otherwise), or when the wait
+    expected from the queue ahead of it and the average time a slot is
+    held would already exceed ``max_wait``. A ``limit`` of 0 admits
+    everyone. A queued caller's priority can be raised with ``promote``,
+    e.g. when a more important request starts waiting on its result.
+    """
+
+    def __init__(self, limit: int, max_queue: int, max_wait: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._active = 0
+        self._waiters = []  # heap of [-priority, seq, future]
+        self._seq = itertools.count()
+        self._service_s = None
+        self._wait_ms = LatencyHistogram()
+        self._by_priority: dict = {}
+        self.queued = 0
+        self.rejected_queue_full = 0
+        self.rejected_expected_wait = 0
+        self.timed_out = 0
+        self.evicted = 0
+
+    def _counters(self, priority: int) -> dict:
+        counters = self._by_priority.get(priority)
+        if counters is None:
+            counters = self._by_priority[priority] = {"admitted": 0, "rejected": 0}
+        return counters
+
+    def _expected_wait(self, ahead: int):
+        if self._service_s is None:
+            return None
+        return (ahead + 1) / self.limit * self._service_s
+
+    def _reject(self, priority: int, retry_after: float) -> Overloaded:
+        self._counters(priority)["rejected"] += 1
+        return Overloaded(retry_after)
+
+    def _remove(self, entry):
+        try:
+            self._waiters.remove(entry)
+        except ValueError:
+            return
+        heapq.heapify(self._waiters)
+
+    async def acquire(self, priority: int = 0, max_wait: float = None, ticket: AdmissionTicket = None):
+        if ticket is not None:
+            priority = max(priority, ticket.priority)
+        if not self.limit:
+            self._counters(priority)["admitted"] += 1
+            return
+        max_wait = self.max_wait if max_wait is None else min(max_wait, self.max_wait)
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            self._counters(priority)["admitted"] += 1
+            return
+
+        ahead = sum(1 for waiter in self._waiters if -waiter[0] >= priority)
+        expected = self._expected_wait(ahead)
+        if expected is not None and expected > max_wait:
+            self.rejected_expected_wait += 1
+            raise self._reject(priority, expected)
+        if len(self._waiters) >= self.max_queue:
+            # The newest of the lowest priority waiters goes, unless that is us.
+            lowest = max(self._waiters)
+            if -lowest[0] >= priority:
+                self.rejected_queue_full += 1
+                raise self._reject(priority, expected or max_wait)
+            self._remove(lowest)
+            self.evicted += 1
+            self._counters(-lowest[0])["rejected"] += 1
+            lowest[2].set_exception(Overloaded(self._expected_wait(len(self._waiters)) or max_wait))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [-priority, next(self._seq), future]
+        heapq.heappush(self._waiters, entry)
+        if ticket is not None:
+            ticket.entry = entry
+        self.queued += 1
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait((future,), timeout=max_wait)
+        except asyncio.CancelledError:
+            self._abandon(entry)
+            raise
+        # Counted at the priority it ended up with (see promote).
+        priority = -entry[0]
+        if not future.done():
+            self._abandon(entry)
+            self.timed_out += 1
+            raise self._reject(priority, self._expected_wait(ahead) or max_wait)
+        future.result()  # raises Overloaded if evicted
+        self._wait_ms.record((time.monotonic() - queued_at) * 1000)
+        self._counters(priority)["admitted"] += 1
+
+    def promote(self, ticket: AdmissionTicket, priority: int):
+        """Raise the priority of the caller holding ``ticket`` if it is
+        still queued; no-op once it has a slot or has given up."""
+        ticket.priority = max(ticket.priority, priority)
+        entry = ticket.entry
+        if entry is None or entry[2].done() or -entry[0] >= priority:
+            return
+        entry[0] = -priority
+        heapq.heapify(self._waiters)
+
+    def _abandon(self, entry):
+        future = entry[2]
+        if future.done() and not future.cancelled() and future.exception() is None:
+            # A slot was handed over just as we gave up; pass it on.
+            self.release()
+            return
+        future.cancel()
+        self._remove(entry)
+
+    def release(self):
+        if not self.limit:
+            return
+        while self._waiters:
+            future = heapq.heappop(self._waiters)[2]
+            if not future.done():
+                future.set_result(None)  # the slot moves to the waiter
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0, max_wait: float = None, ticket: AdmissionTicket = None):
+        await self.acquire(priority, max_wait, ticket)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            held = time.monotonic() - started
+            if self._service_s is None:
+                self._service_s = held
+            else:
+                self._service_s += _SERVICE_EWMA_ALPHA * (held - self._service_s)
+            self.release()
+
+    def stats(self) -> dict:
+        def percentile(histogram, q):
+            value = histogram.percentile(q)
+            return None if value is None else round(value, 1)
+
+        return {
+            "limit": self.limit,
+            "in_flight": self._active,
+            "waiting": len(self._waiters),
+            "max_queue": self.max_queue,
+            "max_wait": self.max_wait,
+            "queued": self.queued,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_expected_wait": self.rejected_expected_wait,
+            "timed_out": self.timed_out,
+            "evicted": self.evicted,
+            "service_ms_avg": None if self._service_s is None else round(self._service_s * 1000, 1),
+            "wait_ms_p50": percentile(self._wait_ms, 50),
+            "wait_ms_p99": percentile(self._wait_ms, 99),
+            "by_priority": {str(p): dict(c) for p, c in sorted(self._by_priority.items(), reverse=True)},
+        }
+
+
+# Route and matrix calls to the routing engine
+routing_admission = AdmissionController(
+    limit=ROUTING_MAX_CONCURRENCY,
+    max_queue=ROUTING_MAX_QUEUE,
+    max_wait=ROUTING_MAX_WAIT,
+)
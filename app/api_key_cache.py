@@ -0,0 +1,159 @@
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.future import select
+
+from app.config import API_KEY_CACHE_TTL, API_KEY_CACHE_MAX_ENTRIES, API_KEY_NEGATIVE_CACHE_TTL
+from app.database import SessionLocal
+from app.memory_cache import ByteLRUCache, SingleFlight
+from app.models import CompanySubscription, Plan, Company
+
+
+@dataclass(frozen=True)
+class PlanLimits:
+    id: int
+    name: str
+    price_monthly: Decimal
+    api_hit_limit: Optional[int]
+    concurrent_connections: Optional[int]
+    per_api_hit_price: Optional[Decimal]
+    priority: int
+
+
+@dataclass(frozen=True)
+class CompanyInfo:
+    id: int
+    name: str
+    contact_email: str
+    country: Optional[str]
+    is_active: bool
+
+
+@dataclass(frozen=True)
+class SubscriptionSnapshot:
+    """Immutable view of an active subscription with its plan and company."""
+    id: int
+    company_id: int
+    plan_id: int
+    api_key: str
+    status: str
+    start_date: datetime
+    end_date: datetime
+    plan: Optional[PlanLimits]
+    company: Optional[CompanyInfo]
+
+    @property
+    def api_hit_limit(self):
+        return self.plan.api_hit_limit if self.plan else None
+
+    @property
+    def concurrent_connections(self):
+        return self.plan.concurrent_connections if self.plan else None
+
+    @property
+    def priority(self):
+        return self.plan.priority if self.plan else None
+
+
+# Each entry has weight 1, so the byte bound acts as an entry bound.
+_snapshots = ByteLRUCache(API_KEY_CACHE_MAX_ENTRIES)
+_lookups = SingleFlight()
+_MISSING = object()
+
+
+def _snapshot(subscription: CompanySubscription, plan: Plan, company: Company) -> SubscriptionSnapshot:
+    return SubscriptionSnapshot(
+        id=subscription.id,
+        company_id=subscription.company_id,
+        plan_id=subscription.plan_id,
+        api_key=subscription.api_key,
+        status=subscription.status,
+        start_date=subscription.start_date,
+        end_date=subscription.end_date,
+        plan=PlanLimits(
+            id=plan.id,
+            name=plan.name,
+            price_monthly=plan.price_monthly,
+            api_hit_limit=plan.api_hit_limit,
+            concurrent_connections=plan.concurrent_connections,
+            per_api_hit_price=plan.per_api_hit_price,
+            priority=plan.priority,
+        ) if plan else None,
+        company=CompanyInfo(
+            id=company.id,
+            name=company.name,
+            contact_email=company.contact_email,
+            country=company.country,
+            is_active=company.is_active,
+        ) if company else None,
+    )
+
+
+async def _load(api_key: str):
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(CompanySubscription, Plan, Company)
+            .outerjoin(Plan, Plan.id == CompanySubscription.plan_id)
+            .outerjoin(Company, Company.id == CompanySubscription.company_id)
+            .where(
+                CompanySubscription.api_key == api_key,
+                CompanySubscription.status == "active"
+            )
+        )
+        row = result.one_or_none()
+    snapshot = _snapshot(*row) if row else None
+    # Unknown keys are cached too, so a bad key can't hammer the database.
+    _snapshots.set(api_key, snapshot if snapshot else _MISSING, 1)
+    return snapshot
+
+
+async def resolve_api_key(api_key: str) -> Optional[SubscriptionSnapshot]:
+    """Return the active subscription for ``api_key``, or None.
+
+    Results are cached for API_KEY_CACHE_TTL seconds (unknown keys for
+    API_KEY_NEGATIVE_CACHE_TTL); one joined query
+    replaces the subscription, plan and company lookups on a miss. The
+    query runs on its own session: it is shared by every caller waiting
+    on the same key and may outlive the one that started it.
+    """
+    entry = _snapshots.get(api_key, max_age=API_KEY_CACHE_TTL)
+    if entry is not None:
+        if entry.value is not _MISSING:
+            return entry.value
+        if entry.age <= API_KEY_NEGATIVE_CACHE_TTL:
+            return None
+    return await _lookups.do(api_key, lambda: _load(api_key))
+
+
+def invalidate_api_key(api_key: str):
+    _snapshots.delete(api_key)
+
+
+def invalidate_all_api_keys():
+    _snapshots.clear()
+
+
+def api_key_cache_stats() -> dict:
+    return {"ttl": API_KEY_CACHE_TTL, "negative_ttl": API_KEY_NEGATIVE_CACHE_TTL, **_snapshots.stats(), "coalescing": _lookups.stats()}
+
+
+# Drop cached snapshots as soon as this process changes the underlying rows;
+# other workers pick the change up within API_KEY_CACHE_TTL (a new key that
+# was looked up there before it existed: within API_KEY_NEGATIVE_CACHE_TTL).
+@event.listens_for(CompanySubscription, "after_insert")
+@event.listens_for(CompanySubscription, "after_update")
+@event.listens_for(CompanySubscription, "after_delete")
+def _subscription_changed(mapper, connection, target):
+    # A rotated key must drop the old key's entry as well.
+    old_keys = inspect(target).attrs.api_key.history.deleted or ()
+    for api_key in (target.api_key, *old_keys):
+        invalidate_api_key(api_key)
+
+
+@event.listens_for(Plan, "after_update")
+@event.listens_for(Company, "after_update")
+def _plan_or_company_changed(mapper, connection, target):
+    invalidate_all_api_keys()
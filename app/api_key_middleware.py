@@ -1,92 +1,135 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from fastapi import Request, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from app.database import SessionLocal
-from app.models import CompanySubscription, APIUsage, Plan
-from datetime import datetime
-from sqlalchemy import func, and_
+from fastapi import HTTPException, Request
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.api_key_cache import SubscriptionSnapshot, resolve_api_key
+from app.api_usage import record_api_usage
+from app.config import API_KEY_EXEMPT_PREFIXES
+from app.quota import quota_engine
+from app.rate_limiter import rate_limiter
 
 import time
 
-class APIKeyTrackingAndRateLimitMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Only track API requests to /api/ (customize as needed)
-        if request.url.path.startswith("/api/"):
-            # 1. Get API key from header
-            api_key = request.headers.get("x-api-key")
-            if not api_key:
-                raise HTTPException(status_code=401, detail="API key required")
-
-            async with SessionLocal() as db:
-                # 2. Validate subscription and plan
-                result = await db.execute(
-                    select(CompanySubscription).where(
-                        CompanySubscription.api_key == api_key,
-                        CompanySubscription.status == "active"
-                    )
-                )
-                subscription = result.scalar_one_or_none()
-                if not subscription:
-                    raise HTTPException(status_code=401, detail="Invalid or expired API key")
-
-                # 3. Get plan
-                plan = await db.get(Plan, subscription.plan_id)
-
-                # 4. Rate limit: API hit limit per month
-                if plan.api_hit_limit:
-                    now = datetime.utcnow()
-                    start_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                    count_q = await db.execute(
-                        select(func.count()).where(
-                            and_(
-                                APIUsage.company_id == subscription.company_id,
-                                APIUsage.subscription_id == subscription.id,
-                                APIUsage.timestamp >= start_month
-                            )
-                        )
-                    )
-                    hit_count = count_q.scalar()
-                    if hit_count >= plan.api_hit_limit:
-                        raise HTTPException(status_code=429, detail="API monthly hit limit exceeded")
-
-                # 5. Rate limit: Concurrent connections (rough version)
-                # You could track with Redis for true concurrency, or approximate with APIUsage "last few seconds".
-                # Here, let's assume at most N requests per second for demo:
-                if plan.concurrent_connections:
-                    since = datetime.utcnow() - timedelta(seconds=1)
-                    count_q = await db.execute(
-                        select(func.count()).where(
-                            and_(
-                                APIUsage.company_id == subscription.company_id,
-                                APIUsage.subscription_id == subscription.id,
-                                APIUsage.timestamp >= since
-                            )
-                        )
-                    )
-                    active_count = count_q.scalar()
-                    if active_count >= plan.concurrent_connections:
-                        raise HTTPException(status_code=429, detail="API concurrent connection limit exceeded")
-
-                # 6. Process the request & measure response time
-                start_time = time.monotonic()
-                response = await call_next(request)
-                end_time = time.monotonic()
-                response_time_ms = int((end_time - start_time) * 1000)
-
-                # 7. Track API usage (do not block main thread for DB, but ensure no leaks)
-                usage = APIUsage(
-                    company_id=subscription.company_id,
-                    subscription_id=subscription.id,
-                    endpoint=request.url.path,
-                    status_code=response.status_code,
-                    response_time_ms=response_time_ms,
-                )
-                db.add(usage)
-                await db.commit()
-
-                return response
-        else:
-            # Non-API endpoints, proceed as normal
-            response = await call_next(request)
-            return response
+# Rollup endpoint for requests that matched no route (arbitrary paths)
+UNMATCHED_ROUTE = "<unmatched>"
+
+class APIKeyRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        self.status_code = status_code
+        self.detail = detail
+
+async def admit_api_key(api_key: str) -> SubscriptionSnapshot:
+    """Validate the key and apply rate, concurrency and quota limits.
+
+    On success the caller holds a concurrency slot (when the plan has a
+    limit) and must call ``release_api_key`` once the response is done.
+    """
+    # 1. Get API key from header
+    if not api_key:
+        raise APIKeyRejected(401, "API key required")
+
+    # 2. Validate subscription and plan (cached snapshot, one joined query on a miss)
+    subscription = await resolve_api_key(api_key)
+    if not subscription:
+        raise APIKeyRejected(401, "Invalid or expired API key")
+
+    # 3. Rate limit: requests per second (token bucket, optional)
+    if not await rate_limiter.allow_request(subscription.id):
+        raise APIKeyRejected(429, "API request rate limit exceeded")
+
+    # 4. Rate limit: Concurrent connections (in-flight slot held until the response finishes)
+    if subscription.concurrent_connections and not await rate_limiter.acquire(
+        subscription.id, subscription.concurrent_connections
+    ):
+        raise APIKeyRejected(429, "API concurrent connection limit exceeded")
+
+    # 5. Rate limit: API hit limit per month (in-memory counter)
+    try:
+        allowed = await quota_engine.consume(subscription.id, subscription.company_id, subscription.api_hit_limit)
+    except BaseException:
+        await release_api_key(subscription)
+        raise
+    if not allowed:
+        await release_api_key(subscription)
+        raise APIKeyRejected(429, "API monthly hit limit exceeded")
+    return subscription
+
+async def release_api_key(subscription: SubscriptionSnapshot):
+    if subscription.concurrent_connections:
+        await rate_limiter.release(subscription.id)
+
+async def charge_api_hits(request: Request, hits: int):
+    """Bill the current request as ``hits`` API hits instead of one.
+
+    For endpoints that do the work of many calls (route batches, matrices
+    split into upstream tiles). The middleware has already charged one hit;
+    the rest are taken from the monthly quota here, before the work starts,
+    and recorded with the request's usage. A no-op when the request didn't
+    go through the middleware.
+    """
+    subscription = request.scope.get("api_subscription")
+    if subscription is None:
+        return
+    extra = hits - request.scope["api_hits"]
+    if extra <= 0:
+        return
+    if not await quota_engine.consume(subscription.id, subscription.company_id,
+                                      subscription.api_hit_limit, count=extra):
+        raise HTTPException(status_code=429, detail="API monthly hit limit exceeded")
+    request.scope["api_hits"] = hits
+
+class APIKeyTrackingAndRateLimitMiddleware:
+    """Raw ASGI middleware: API-key validation, limits and usage tracking.
+
+    Unlike a BaseHTTPMiddleware it passes ``send`` straight through, so
+    streaming responses are not re-wrapped, and usage is only recorded
+    after the last body chunk has gone out.
+    """
+
+    def __init__(self, app: ASGIApp, exempt_prefixes: tuple = API_KEY_EXEMPT_PREFIXES):
+        self.app = app
+        self.exempt_prefixes = tuple(exempt_prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # Only track API requests to /api/, minus the exempt ones (login, usage reads)
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith("/api/") or path.startswith(self.exempt_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            subscription = await admit_api_key(Headers(scope=scope).get("x-api-key"))
+        except APIKeyRejected as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code)
+            await response(scope, receive, send)
+            return
+
+        # Read back by charge_api_hits and when recording usage
+        scope["api_subscription"] = subscription
+        scope["api_hits"] = 1
+
+        status_code = 500
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        # 6. Process the request & measure response time
+        start_time = time.monotonic()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            response_time_ms = int((time.monotonic() - start_time) * 1000)
+            await release_api_key(subscription)
+            # 7. Track API usage (queued; the batch writer does the insert)
+            await record_api_usage(
+                company_id=subscription.company_id,
+                subscription_id=subscription.id,
+                endpoint=scope["path"],
+                status_code=status_code,
+                response_time_ms=response_time_ms,
+                # The router stores the matched route in the shared scope.
+                route=getattr(scope.get("route"), "path", UNMATCHED_ROUTE),
+                hits=scope["api_hits"],
+            )
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from app.database import SessionLocal
+from app.models import APIUsage
+from app.batch_writer import BatchWriter
+from app.usage_rollups import usage_rollups
+from app.config import LOG_WRITER_BATCH_SIZE, LOG_WRITER_FLUSH_INTERVAL, LOG_WRITER_MAX_QUEUE
+
+api_usage_writer = BatchWriter(
+    APIUsage,
+    batch_size=LOG_WRITER_BATCH_SIZE,
+    flush_interval=LOG_WRITER_FLUSH_INTERVAL,
+    max_queue=LOG_WRITER_MAX_QUEUE,
+)
+
+async def record_api_usage(
+    company_id: int,
+    subscription_id: int,
+    endpoint: str,
+    status_code: int,
+    response_time_ms: int,
+    timestamp: datetime = None,
+    route: str = None,
+    hits: int = 1
+):
+    # Rows are inserted in batches, so stamp the hit time here rather than
+    # relying on the column default at flush time.
+    timestamp = timestamp or datetime.utcnow()
+    # Rollups are keyed by the route template (e.g. /api/trips/{id}) when
+    # known, so their endpoint count stays bounded.
+    usage_rollups.add(company_id, subscription_id, route or endpoint, status_code, response_time_ms, timestamp, hits)
+    row = dict(
+        company_id=company_id,
+        subscription_id=subscription_id,
+        endpoint=endpoint,
+        timestamp=timestamp,
+        status_code=status_code,
+        response_time_ms=response_time_ms,
+    )
+    # One row per billed hit, so quota seeding and raw billing (both COUNT
+    # rows) agree with the rollups for requests charged several hits.
+    if api_usage_writer.running:
+        await api_usage_writer.enqueue_many([row] * hits)
+        return
+    async with SessionLocal() as db:
+        db.add_all([APIUsage(**row) for _ in range(hits)])
+        await db.commit()
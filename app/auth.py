@@ -2,7 +2,6 @@ from fastapi import APIRouter, Header, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from passlib.context import CryptContext
-import asyncio
 from jose import jwt
 from datetime import datetime, timedelta
 import os
@@ -10,7 +9,7 @@ import os
 from app.models import User
 from app.schemas import UserLogin, OTPVerify, UserCreate, UserOut, UserRegisterWithOTP  # <-- add UserRegisterWithOTP if defined
 from app.otp_utils import generate_otp_secret, generate_otp, verify_otp
-from app.email_utils import send_email
+from app.email_utils import MailNotConfigured, MailQueueFull, send_email
 from app.database import SessionLocal
 from app.config import AUTHORIZATION_KEY, SECRET_KEY, ALGORITHM  # Import from your config module
 
@@ -37,7 +36,12 @@ def check_authorization_key(authorization_key: str = Header(...)):
 async def send_otp(user: UserCreate, _auth=Depends(check_authorization_key)):
     otp_secret = generate_otp_secret()
     otp = generate_otp(otp_secret)
-    await send_email(user.email, "Your OTP Code", f"Your OTP is: {otp}")
+    try:
+        await send_email(user.email, "Your OTP Code", f"Your OTP is: {otp}")
+    except MailQueueFull:
+        raise HTTPException(status_code=503, detail="Too many pending emails, try again shortly")
+    except MailNotConfigured:
+        raise HTTPException(status_code=503, detail="Email is not configured")
     print(f"Generated otp_token: {otp_secret}")
     print(f"Sent OTP: {otp}")
 
@@ -80,7 +84,13 @@ async def login_request_otp(
     if not user or not user.otp_secret:
         return {'status': False, "msg": "User not found"}
     otp = generate_otp(user.otp_secret)
-    asyncio.create_task(send_email(user.email, "Your OTP Code", f"Your OTP is: {otp}"))
+    # send_email only queues the message; a full mail queue is the client's 503.
+    try:
+        await send_email(user.email, "Your OTP Code", f"Your OTP is: {otp}")
+    except MailQueueFull:
+        raise HTTPException(status_code=503, detail="Too many pending emails, try again shortly")
+    except MailNotConfigured:
+        raise HTTPException(status_code=503, detail="Email is not configured")
     return {"status": True, "msg": "OTP sent to email"}
 
 @router.post("/api/login/verify")
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import time
+
+from app.config import (
+    BACKGROUND_WORKERS,
+    BACKGROUND_MAX_QUEUE,
+    BACKGROUND_KIND_MAX_PENDING,
+    BACKGROUND_KIND_LIMITS,
+    BACKGROUND_TASK_TIMEOUT,
+    BACKGROUND_DRAIN_TIMEOUT,
+)
+from app.latency_histogram import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class _KindStats:
+    __slots__ = ("submitted", "coalesced", "shed", "completed", "failed", "timed_out", "dropped",
+                 "pending", "wait_ms", "run_ms")
+
+    def __init__(self):
+        self.submitted = self.coalesced = self.shed = 0
+        self.completed = self.failed = self.timed_out = self.dropped = 0
+        self.pending = 0
+        self.wait_ms = LatencyHistogram()
+        self.run_ms = LatencyHistogram()
+
+    def as_dict(self) -> dict:
+        def percentile(histogram, q):
+            value = histogram.percentile(q)
+            return None if value is None else round(value, 1)
+
+        return {
+            "pending": self.pending,
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "shed": self.shed,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "dropped": self.dropped,
+            "wait_ms_p99": percentile(self.wait_ms, 99),
+            "run_ms_p50": percentile(self.run_ms, 50),
+            "run_ms_p99": percentile(self.run_ms, 99),
+        }
+
+
+class BackgroundExecutor:
+    """Supervised runner for work that should not hold up a response.
+
+    ``submit`` queues ``fn(*args, **kwargs)`` and returns at once. A fixed
+    set of ``workers`` tasks runs the queue, so at most that many jobs are
+    in flight, each bounded by ``task_timeout``; failures are logged with
+    their traceback and counted per kind. Load is shed (``submit`` returns
+    False) when the queue is full or a kind already has its maximum number
+    of pending jobs, so one kind of work cannot crowd out the others. Jobs
+    submitted with a ``key`` are coalesced with a pending job of the same
+    kind and key. ``stop`` stops accepting work and drains the queue for
+    up to ``drain_timeout`` seconds; what is left after that is dropped and
+    counted.
+
+    Before ``start`` (scripts, tests) jobs run on their own tracked tasks.
+    """
+
+    def __init__(self, workers: int, max_queue: int, kind_max_pending: int,
+                 task_timeout: float, drain_timeout: float, kind_limits: dict = None):
+        self.workers = workers
+        self.kind_max_pending = kind_max_pending
+        self.kind_limits = kind_limits or {}
+        self.task_timeout = task_timeout or None
+        self.drain_timeout = drain_timeout
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._workers = []
+        self._unsupervised = set()
+        self._keys = set()
+        self._kinds: dict = {}
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return any(not worker.done() for worker in self._workers)
+
+    def _stats(self, kind: str) -> _KindStats:
+        stats = self._kinds.get(kind)
+        if stats is None:
+            stats = self._kinds[kind] = _KindStats()
+        return stats
+
+    def submit(self, kind: str, fn, *args, key=None, **kwargs) -> bool:
+        """Queue ``fn(*args, **kwargs)``; False if the job was shed."""
+        stats = self._stats(kind)
+        if key is not None and (kind, key) in self._keys:
+            stats.coalesced += 1
+            return True
+        if self._stopping or stats.pending >= self.kind_limits.get(kind, self.kind_max_pending):
+            stats.shed += 1
+            return False
+        job = (kind, key, fn, args, kwargs, time.monotonic())
+        if self.running:
+            try:
+                self._queue.put_nowait(job)
+            except asyncio.QueueFull:
+                stats.shed += 1
+                return False
+        else:
+            task = asyncio.create_task(self._execute(job))
+            self._unsupervised.add(task)
+            task.add_done_callback(self._unsupervised.discard)
+        stats.submitted += 1
+        stats.pending += 1
+        if key is not None:
+            self._keys.add((kind, key))
+        return True
+
+    async def _execute(self, job):
+        kind, key, fn, args, kwargs, queued_at = job
+        stats = self._kinds[kind]
+        label = kind if key is None else f"{kind} {key}"
+        started = time.monotonic()
+        stats.wait_ms.record((started - queued_at) * 1000)
+        try:
+            await asyncio.wait_for(fn(*args, **kwargs), self.task_timeout)
+            stats.completed += 1
+        except asyncio.TimeoutError:
+            stats.timed_out += 1
+            logger.warning("Background job %s timed out after %ss", label, self.task_timeout)
+        except asyncio.CancelledError:
+            stats.dropped += 1
+            raise
+        except Exception:
+            stats.failed += 1
+            logger.exception("Background job %s failed", label)
+        finally:
+            stats.run_ms.record((time.monotonic() - started) * 1000)
+            self._done(kind, key)
+
+    def _done(self, kind: str, key):
+        self._kinds[kind].pending -= 1
+        if key is not None:
+            self._keys.discard((kind, key))
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            if job is _STOP:
+                break
+            await self._execute(job)
+
+    async def start(self):
+        if not self.running:
+            self._stopping = False
+            self._workers = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        self._stopping = True
+        deadline = time.monotonic() + self.drain_timeout
+        if self.running:
+            try:
+                # Sentinels go behind the queued jobs, so those run first.
+                for _ in self._workers:
+                    await asyncio.wait_for(self._queue.put(_STOP), max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                pass
+        tasks = self._workers + list(self._unsupervised)
+        if tasks:
+            _done, unfinished = await asyncio.wait(tasks, timeout=max(deadline - time.monotonic(), 0))
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+        dropped = 0
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            if job is not _STOP:
+                self._kinds[job[0]].dropped += 1
+                self._done(job[0], job[1])
+                dropped += 1
+        if dropped:
+            logger.warning("Dropped %d queued background jobs at shutdown", dropped)
+        self._workers = []
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "kinds": {kind: stats.as_dict() for kind, stats in sorted(self._kinds.items())},
+        }
+
+
+background = BackgroundExecutor(
+    workers=BACKGROUND_WORKERS,
+    max_queue=BACKGROUND_MAX_QUEUE,
+    kind_max_pending=BACKGROUND_KIND_MAX_PENDING,
+    task_timeout=BACKGROUND_TASK_TIMEOUT,
+    drain_timeout=BACKGROUND_DRAIN_TIMEOUT,
+    kind_limits=BACKGROUND_KIND_LIMITS,
+)
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import insert
+
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BatchWriter:
+    """Write-behind queue that inserts rows of one model in bulk.
+
+    Requests only enqueue plain dicts; a single background task groups them
+    and flushes a multi-row INSERT once ``batch_size`` rows are waiting or
+    ``flush_interval`` seconds have passed since the first one arrived. The
+    queue is bounded, so ``enqueue`` waits (backpressure) when the database
+    falls behind. ``stop`` flushes everything queued before returning.
+    """
+
+    def __init__(self, model, batch_size: int, flush_interval: float, max_queue: int):
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.running:
+            await self._queue.put(_STOP)
+            await self._task
+        self._task = None
+
+    async def enqueue(self, row: dict):
+        await self._queue.put(row)
+
+    async def enqueue_many(self, rows: list):
+        for row in rows:
+            await self._queue.put(row)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is _STOP:
+                break
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    row = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        started = time.monotonic()
+        for attempt in (1, 2):
+            try:
+                async with SessionLocal() as db:
+                    await db.execute(insert(self.model), batch)
+                    await db.commit()
+                break
+            except Exception as e:
+                if attempt == 2:
+                    self.rows_dropped += len(batch)
+                    logger.error("Dropping %d %s rows after failed flush: %s",
+                                 len(batch), self.model.__tablename__, e)
+                    return
+                logger.warning("Flush of %d %s rows failed, retrying: %s",
+                               len(batch), self.model.__tablename__, e)
+                await asyncio.sleep(0.5)
+        self.flushes += 1
+        self.rows_written += len(batch)
+        self.last_flush_ms = (time.monotonic() - started) * 1000
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+
+from app.config import BILLING_BATCH_SIZE, BILLING_CONCURRENCY, BILLING_DUE_DAYS, BILLING_USAGE_SOURCE
+from app.database import SessionLocal
+from app.models import APIUsage, APIUsageRollup, CompanySubscription, Invoice, Plan
+from app.quota import month_start, next_month
+
+logger = logging.getLogger(__name__)
+
+_CENTS = Decimal("0.01")
+
+
+def invoice_amounts(price_monthly, api_hit_limit, per_api_hit_price, api_hits: int):
+    """(amount, overage_amount) for one month of a plan.
+
+    Hits beyond the plan's ``api_hit_limit`` (all hits when it has none)
+    are charged at ``per_api_hit_price``, on top of ``price_monthly``.
+    """
+    overage_hits = max(api_hits - (api_hit_limit or 0), 0)
+    overage = (overage_hits * Decimal(per_api_hit_price or 0)).quantize(_CENTS, ROUND_HALF_UP)
+    return Decimal(price_monthly or 0) + overage, overage
+
+
+async def _hit_counts(db, subscription_ids: list, period: datetime, source: str) -> dict:
+    """Hits per subscription in the month starting at ``period``."""
+    if source == "raw":
+        # Index-only scan of one monthly partition (subscription_id, timestamp).
+        query = (
+            select(APIUsage.subscription_id, func.count())
+            .where(APIUsage.subscription_id.in_(subscription_ids),
+                   APIUsage.timestamp >= period, APIUsage.timestamp < next_month(period))
+            .group_by(APIUsage.subscription_id)
+        )
+    else:
+        query = (
+            select(APIUsageRollup.subscription_id, func.sum(APIUsageRollup.hits))
+            .where(APIUsageRollup.subscription_id.in_(subscription_ids),
+                   APIUsageRollup.granularity == "day",
+                   APIUsageRollup.bucket >= period, APIUsageRollup.bucket < next_month(period))
+            .group_by(APIUsageRollup.subscription_id)
+        )
+    return {subscription_id: int(hits) for subscription_id, hits in (await db.execute(query)).all()}
+
+
+async def _bill_batch(batch, period: datetime, source: str, issue_date: datetime) -> int:
+    async with SessionLocal() as db:
+        hits = await _hit_counts(db, [row.id for row in batch], period, source)
+        rows = []
+        for row in batch:
+            api_hits = hits.get(row.id, 0)
+            amount, overage = invoice_amounts(row.price_monthly, row.api_hit_limit, row.per_api_hit_price, api_hits)
+            rows.append(dict(
+                company_id=row.company_id,
+                subscription_id=row.id,
+                period=period,
+                api_hits=api_hits,
+                amount=amount,
+                overage_amount=overage,
+                payment_status="pending",
+                issue_date=issue_date,
+                due_date=issue_date + timedelta(days=BILLING_DUE_DAYS),
+            ))
+        stmt = pg_insert(Invoice)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["subscription_id", "period"],
+            set_={
+                "api_hits": stmt.excluded.api_hits,
+                "amount": stmt.excluded.amount,
+                "overage_amount": stmt.excluded.overage_amount,
+            },
+            # Paid invoices are final; anything else is recomputed by a rerun.
+            where=Invoice.payment_status.is_distinct_from("paid"),
+        ).returning(Invoice.id)
+        # executemany: compiled once, sent as multi-row INSERTs (insertmanyvalues).
+        written = len((await db.execute(stmt, rows)).all())
+        await db.commit()
+    return written
+
+
+async def run_billing(period: datetime, source: str = BILLING_USAGE_SOURCE,
+                      batch_size: int = BILLING_BATCH_SIZE, concurrency: int = BILLING_CONCURRENCY) -> dict:
+    """Invoice every subscription active during the month of ``period``.
+
+    Subscriptions are streamed with a server-side cursor and billed in
+    batches of ``batch_size``, up to ``concurrency`` batches at a time:
+    one grouped hit count query and one multi-row upsert per batch. There
+    is one invoice per subscription and period, so the run can be
+    repeated; unpaid invoices are recomputed and paid ones left alone.
+
+    Hit counts come from the day rollups (``source="rollups"``; use
+    app.usage_rollups.rebuild_rollups for months before rollups existed)
+    or from the raw ``api_usages`` rows (``source="raw"``).
+    """
+    period = month_start(period)
+    started = time.monotonic()
+    issue_date = datetime.utcnow()
+    semaphore = asyncio.Semaphore(concurrency)
+    summary = {"period": period.strftime("%Y-%m"), "subscriptions": 0, "invoices_written": 0, "failed_batches": 0}
+
+    async def bill(batch):
+        try:
+            written = await _bill_batch(batch, period, source, issue_date)
+            summary["invoices_written"] += written
+            summary["subscriptions"] += len(batch)
+        except Exception as e:
+            summary["failed_batches"] += 1
+            logger.error("Billing batch starting at subscription %s failed: %s", batch[0].id, e)
+        finally:
+            semaphore.release()
+
+    query = (
+        select(CompanySubscription.id, CompanySubscription.company_id,
+               Plan.price_monthly, Plan.api_hit_limit, Plan.per_api_hit_price)
+        .join(Plan, Plan.id == CompanySubscription.plan_id)
+        .where(CompanySubscription.start_date < next_month(period), CompanySubscription.end_date >= period)
+        .order_by(CompanySubscription.id)
+    )
+    tasks = []
+    async with SessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        async for batch in result.partitions(batch_size):
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(bill(batch)))
+    await asyncio.gather(*tasks)
+    summary["elapsed_s"] = round(time.monotonic() - started, 2)
+    if summary["failed_batches"]:
+        logger.warning("Billing for %s left %s failed batches; rerun to retry", summary["period"],
+                       summary["failed_batches"])
+    return summary
+
+
+if __name__ == "__main__":
+    # For cron: python -m app.billing [YYYY-MM] [rollups|raw]  (defaults to last month)
+    if len(sys.argv) > 1:
+        period = datetime.strptime(sys.argv[1], "%Y-%m")
+    else:
+        period = month_start() - timedelta(days=1)
+    print(asyncio.run(run_billing(period, *sys.argv[2:3])))
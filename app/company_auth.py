@@ -12,6 +12,7 @@ from app.schemas import UserLogin, OTPVerify, UserCreate, UserOut
 from app.otp_utils import generate_otp_secret, generate_otp, verify_otp
 from app.email_utils import send_email
 from app.database import SessionLocal
+from app.api_key_cache import resolve_api_key
 
 SECRET_KEY = os.getenv("SECRET_KEY", "super-secret")
 ALGORITHM = "HS256"
@@ -53,21 +54,11 @@ async def get_current_company_user_and_subscription(
     if not user:
         raise credentials_exception
 
-    # 2. Validate API Key
-    sub_q = await db.execute(
-        select(CompanySubscription).where(
-            CompanySubscription.api_key == x_api_key,
-            CompanySubscription.status == "active"
-        )
-    )
-    subscription = sub_q.scalar_one_or_none()
+    # 2. Validate API Key (cached snapshot with plan and company)
+    subscription = await resolve_api_key(x_api_key)
     if not subscription:
         raise HTTPException(status_code=403, detail="Invalid or expired API key")
 
-    comp_q = await db.execute(
-        select(Company).where(Company.id == subscription.company_id)
-    )
-    company = comp_q.scalar_one_or_none()
-    p
+    company = subscription.company
 
     return {"user": user, "company": company, "subscription": subscription}
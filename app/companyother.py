@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.database import SessionLocal
 from app.models import CompanySubscription, AllowedDomain, Company
+from app.api_key_cache import CompanyInfo, resolve_api_key
 
 async def get_db():
     async with SessionLocal() as session:
@@ -13,15 +14,9 @@ async def get_current_company_by_apikey(
     x_api_key: str = Header(..., alias="X-API-Key"),
     request: Request = None,
     db: AsyncSession = Depends(get_db)
-) -> Company:
-    # Validate api_key in active subscription
-    q = await db.execute(
-        select(CompanySubscription).where(
-            CompanySubscription.api_key == x_api_key,
-            CompanySubscription.status == "active"
-        )
-    )
-    subscription = q.scalar_one_or_none()
+) -> CompanyInfo:
+    # Validate api_key in active subscription (cached snapshot)
+    subscription = await resolve_api_key(x_api_key)
     if not subscription:
         raise HTTPException(status_code=401, detail="Invalid or expired API key")
     # Optionally check domain (use AllowedDomain)
@@ -38,11 +33,7 @@ async def get_current_company_by_apikey(
         if not domain_obj:
             raise HTTPException(status_code=403, detail="Domain not allowed")
     # Return company object
-    c_q = await db.execute(
-        select(Company).where(Company.id == subscription.company_id)
-    )
-    company = c_q.scalar_one_or_none()
-    return company
+    return subscription.company
 from fastapi import Depends, HTTPException, Header, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -50,6 +41,7 @@ from jose import JWTError, jwt
 from app.config import SECRET_KEY
 from app.database import SessionLocal
 from app.models import User, Company, CompanySubscription
+from app.api_key_cache import resolve_api_key
 
 from fastapi.security import OAuth2PasswordBearer
 
@@ -82,22 +74,13 @@ async def get_current_company_user_and_subscription(
     if not user:
         raise credentials_exception
 
-    # 2. Validate API Key
-    sub_q = await db.execute(
-        select(CompanySubscription).where(
-            CompanySubscription.api_key == x_api_key,
-            CompanySubscription.status == "active"
-        )
-    )
-    subscription = sub_q.scalar_one_or_none()
+    # 2. Validate API Key (cached snapshot with plan and company)
+    subscription = await resolve_api_key(x_api_key)
     if not subscription:
         raise HTTPException(status_code=403, detail="Invalid or expired API key")
 
     # 3. Optional: Check the user is part of the company
-    comp_q = await db.execute(
-        select(Company).where(Company.id == subscription.company_id)
-    )
-    company = comp_q.scalar_one_or_none()
+    company = subscription.company
     # Here you may want to link users to company via a foreign key or association table for multi-user companies!
     # Otherwise, skip this step
 
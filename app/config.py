@@ -13,3 +13,167 @@ SMTP_FROM = os.getenv("DEFAULT_FROM_EMAIL")
 SMTP_HOST = os.getenv("EMAIL_HOST")
 SMTP_PORT = int(os.getenv("EMAIL_PORT", 587))
 SMTP_TLS = os.getenv("MAIL_TLS") == "True"
+
+# Outbound mail queue: a few pooled, logged-in SMTP connections
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 4))
+SMTP_MAX_QUEUE = int(os.getenv("SMTP_MAX_QUEUE", 1000))
+SMTP_MAX_ATTEMPTS = int(os.getenv("SMTP_MAX_ATTEMPTS", 4))
+SMTP_RETRY_BACKOFF = float(os.getenv("SMTP_RETRY_BACKOFF", 0.5))  # doubled after every failed attempt
+# Give up on a message this many seconds after it was queued (OTPs expire)
+SMTP_SEND_DEADLINE = float(os.getenv("SMTP_SEND_DEADLINE", 60))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 10))
+# Close pooled connections unused for this long
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", 60))
+
+# Upstream routing / tile services
+ROUTING_URL = os.getenv("ROUTING_URL", "http://192.168.1.110:3095")
+TILE_SERVER_URL = os.getenv("TILE_SERVER_URL", "http://192.168.1.110:4090")
+ROUTING_TIMEOUT = float(os.getenv("ROUTING_TIMEOUT", 30.0))
+TILE_TIMEOUT = float(os.getenv("TILE_TIMEOUT", 12.0))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 5.0))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 100))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", 20))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", 30.0))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2") == "True"
+
+# Routing admission control: route/matrix calls in flight to the routing engine
+# (0 disables); the rest wait in a bounded queue, highest plan priority first
+ROUTING_MAX_CONCURRENCY = int(os.getenv("ROUTING_MAX_CONCURRENCY", 32))
+ROUTING_MAX_QUEUE = int(os.getenv("ROUTING_MAX_QUEUE", 256))
+# Longest wait for a slot; callers expected to wait longer get 503 + Retry-After at once
+ROUTING_MAX_WAIT = float(os.getenv("ROUTING_MAX_WAIT", 5.0))
+# Priority of callers without an API key (plans default to 0, higher goes first)
+ROUTING_DEFAULT_PRIORITY = int(os.getenv("ROUTING_DEFAULT_PRIORITY", 0))
+
+# Disk tile cache (MBTiles-style SQLite file)
+TILE_CACHE_ENABLED = os.getenv("TILE_CACHE_ENABLED", "True") == "True"
+TILE_CACHE_PATH = os.getenv("TILE_CACHE_PATH", "tile_cache.sqlite")
+TILE_CACHE_MAX_BYTES = int(os.getenv("TILE_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+TILE_CACHE_DEFAULT_TTL = int(os.getenv("TILE_CACHE_DEFAULT_TTL", 7 * 24 * 3600))
+# Per-style TTLs in seconds, e.g. "day=604800,night=86400"
+TILE_CACHE_TTLS = {
+    style.strip(): int(ttl)
+    for style, ttl in (
+        item.split("=", 1) for item in os.getenv("TILE_CACHE_TTLS", "").split(",") if "=" in item
+    )
+}
+
+# In-memory hot tile cache (set HOT_TILE_CACHE_MAX_BYTES=0 to disable)
+HOT_TILE_CACHE_MAX_BYTES = int(os.getenv("HOT_TILE_CACHE_MAX_BYTES", 64 * 1024 ** 2))
+HOT_TILE_TTL = float(os.getenv("HOT_TILE_TTL", 300))
+# How long past HOT_TILE_TTL a tile may still be served while it is refreshed
+HOT_TILE_STALE_TTL = float(os.getenv("HOT_TILE_STALE_TTL", 3600))
+
+# Route result cache (set ROUTE_CACHE_MAX_BYTES=0 to disable)
+ROUTE_CACHE_MAX_BYTES = int(os.getenv("ROUTE_CACHE_MAX_BYTES", 64 * 1024 ** 2))
+ROUTE_CACHE_TTL = float(os.getenv("ROUTE_CACHE_TTL", 120))
+# Decimal places kept when quantizing waypoints for the cache key (5 ~ 1 m)
+ROUTE_CACHE_PRECISION = int(os.getenv("ROUTE_CACHE_PRECISION", 5))
+
+# Write-behind batching for log tables
+LOG_WRITER_BATCH_SIZE = int(os.getenv("LOG_WRITER_BATCH_SIZE", 500))
+LOG_WRITER_FLUSH_INTERVAL = float(os.getenv("LOG_WRITER_FLUSH_INTERVAL", 1.0))
+LOG_WRITER_MAX_QUEUE = int(os.getenv("LOG_WRITER_MAX_QUEUE", 10000))
+
+# Monthly quota counters
+QUOTA_FLUSH_INTERVAL = float(os.getenv("QUOTA_FLUSH_INTERVAL", 5.0))
+
+# API usage rollups (minute/hour/day buckets read by the usage analytics endpoints)
+ROLLUP_FLUSH_INTERVAL = float(os.getenv("ROLLUP_FLUSH_INTERVAL", 5.0))
+ROLLUP_PRUNE_INTERVAL = float(os.getenv("ROLLUP_PRUNE_INTERVAL", 3600))
+# Days of minute / hour buckets to keep (0 keeps everything); day buckets are kept
+ROLLUP_MINUTE_RETENTION_DAYS = int(os.getenv("ROLLUP_MINUTE_RETENTION_DAYS", 7))
+ROLLUP_HOUR_RETENTION_DAYS = int(os.getenv("ROLLUP_HOUR_RETENTION_DAYS", 90))
+USAGE_ANALYTICS_MAX_POINTS = int(os.getenv("USAGE_ANALYTICS_MAX_POINTS", 1500))
+
+# Monthly billing run (python -m app.billing YYYY-MM)
+BILLING_BATCH_SIZE = int(os.getenv("BILLING_BATCH_SIZE", 1000))
+BILLING_CONCURRENCY = int(os.getenv("BILLING_CONCURRENCY", 4))
+BILLING_DUE_DAYS = int(os.getenv("BILLING_DUE_DAYS", 15))
+# Where billed hit counts come from: "rollups" (api_usage_rollups day buckets) or "raw" (api_usages)
+BILLING_USAGE_SOURCE = os.getenv("BILLING_USAGE_SOURCE", "rollups")
+
+# Supervised background jobs (tile refreshes)
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", 16))
+BACKGROUND_MAX_QUEUE = int(os.getenv("BACKGROUND_MAX_QUEUE", 2000))
+# Pending (queued + running) jobs allowed per kind before new ones are shed,
+# overridable per kind, e.g. BACKGROUND_KIND_LIMITS="tile_refresh=200"
+BACKGROUND_KIND_MAX_PENDING = int(os.getenv("BACKGROUND_KIND_MAX_PENDING", 500))
+BACKGROUND_KIND_LIMITS = {
+    kind.strip(): int(limit)
+    for kind, limit in (
+        item.split("=", 1) for item in os.getenv("BACKGROUND_KIND_LIMITS", "").split(",") if "=" in item
+    )
+}
+BACKGROUND_TASK_TIMEOUT = float(os.getenv("BACKGROUND_TASK_TIMEOUT", 60))  # 0 disables
+# On shutdown, time allowed for queued jobs to finish
+BACKGROUND_DRAIN_TIMEOUT = float(os.getenv("BACKGROUND_DRAIN_TIMEOUT", 10))
+
+# Per-subscription rate limiting: "memory" (single worker), "redis" or
+# "shared-local" (in-process stand-in for the shared store)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", 0))  # 0 disables the requests/second cap
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 0))
+
+# API-key middleware (key checks, limits, quota and usage tracking on /api/);
+# off by default. Paths starting with an exempt prefix are never checked.
+API_KEY_MIDDLEWARE_ENABLED = os.getenv("API_KEY_MIDDLEWARE_ENABLED") == "True"
+API_KEY_EXEMPT_PREFIXES = tuple(
+    prefix.strip()
+    for prefix in os.getenv(
+        "API_KEY_EXEMPT_PREFIXES", "/api/login/,/api/register,/api/send-otp,/api/user,/api/usage/"
+    ).split(",")
+    if prefix.strip()
+)
+
+# API key -> subscription snapshot cache
+API_KEY_CACHE_TTL = float(os.getenv("API_KEY_CACHE_TTL", 30))
+# Unknown keys are remembered for less long, so a newly issued key works in
+# every worker within this many seconds
+API_KEY_NEGATIVE_CACHE_TTL = float(os.getenv("API_KEY_NEGATIVE_CACHE_TTL", 5))
+API_KEY_CACHE_MAX_ENTRIES = int(os.getenv("API_KEY_CACHE_MAX_ENTRIES", 10000))
+
+# JWT subject -> user cache used by verify_auth
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", 60))
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", 50000))
+
+# Batch routing
+ROUTE_BATCH_CONCURRENCY = int(os.getenv("ROUTE_BATCH_CONCURRENCY", 8))
+ROUTE_BATCH_MAX_SIZE = int(os.getenv("ROUTE_BATCH_MAX_SIZE", 1000))
+
+# Distance/time matrices: per-call tile size accepted by the routing engine
+MATRIX_MAX_SOURCES = int(os.getenv("MATRIX_MAX_SOURCES", 50))
+MATRIX_MAX_TARGETS = int(os.getenv("MATRIX_MAX_TARGETS", 50))
+MATRIX_CONCURRENCY = int(os.getenv("MATRIX_CONCURRENCY", 4))
+MATRIX_MAX_CELLS = int(os.getenv("MATRIX_MAX_CELLS", 250000))
+
+# Monthly partitions for api_usages / navigation_logs
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL", 6 * 3600))
+# Whole months of data to keep; older partitions are dropped (0 keeps everything)
+API_USAGE_RETENTION_MONTHS = int(os.getenv("API_USAGE_RETENTION_MONTHS", 13))
+NAVIGATION_LOG_RETENTION_MONTHS = int(os.getenv("NAVIGATION_LOG_RETENTION_MONTHS", 13))
+
+# Trip history ingestion (navigation_log_history + turn_logs)
+TRIP_INGEST_MAX_TRIPS = int(os.getenv("TRIP_INGEST_MAX_TRIPS", 500))
+TRIP_INGEST_MAX_TURN_LOGS = int(os.getenv("TRIP_INGEST_MAX_TURN_LOGS", 200000))
+# Turn log records sent per COPY
+TRIP_INGEST_CHUNK_SIZE = int(os.getenv("TRIP_INGEST_CHUNK_SIZE", 5000))
+# Area searches over trip starts/ends
+TRIP_SEARCH_MAX_RADIUS_M = float(os.getenv("TRIP_SEARCH_MAX_RADIUS_M", 50000))
+TRIP_SEARCH_MAX_RESULTS = int(os.getenv("TRIP_SEARCH_MAX_RESULTS", 1000))
+
+# Live navigation WebSocket
+LIVE_NAV_HEARTBEAT_INTERVAL = float(os.getenv("LIVE_NAV_HEARTBEAT_INTERVAL", 20))
+# Close connections that have sent nothing (not even a pong) for this long
+LIVE_NAV_IDLE_TIMEOUT = float(os.getenv("LIVE_NAV_IDLE_TIMEOUT", 60))
+LIVE_NAV_MAX_CONNECTIONS = int(os.getenv("LIVE_NAV_MAX_CONNECTIONS", 5000))
+LIVE_NAV_MAX_POINTS_PER_MESSAGE = int(os.getenv("LIVE_NAV_MAX_POINTS_PER_MESSAGE", 500))
+
+# Off-route detection for live navigation
+OFF_ROUTE_THRESHOLD_M = float(os.getenv("OFF_ROUTE_THRESHOLD_M", 50))
+# Consecutive fixes beyond the threshold before rerouting (filters GPS jitter)
+OFF_ROUTE_MIN_FIXES = int(os.getenv("OFF_ROUTE_MIN_FIXES", 3))
+OFF_ROUTE_CELL_SIZE_M = float(os.getenv("OFF_ROUTE_CELL_SIZE_M", 200))
+OFF_ROUTE_REROUTE_COOLDOWN = float(os.getenv("OFF_ROUTE_REROUTE_COOLDOWN", 10))
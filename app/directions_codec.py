@@ -0,0 +1,45 @@
+import zlib
+
+from app import fast_json
+
+# Bump when the packed layout changes; decode_directions dispatches on it.
+FORMAT_VERSION = 1
+
+# Maneuver fields worth keeping; verbal variants, costs and the like are
+# dropped.
+MANEUVER_FIELDS = (
+    "type",
+    "instruction",
+    "street_names",
+    "time",
+    "length",
+    "begin_shape_index",
+    "end_shape_index",
+)
+
+
+def encode_directions(maneuvers: list, shape: str = None) -> bytes:
+    """Pack maneuvers (and the leg's encoded polyline) into a compact blob.
+
+    Maneuvers are stored column-less as lists in MANEUVER_FIELDS order and
+    the shape stays in its encoded-polyline form; the result is
+    zlib-compressed JSON.
+    """
+    doc = {
+        "v": FORMAT_VERSION,
+        "m": [[maneuver.get(field) for field in MANEUVER_FIELDS] for maneuver in maneuvers or []],
+        "s": shape,
+    }
+    return zlib.compress(fast_json.dumps(doc), 6)
+
+
+def decode_directions(blob: bytes):
+    """Return (maneuvers, shape) from a blob made by encode_directions."""
+    doc = fast_json.loads(zlib.decompress(blob))
+    if doc.get("v") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported directions format version {doc.get('v')}")
+    maneuvers = [
+        {field: value for field, value in zip(MANEUVER_FIELDS, values) if value is not None}
+        for values in doc["m"]
+    ]
+    return maneuvers, doc.get("s")
@@ -1,30 +1,242 @@
-import aiosmtplib
+import asyncio
+import logging
+import time
 from email.message import EmailMessage
 
-SMTP_HOST = "mail.sizaf.com"
-SMTP_PORT = 465
-SMTP_USERNAME = "dotsdesktop@sizaf.com"
-SMTP_PASSWORD = "eri$45;e]H0K"
-SMTP_FROM = "dotsdesktop@sizaf.com"
+import aiosmtplib
+
+from app import config
+from app.config import (
+    SMTP_HOST,
+    SMTP_PORT,
+    SMTP_TLS as SMTP_USE_TLS,
+    SMTP_USERNAME,
+    SMTP_PASSWORD,
+    SMTP_POOL_SIZE,
+    SMTP_MAX_QUEUE,
+    SMTP_MAX_ATTEMPTS,
+    SMTP_RETRY_BACKOFF,
+    SMTP_SEND_DEADLINE,
+    SMTP_TIMEOUT,
+    SMTP_IDLE_TIMEOUT,
+)
+from app.latency_histogram import LatencyHistogram
 
-async def send_email(recipient: str, subject: str, body: str):
+logger = logging.getLogger(__name__)
+
+# Outgoing email is disabled (MailNotConfigured) until EMAIL_HOST is set.
+SMTP_FROM = config.SMTP_FROM or SMTP_USERNAME
+
+_STOP = object()
+
+
+class MailQueueFull(Exception):
+    pass
+
+
+class MailNotConfigured(Exception):
+    pass
+
+
+def build_message(recipient: str, subject: str, body: str) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = SMTP_FROM
     msg["To"] = recipient
     msg["Subject"] = subject
     msg.set_content(body)
-    print("Connecting to mail.sizaf.com:465 with SSL")
-    try:
-        await aiosmtplib.send(
-            msg,
-            hostname=SMTP_HOST,
-            port=SMTP_PORT,
-            username=SMTP_USERNAME,
-            password=SMTP_PASSWORD,
-            use_tls=True,
-        )
-        print("Email sent!")
-    except Exception as e:
-        print("EMAIL SEND ERROR:", e)
-        raise
+    return msg
+
+
+def _permanent(error: Exception) -> bool:
+    """5xx replies (bad recipient, rejected message) won't succeed on retry."""
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(e.code >= 500 for e in error.recipients)
+    return isinstance(error, aiosmtplib.SMTPResponseException) and error.code >= 500
+
+
+class SMTPMailer:
+    """Outbound mail queue drained over a small pool of SMTP connections.
 
+    ``enqueue`` only puts the message on a bounded queue (and raises
+    MailQueueFull rather than wait when it is full). ``pool_size`` workers
+    each keep one connected, logged-in SMTP session and reuse it for every
+    message they send, so the TLS handshake and AUTH happen once per
+    connection instead of once per email; a connection unused for
+    ``idle_timeout`` seconds is closed. Failed sends are retried with
+    exponential backoff on a fresh connection until ``max_attempts`` or
+    the message's deadline (``send_deadline`` seconds after it was queued),
+    whichever comes first.
+    """
+
+    def __init__(self, pool_size: int, max_queue: int, max_attempts: int,
+                 retry_backoff: float, send_deadline: float, idle_timeout: float):
+        self.pool_size = pool_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.send_deadline = send_deadline
+        self.idle_timeout = idle_timeout
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._workers = []
+        self._send_ms = LatencyHistogram()
+        self._queue_ms = LatencyHistogram()
+        self.queued = 0
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self.expired = 0
+        self.rejected = 0
+        self.connections_opened = 0
+
+    @property
+    def running(self) -> bool:
+        return any(not worker.done() for worker in self._workers)
+
+    async def start(self):
+        if not SMTP_HOST:
+            logger.warning("EMAIL_HOST is not set; outgoing email is disabled")
+            return
+        if not self.running:
+            self._workers = [asyncio.create_task(self._run()) for _ in range(self.pool_size)]
+
+    async def stop(self):
+        """Send what is queued (within each message's deadline), then close."""
+        if self.running:
+            for _ in self._workers:
+                await self._queue.put(_STOP)
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(self, msg: EmailMessage):
+        try:
+            self._queue.put_nowait((msg, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise MailQueueFull("Outbound mail queue is full")
+        self.queued += 1
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(hostname=SMTP_HOST, port=SMTP_PORT, use_tls=SMTP_USE_TLS, timeout=SMTP_TIMEOUT)
+        await smtp.connect()
+        if SMTP_USERNAME:
+            await smtp.login(SMTP_USERNAME, SMTP_PASSWORD)
+        self.connections_opened += 1
+        return smtp
+
+    @staticmethod
+    async def _close(smtp):
+        if smtp is None:
+            return
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def _deliver(self, smtp, msg: EmailMessage, queued_at: float):
+        """Send one message; returns the connection to keep (or None)."""
+        deadline = queued_at + self.send_deadline
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.expired += 1
+                logger.warning("Dropping email to %s: not sent within %ss", msg["To"], self.send_deadline)
+                return smtp
+            reused = smtp is not None
+            started = time.monotonic()
+            try:
+                if smtp is None:
+                    smtp = await asyncio.wait_for(self._connect(), remaining)
+                await asyncio.wait_for(smtp.send_message(msg), max(deadline - time.monotonic(), 0))
+            except Exception as e:
+                # No QUIT: the connection may be dead or mid-transaction.
+                if smtp is not None:
+                    smtp.close()
+                smtp = None
+                if reused and isinstance(e, (aiosmtplib.SMTPServerDisconnected, ConnectionError)):
+                    # The server dropped a connection we were reusing; reconnect
+                    # straight away without using up an attempt.
+                    continue
+                attempt += 1
+                if _permanent(e) or attempt >= self.max_attempts:
+                    self.failed += 1
+                    logger.error("Giving up on email to %s after %d attempts: %s", msg["To"], attempt, e)
+                    return None
+                self.retries += 1
+                logger.warning("Email to %s failed (attempt %d), retrying: %s", msg["To"], attempt, e)
+                await asyncio.sleep(min(self.retry_backoff * 2 ** (attempt - 1), max(deadline - time.monotonic(), 0)))
+                continue
+            now = time.monotonic()
+            self.sent += 1
+            self._send_ms.record((now - started) * 1000)
+            self._queue_ms.record((now - queued_at) * 1000)
+            return smtp
+
+    async def _run(self):
+        smtp = None
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), self.idle_timeout if smtp else None)
+                except asyncio.TimeoutError:
+                    await self._close(smtp)
+                    smtp = None
+                    continue
+                if item is _STOP:
+                    break
+                smtp = await self._deliver(smtp, *item)
+        finally:
+            await self._close(smtp)
+
+    def stats(self) -> dict:
+        def percentile(histogram, q):
+            value = histogram.percentile(q)
+            return None if value is None else round(value, 1)
+
+        return {
+            "configured": bool(SMTP_HOST),
+            "running": self.running,
+            "connections": self.pool_size,
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "enqueued": self.queued,
+            "sent": self.sent,
+            "retries": self.retries,
+            "failed": self.failed,
+            "expired": self.expired,
+            "rejected_queue_full": self.rejected,
+            "connections_opened": self.connections_opened,
+            "send_ms_p50": percentile(self._send_ms, 50),
+            "send_ms_p99": percentile(self._send_ms, 99),
+            # Time from enqueue to accepted by the server
+            "delivery_ms_p50": percentile(self._queue_ms, 50),
+            "delivery_ms_p99": percentile(self._queue_ms, 99),
+        }
+
+
+mailer = SMTPMailer(
+    pool_size=SMTP_POOL_SIZE,
+    max_queue=SMTP_MAX_QUEUE,
+    max_attempts=SMTP_MAX_ATTEMPTS,
+    retry_backoff=SMTP_RETRY_BACKOFF,
+    send_deadline=SMTP_SEND_DEADLINE,
+    idle_timeout=SMTP_IDLE_TIMEOUT,
+)
+
+
+async def send_email(recipient: str, subject: str, body: str):
+    """Queue an email for delivery (sent directly when the mailer isn't running)."""
+    if not SMTP_HOST:
+        raise MailNotConfigured("EMAIL_HOST is not set")
+    msg = build_message(recipient, subject, body)
+    if mailer.running:
+        mailer.enqueue(msg)
+        return
+    await aiosmtplib.send(
+        msg,
+        hostname=SMTP_HOST,
+        port=SMTP_PORT,
+        username=SMTP_USERNAME,
+        password=SMTP_PASSWORD,
+        use_tls=SMTP_USE_TLS,
+        timeout=SMTP_TIMEOUT,
+    )
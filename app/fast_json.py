@@ -0,0 +1,30 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; stdlib json works the same, slower
+    orjson = None
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), default=str).encode()
+
+
+def splice(envelope: dict, key: str, raw_json: bytes = None) -> bytes:
+    """Encode ``envelope`` with ``raw_json`` inserted verbatim under ``key``.
+
+    Lets an already-encoded upstream payload travel inside our response
+    without being parsed and re-serialized.
+    """
+    encoded = dumps(envelope)
+    value = raw_json if raw_json is not None else b"null"
+    separator = b"," if len(encoded) > 2 else b""
+    return encoded[:-1] + separator + dumps(key) + b":" + value + b"}"
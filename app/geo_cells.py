@@ -0,0 +1,91 @@
+import math
+
+# Bits per axis. Interleaved (lon bit above lat bit, as in geohash) this
+# gives a 52-bit cell id, about 0.6 m across at the equator. A cell at a
+# coarser level is a prefix of these ids, i.e. one contiguous id range, so
+# a plain B-tree index answers area queries with a handful of range scans.
+CELL_BITS = 26
+
+# Upper bound on the cells used to cover a search area.
+MAX_COVER_CELLS = 16
+
+EARTH_RADIUS_M = 6371008.8
+_METRES_PER_DEGREE = math.pi / 180 * EARTH_RADIUS_M
+
+
+def _spread(v: int) -> int:
+    """Insert a zero bit above every bit of a 26-bit value."""
+    v &= (1 << CELL_BITS) - 1
+    v = (v | (v << 16)) & 0x0000FFFF0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v << 2)) & 0x3333333333333333
+    v = (v | (v << 1)) & 0x5555555555555555
+    return v
+
+
+def _quantize(value: float, low: float, high: float) -> int:
+    index = int((value - low) / (high - low) * (1 << CELL_BITS))
+    return min(max(index, 0), (1 << CELL_BITS) - 1)
+
+
+def encode_cell(lat, lon):
+    """52-bit cell id of a position, or None if it is missing."""
+    if lat is None or lon is None:
+        return None
+    x = _quantize(lon, -180.0, 180.0)
+    y = _quantize(lat, -90.0, 90.0)
+    return (_spread(x) << 1) | _spread(y)
+
+
+def _cover(min_lat, min_lon, max_lat, max_lon, max_cells):
+    x_low, x_high = _quantize(min_lon, -180.0, 180.0), _quantize(max_lon, -180.0, 180.0)
+    y_low, y_high = _quantize(min_lat, -90.0, 90.0), _quantize(max_lat, -90.0, 90.0)
+    # Finest level at which the box touches at most max_cells cells.
+    for level in range(CELL_BITS, -1, -1):
+        shift = CELL_BITS - level
+        x0, x1, y0, y1 = x_low >> shift, x_high >> shift, y_low >> shift, y_high >> shift
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= max_cells:
+            break
+    width = 2 * shift
+    for cx in range(x0, x1 + 1):
+        for cy in range(y0, y1 + 1):
+            prefix = (_spread(cx) << 1) | _spread(cy)
+            yield prefix << width, ((prefix + 1) << width) - 1
+
+
+def cell_ranges(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                max_cells: int = MAX_COVER_CELLS) -> list:
+    """Sorted, merged (low, high) cell id ranges covering a bounding box.
+
+    A box with ``min_lon > max_lon`` crosses the antimeridian.
+    """
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    if min_lon > max_lon:
+        boxes = [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+    else:
+        boxes = [(min_lat, max(min_lon, -180.0), max_lat, min(max_lon, 180.0))]
+    ranges = sorted(r for box in boxes for r in _cover(*box, max_cells))
+    merged = []
+    for low, high in ranges:
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def radius_bbox(lat: float, lon: float, radius_m: float):
+    """(min_lat, min_lon, max_lat, max_lon) enclosing a circle."""
+    dlat = radius_m / _METRES_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    if abs(lat) + dlat >= 90.0 or cos_lat * 180.0 * _METRES_PER_DEGREE <= radius_m:
+        # Reaches a pole or all the way round: every longitude qualifies.
+        return lat - dlat, -180.0, lat + dlat, 180.0
+    dlon = dlat / cos_lat
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180.0:
+        min_lon += 360.0
+    if max_lon > 180.0:
+        max_lon -= 360.0
+    return lat - dlat, min_lon, lat + dlat, max_lon
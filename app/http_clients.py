@@ -0,0 +1,107 @@
+import logging
+
+import httpx
+
+from app.config import (
+    ROUTING_URL,
+    TILE_SERVER_URL,
+    ROUTING_TIMEOUT,
+    TILE_TIMEOUT,
+    UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_MAX_CONNECTIONS,
+    UPSTREAM_MAX_KEEPALIVE,
+    UPSTREAM_KEEPALIVE_EXPIRY,
+    UPSTREAM_HTTP2,
+)
+
+logger = logging.getLogger(__name__)
+
+# One long-lived client per upstream, opened and closed by the app lifespan.
+UPSTREAMS = {
+    "routing": {"base_url": ROUTING_URL, "timeout": ROUTING_TIMEOUT},
+    "tiles": {"base_url": TILE_SERVER_URL, "timeout": TILE_TIMEOUT},
+}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+_request_counts: dict[str, int] = {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client(name: str, base_url: str, timeout: float) -> httpx.AsyncClient:
+    http2 = UPSTREAM_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("UPSTREAM_HTTP2 is set but the 'h2' package is missing; using HTTP/1.1 for %s", name)
+        http2 = False
+
+    async def count_request(request):
+        _request_counts[name] = _request_counts.get(name, 0) + 1
+
+    return httpx.AsyncClient(
+        base_url=base_url,
+        http2=http2,
+        timeout=httpx.Timeout(timeout, connect=UPSTREAM_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+        event_hooks={"request": [count_request]},
+    )
+
+
+async def start_http_clients():
+    for name, opts in UPSTREAMS.items():
+        if name not in _clients:
+            _clients[name] = _build_client(name, opts["base_url"], opts["timeout"])
+
+
+async def close_http_clients():
+    while _clients:
+        name, client = _clients.popitem()
+        await client.aclose()
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    client = _clients.get(name)
+    if client is None:
+        # Outside the app lifespan (scripts, one-off jobs): open lazily.
+        opts = UPSTREAMS[name]
+        client = _clients[name] = _build_client(name, opts["base_url"], opts["timeout"])
+    return client
+
+
+def get_routing_client() -> httpx.AsyncClient:
+    return get_client("routing")
+
+
+def get_tile_client() -> httpx.AsyncClient:
+    return get_client("tiles")
+
+
+def pool_stats() -> dict:
+    """Connection pool usage per upstream client."""
+    stats = {}
+    for name, client in _clients.items():
+        # httpcore does not expose pool counters publicly, so read the
+        # connection list defensively.
+        pool = getattr(client._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for conn in connections if conn.is_idle())
+        stats[name] = {
+            "base_url": str(client.base_url),
+            "http2": UPSTREAM_HTTP2 and _http2_available(),
+            "max_connections": UPSTREAM_MAX_CONNECTIONS,
+            "max_keepalive": UPSTREAM_MAX_KEEPALIVE,
+            "open_connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "requests_total": _request_counts.get(name, 0),
+        }
+    return stats
@@ -0,0 +1,86 @@
+# Fixed-layout log-linear latency histogram (HDR-style). Values below
+# LINEAR_BUCKETS ms get a bucket each; above that every power of two is
+# split into SUB_BUCKETS equal buckets, each 1/SUB_BUCKETS (12.5%) of its
+# lower bound wide, so a percentile read from it is within 12.5% of the
+# true value (within 1 ms below LINEAR_BUCKETS ms). Every histogram has the
+# same layout, so two of them merge by adding counts element-wise: minute
+# buckets roll up into hours and days, and the database can merge them
+# inside an upsert.
+
+LINEAR_BUCKETS = 16
+SUB_BUCKETS = 8
+# Values at or above 2**MAX_EXPONENT ms (about 17 minutes) share the last bucket.
+MAX_EXPONENT = 20
+BUCKETS = LINEAR_BUCKETS + (MAX_EXPONENT - LINEAR_BUCKETS.bit_length() + 1) * SUB_BUCKETS
+
+_FIRST_EXPONENT = LINEAR_BUCKETS.bit_length() - 1
+_SUB_BITS = SUB_BUCKETS.bit_length() - 1
+
+
+def bucket_index(ms: int) -> int:
+    ms = max(int(ms), 0)
+    if ms < LINEAR_BUCKETS:
+        return ms
+    exponent = ms.bit_length() - 1
+    if exponent >= MAX_EXPONENT:
+        return BUCKETS - 1
+    sub = (ms >> (exponent - _SUB_BITS)) & (SUB_BUCKETS - 1)
+    return LINEAR_BUCKETS + (exponent - _FIRST_EXPONENT) * SUB_BUCKETS + sub
+
+
+def bucket_bounds(index: int):
+    """[low, high) milliseconds covered by a bucket."""
+    if index < LINEAR_BUCKETS:
+        return index, index + 1
+    exponent, sub = divmod(index - LINEAR_BUCKETS, SUB_BUCKETS)
+    width = 1 << (exponent + _FIRST_EXPONENT - _SUB_BITS)
+    low = (SUB_BUCKETS + sub) * width
+    return low, low + width
+
+
+class LatencyHistogram:
+    __slots__ = ("counts",)
+
+    def __init__(self, counts=None):
+        self.counts = list(counts or [])
+
+    def record(self, ms: int, count: int = 1):
+        index = bucket_index(ms)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += count
+
+    def merge(self, other):
+        counts = other.counts if isinstance(other, LatencyHistogram) else other
+        if len(counts) > len(self.counts):
+            self.counts.extend([0] * (len(counts) - len(self.counts)))
+        for i, count in enumerate(counts):
+            self.counts[i] += count or 0
+        return self
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts)
+
+    def percentile(self, q: float):
+        """Approximate q-th percentile in ms (None when empty)."""
+        total = self.total
+        if not total:
+            return None
+        rank = q / 100 * total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low, high = bucket_bounds(index)
+                # Spread the bucket's values evenly across its range.
+                return low + (high - low) * max(rank - seen, 0) / count
+            seen += count
+        low, high = bucket_bounds(len(self.counts) - 1)
+        return float(high)
+
+    def to_list(self) -> list:
+        """Counts with trailing empty buckets dropped."""
+        end = len(self.counts)
+        while end and not self.counts[end - 1]:
+            end -= 1
+        return self.counts[:end]
@@ -1,14 +1,63 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from .auth import router as auth_router
 #from .company_auth import router as company_auth_router
 from .user_maps import router as user_maps_router
+from .trips import router as trips_router
+from .usage_analytics import router as usage_analytics_router
+from .stats import router as stats_router
+from .http_clients import start_http_clients, close_http_clients
+from .tile_cache import start_tile_cache, close_tile_cache
+from .navigation_log import navigation_log_writer, turn_log_writer
+from .api_usage import api_usage_writer
+from .quota import quota_engine
+from .usage_rollups import usage_rollups
+from .partitions import partition_maintainer
+from .email_utils import mailer
+from .background import background
+from .api_key_middleware import APIKeyTrackingAndRateLimitMiddleware
+from .config import API_KEY_MIDDLEWARE_ENABLED
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_http_clients()
+    await start_tile_cache()
+    await navigation_log_writer.start()
+    await turn_log_writer.start()
+    await api_usage_writer.start()
+    await quota_engine.start()
+    await usage_rollups.start()
+    await partition_maintainer.start()
+    await mailer.start()
+    await background.start()
+    try:
+        yield
+    finally:
+        # Drain queued jobs and log rows before the pools they depend on go away.
+        await background.stop()
+        await mailer.stop()
+        await partition_maintainer.stop()
+        await quota_engine.stop()
+        await usage_rollups.stop()
+        await navigation_log_writer.stop()
+        await turn_log_writer.stop()
+        await api_usage_writer.stop()
+        await close_tile_cache()
+        await close_http_clients()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+# API key checks, rate/concurrency/quota limits and usage tracking for /api/
+if API_KEY_MIDDLEWARE_ENABLED:
+    app.add_middleware(APIKeyTrackingAndRateLimitMiddleware)
 
 app.include_router(auth_router)
 #app.include_router(company_auth_router)
 app.include_router(user_maps_router)
+app.include_router(trips_router)
+app.include_router(usage_analytics_router)
+app.include_router(stats_router)
 
 @app.get("/")
 def root():
@@ -0,0 +1,97 @@
+import asyncio
+import math
+import sys
+from array import array
+
+from app.admission import routing_admission
+from app.config import MATRIX_MAX_SOURCES, MATRIX_MAX_TARGETS, MATRIX_CONCURRENCY, ROUTING_DEFAULT_PRIORITY
+from app.http_clients import get_routing_client
+from app.schemas import MatrixRequest
+
+
+class MatrixUpstreamError(Exception):
+    def __init__(self, status_code: int, reason: str = None):
+        super().__init__(reason or f"External service returned status {status_code}")
+        self.status_code = status_code
+
+
+def _chunks(count: int, size: int):
+    return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+
+def tile_count(n_rows: int, n_cols: int) -> int:
+    """Upstream calls compute_matrix makes for an n_rows x n_cols matrix."""
+    return math.ceil(n_rows / MATRIX_MAX_SOURCES) * math.ceil(n_cols / MATRIX_MAX_TARGETS)
+
+
+async def _fetch_tile(matrix_request: MatrixRequest, rows: tuple, cols: tuple, distances, durations, n_cols: int,
+                      priority: int):
+    payload = {
+        "sources": [{"lat": p.lat, "lon": p.lon} for p in matrix_request.sources[rows[0]:rows[1]]],
+        "targets": [{"lat": p.lat, "lon": p.lon} for p in matrix_request.targets[cols[0]:cols[1]]],
+        "costing": matrix_request.costing,
+        "units": matrix_request.units or "kilometers",
+    }
+    client = get_routing_client()
+    async with routing_admission.slot(priority):
+        response = await client.post("/sources_to_targets", json=payload)
+    if response.status_code != 200:
+        raise MatrixUpstreamError(response.status_code)
+    try:
+        matrix = response.json()["sources_to_targets"]
+        if len(matrix) != rows[1] - rows[0] or any(len(row) != cols[1] - cols[0] for row in matrix):
+            raise ValueError("matrix shape does not match the request")
+        for i, row in enumerate(matrix):
+            base = (rows[0] + i) * n_cols + cols[0]
+            for j, cell in enumerate(row):
+                # Unreachable pairs come back with null distance/time.
+                if cell.get("distance") is not None:
+                    distances[base + j] = cell["distance"]
+                if cell.get("time") is not None:
+                    durations[base + j] = cell["time"]
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise MatrixUpstreamError(response.status_code, "Malformed response from external service") from e
+
+
+async def compute_matrix(matrix_request: MatrixRequest, priority: int = ROUTING_DEFAULT_PRIORITY):
+    """Return row-major (distances, durations) float32 arrays.
+
+    The matrix is split into tiles of at most MATRIX_MAX_SOURCES x
+    MATRIX_MAX_TARGETS, fetched with up to MATRIX_CONCURRENCY calls in
+    flight, each admitted at ``priority``. Unreachable pairs are NaN.
+    """
+    n_rows, n_cols = len(matrix_request.sources), len(matrix_request.targets)
+    distances = array("f", [math.nan]) * (n_rows * n_cols)
+    durations = array("f", [math.nan]) * (n_rows * n_cols)
+    semaphore = asyncio.Semaphore(MATRIX_CONCURRENCY)
+
+    async def run(rows, cols):
+        async with semaphore:
+            await _fetch_tile(matrix_request, rows, cols, distances, durations, n_cols, priority)
+
+    tiles = [
+        asyncio.create_task(run(rows, cols))
+        for rows in _chunks(n_rows, MATRIX_MAX_SOURCES)
+        for cols in _chunks(n_cols, MATRIX_MAX_TARGETS)
+    ]
+    try:
+        await asyncio.gather(*tiles)
+    finally:
+        for task in tiles:
+            task.cancel()
+    return distances, durations
+
+
+def to_little_endian_bytes(*arrays) -> bytes:
+    """Concatenate float32 arrays as little-endian bytes (numpy dtype '<f4')."""
+    out = bytearray()
+    for values in arrays:
+        if sys.byteorder == "big":
+            values = array("f", values)
+            values.byteswap()
+        out += values.tobytes()
+    return bytes(out)
+
+
+def to_json_list(values) -> list:
+    return [None if math.isnan(v) else round(v, 3) for v in values]
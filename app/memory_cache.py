@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class CacheEntry:
+    __slots__ = ("value", "size", "stored_at")
+
+    def __init__(self, value, size: int, stored_at: float):
+        self.value = value
+        self.size = size
+        self.stored_at = stored_at
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+
+class ByteLRUCache:
+    """In-process LRU cache bounded by the total size of its values.
+
+    Freshness is left to the caller (via ``CacheEntry.age``) so the same
+    entry can be served fresh, served stale, or ignored.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, max_age: float = None):
+        entry = self._entries.get(key)
+        if entry is not None and max_age is not None and entry.age > max_age:
+            self.delete(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, key, value, size: int):
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+        self._entries[key] = CacheEntry(value, size, time.monotonic())
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+
+    def delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The work runs in its own task, so a caller that gets cancelled does not
+    cancel the fetch for everyone else waiting on it. The leader can attach
+    a ``tag`` to the execution, which lives exactly as long as it is in
+    flight.
+    """
+
+    def __init__(self):
+        self._inflight: dict = {}
+        self._tags: dict = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def in_flight(self, key) -> bool:
+        return key in self._inflight
+
+    def tag(self, key):
+        return self._tags.get(key)
+
+    def _finish(self, key):
+        self._inflight.pop(key, None)
+        self._tags.pop(key, None)
+
+    async def do(self, key, fn, tag=None):
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            if tag is not None:
+                self._tags[key] = tag
+            task.add_done_callback(lambda _t: self._finish(key))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
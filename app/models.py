@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Numeric, Text, TIMESTAMP, Interval, Enum, Float
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, Numeric, Text, TIMESTAMP, Interval, Enum, Float, UniqueConstraint, LargeBinary, Index, SmallInteger, text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
+from .directions_codec import decode_directions
 import enum
 
 class User(Base):
@@ -38,6 +39,8 @@ class Plan(Base):
     api_hit_limit = Column(Integer)
     concurrent_connections = Column(Integer)
     per_api_hit_price = Column(Numeric(10, 4))
+    # Routing admission order under load; higher goes first
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
     is_active = Column(Boolean, default=True)
     created_at = Column(TIMESTAMP, server_default=func.now())
 
@@ -64,23 +67,68 @@ class CompanySubscription(Base):
 
 class APIUsage(Base):
     __tablename__ = "api_usages"
-    id = Column(Integer, primary_key=True)
+    # Monthly range partitions, managed by app.partitions
+    __table_args__ = (
+        # Covers quota counts and usage reports per subscription and time range
+        Index("ix_api_usages_subscription_timestamp", "subscription_id", "timestamp",
+              postgresql_include=["company_id", "status_code", "response_time_ms"]),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
     company_id = Column(Integer, ForeignKey('companies.id', ondelete="CASCADE"))
     subscription_id = Column(Integer, ForeignKey('company_subscriptions.id', ondelete="CASCADE"))
     endpoint = Column(String(255))
-    timestamp = Column(TIMESTAMP, server_default=func.now())
+    timestamp = Column(TIMESTAMP, primary_key=True, server_default=func.now())
     status_code = Column(Integer)
     response_time_ms = Column(Integer)
 
     company = relationship("Company", back_populates="usages")
     subscription = relationship("CompanySubscription", back_populates="usages")
 
+class APIUsageMonthly(Base):
+    """Running hit counter per subscription and month, used for quota checks."""
+    __tablename__ = "api_usage_monthly"
+    __table_args__ = (UniqueConstraint("subscription_id", "month"),)
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete="CASCADE"))
+    subscription_id = Column(Integer, ForeignKey('company_subscriptions.id', ondelete="CASCADE"), nullable=False)
+    month = Column(TIMESTAMP, nullable=False)
+    hit_count = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP, server_default=func.now())
+
+class APIUsageRollup(Base):
+    """Usage per subscription, endpoint and status class in minute, hour and
+    day buckets, with a latency histogram (see app.latency_histogram)."""
+    __tablename__ = "api_usage_rollups"
+    __table_args__ = (
+        UniqueConstraint("subscription_id", "granularity", "bucket", "endpoint", "status_class"),
+        # Company-wide usage analytics over a time range
+        Index("ix_api_usage_rollups_company_granularity_bucket", "company_id", "granularity", "bucket"),
+    )
+    id = Column(BigInteger, primary_key=True)
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete="CASCADE"))
+    subscription_id = Column(Integer, ForeignKey('company_subscriptions.id', ondelete="CASCADE"), nullable=False)
+    granularity = Column(String(8), nullable=False)  # minute, hour or day
+    bucket = Column(TIMESTAMP, nullable=False)
+    endpoint = Column(String(255), nullable=False)
+    status_class = Column(SmallInteger, nullable=False)  # status_code // 100
+    hits = Column(BigInteger, nullable=False, default=0)
+    latency_sum_ms = Column(BigInteger, nullable=False, default=0)
+    latency_max_ms = Column(Integer, nullable=False, default=0)
+    latency_histogram = Column(ARRAY(BigInteger), nullable=False)
+    updated_at = Column(TIMESTAMP, server_default=func.now())
+
 class Invoice(Base):
     __tablename__ = "invoices"
+    # One invoice per subscription and billing period (see app.billing)
+    __table_args__ = (UniqueConstraint("subscription_id", "period"),)
     id = Column(Integer, primary_key=True)
     company_id = Column(Integer, ForeignKey('companies.id', ondelete="CASCADE"))
     subscription_id = Column(Integer, ForeignKey('company_subscriptions.id', ondelete="CASCADE"))
     amount = Column(Numeric(10,2), nullable=False)
+    period = Column(TIMESTAMP)  # first day of the billed month
+    api_hits = Column(BigInteger)
+    overage_amount = Column(Numeric(10,2))
     currency = Column(String(8), default='INR')
     payment_provider = Column(String(32))
     payment_status = Column(String(32))
@@ -94,6 +142,10 @@ class Invoice(Base):
 
 class AllowedDomain(Base):
     __tablename__ = "allowed_domains"
+    __table_args__ = (
+        Index("ix_allowed_domains_active_api_key_domain", "api_key", "domain_name",
+              postgresql_where=text("is_active")),
+    )
     id = Column(Integer, primary_key=True)
     domain_name = Column(String(255), nullable=False)
     company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"))
@@ -103,18 +155,36 @@ class AllowedDomain(Base):
 
 class NavigationLog(Base):
     __tablename__ = "navigation_logs"
-    id = Column(Integer, primary_key=True)
+    # Monthly range partitions, managed by app.partitions
+    __table_args__ = (
+        Index("ix_navigation_logs_user_created_at", "user_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     start_place = Column(String(255))
     destination = Column(String(255))
     start_time = Column(TIMESTAMP)
     end_time = Column(TIMESTAMP)
     time_taken = Column(Interval)
-    directions = Column(JSONB)  # PostgreSQL JSONB to store maneuvers
+    directions = Column(JSONB)  # Legacy rows only; new rows use directions_packed
+    directions_packed = Column(LargeBinary)  # app.directions_codec blob: maneuvers + shape polyline
     status = Column(Boolean, default=False)
     message = Column(String(255))
     error = Column(String(255), nullable=True)
-    created_at = Column(TIMESTAMP, server_default=func.now())
+    created_at = Column(TIMESTAMP, primary_key=True, server_default=func.now())
+
+    @property
+    def maneuvers(self) -> list:
+        if self.directions_packed is not None:
+            return decode_directions(self.directions_packed)[0]
+        return self.directions or []
+
+    @property
+    def shape(self):
+        if self.directions_packed is not None:
+            return decode_directions(self.directions_packed)[1]
+        return None
 
 class NavigationStatus(str, enum.Enum):
     completed = "completed"
@@ -124,15 +194,23 @@ class NavigationStatus(str, enum.Enum):
 
 class NavigationLogHistory(Base):
     __tablename__ = "navigation_log_history"
+    __table_args__ = (
+        Index("ix_navigation_log_history_user_start_cell", "user_id", "start_cell"),
+        Index("ix_navigation_log_history_user_end_cell", "user_id", "end_cell"),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
-    navigation_log_id = Column(Integer, ForeignKey("navigation_logs.id", ondelete="SET NULL"))
+    # Not a foreign key: navigation_logs is partitioned and its key is (id, created_at)
+    navigation_log_id = Column(Integer, index=True)
     start_place = Column(String(255))
     destination = Column(String(255))
     start_lat = Column(Float)
     start_lng = Column(Float)
     end_lat = Column(Float)
     end_lng = Column(Float)
+    # app.geo_cells ids of the start/end positions, for area searches
+    start_cell = Column(BigInteger)
+    end_cell = Column(BigInteger)
     start_time = Column(TIMESTAMP)
     end_time = Column(TIMESTAMP)
     trip_duration = Column(Interval)
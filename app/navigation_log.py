@@ -1,9 +1,28 @@
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models import NavigationLog
+from app.database import SessionLocal
+from app.models import NavigationLog, TurnLog
+from app.directions_codec import encode_directions
+from app.batch_writer import BatchWriter
+from app.config import LOG_WRITER_BATCH_SIZE, LOG_WRITER_FLUSH_INTERVAL, LOG_WRITER_MAX_QUEUE
 from datetime import datetime, timedelta
 
-async def save_navigation_log(
-    db: AsyncSession,
+navigation_log_writer = BatchWriter(
+    NavigationLog,
+    batch_size=LOG_WRITER_BATCH_SIZE,
+    flush_interval=LOG_WRITER_FLUSH_INTERVAL,
+    max_queue=LOG_WRITER_MAX_QUEUE,
+)
+
+# Live position and maneuver points streamed over the navigation WebSocket
+turn_log_writer = BatchWriter(
+    TurnLog,
+    batch_size=LOG_WRITER_BATCH_SIZE,
+    flush_interval=LOG_WRITER_FLUSH_INTERVAL,
+    max_queue=LOG_WRITER_MAX_QUEUE,
+)
+
+def navigation_log_row(
     user_id: int,
     start_place: str,
     destination: str,
@@ -12,20 +31,65 @@ async def save_navigation_log(
     directions: list,
     status: bool,
     message: str,
-    error: str = None
-):
+    error: str = None,
+    shape: str = None
+) -> dict:
     duration = end_time - start_time
-    log = NavigationLog(
+    return dict(
         user_id=user_id,
         start_place=start_place,
         destination=destination,
         start_time=start_time,
         end_time=end_time,
         time_taken=duration,
-        directions=directions,
+        directions=None,
+        directions_packed=encode_directions(directions, shape),
         status=status,
         message=message,
         error=error
     )
-    db.add(log)
+
+async def save_navigation_log(
+    db: AsyncSession,
+    user_id: int,
+    start_place: str,
+    destination: str,
+    start_time: datetime,
+    end_time: datetime,
+    directions: list,
+    status: bool,
+    message: str,
+    error: str = None,
+    shape: str = None
+):
+    row = navigation_log_row(
+        user_id, start_place, destination, start_time, end_time,
+        directions, status, message, error, shape
+    )
+    # Inside the app the background writer batches inserts; the request
+    # only waits for queue space. Outside it (scripts), write directly.
+    if navigation_log_writer.running:
+        await navigation_log_writer.enqueue(row)
+        return
+    db.add(NavigationLog(**row))
     await db.commit()
+
+async def save_navigation_logs(rows: list):
+    """Queue rows from navigation_log_row for the background writer (or
+    insert them in one multi-row INSERT when it isn't running)."""
+    if navigation_log_writer.running:
+        await navigation_log_writer.enqueue_many(rows)
+        return
+    async with SessionLocal() as db:
+        await db.execute(insert(NavigationLog), rows)
+        await db.commit()
+
+async def save_turn_logs(rows: list):
+    """Queue TurnLog rows for the background writer (or insert them directly
+    when it isn't running). Waits while the writer's queue is full."""
+    if turn_log_writer.running:
+        await turn_log_writer.enqueue_many(rows)
+        return
+    async with SessionLocal() as db:
+        await db.execute(insert(TurnLog), rows)
+        await db.commit()
@@ -0,0 +1,218 @@
+import asyncio
+import math
+import time
+
+import numpy as np
+
+from app.config import (
+    OFF_ROUTE_THRESHOLD_M,
+    OFF_ROUTE_MIN_FIXES,
+    OFF_ROUTE_CELL_SIZE_M,
+    OFF_ROUTE_REROUTE_COOLDOWN,
+)
+from app.route_cache import RouteResult, fetch_route, route_payload
+from app.schemas import LocationPoint, RouteRequest
+
+EARTH_RADIUS_M = 6371008.8
+
+# Grid cell (x, y) -> one int64 key; y stays well inside +/- 2**31 cells.
+_CELL_KEY = 1 << 32
+
+# Bound on the (points x segments) arrays built per distance pass.
+_MAX_PAIRS = 2_000_000
+
+_NEIGHBOURS = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+
+
+def decode_polyline(shape: str, precision: int = 6) -> np.ndarray:
+    """Decode an encoded polyline into an (n, 2) array of (lat, lon).
+
+    The whole string is decoded with array operations: bytes are split
+    into varints at their terminating 5-bit group, each varint is summed
+    with ``reduceat``, then zigzag-decoded and accumulated.
+    """
+    chunks = np.frombuffer(shape.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if not len(chunks):
+        return np.empty((0, 2))
+    ends = np.flatnonzero(chunks < 0x20)
+    if not len(ends) or ends[-1] != len(chunks) - 1 or len(ends) % 2 or chunks.min() < 0:
+        raise ValueError("Malformed polyline")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shift = 5 * (np.arange(len(chunks)) - np.repeat(starts, ends - starts + 1))
+    values = np.add.reduceat((chunks & 0x1F) << shift, starts)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 10.0 ** precision
+
+
+class RouteShape:
+    """A route's polyline as projected segments plus a uniform grid index.
+
+    Coordinates are projected to metres with an equirectangular projection
+    centred on the route, which is accurate to well under a metre over the
+    few kilometres around any one position. Every segment is registered in
+    the grid cells its bounding box touches, so the segments within one
+    cell of a position are found with a ``searchsorted`` over sorted keys.
+    """
+
+    def __init__(self, leg_shapes: list, precision: int = 6, cell_size: float = OFF_ROUTE_CELL_SIZE_M):
+        legs = [decode_polyline(shape, precision) for shape in leg_shapes] or [np.empty((0, 2))]
+        points = np.concatenate(legs)
+        # Leg of each segment (by its start point), to know which waypoints remain.
+        segment_leg = np.repeat(np.arange(len(legs)), [len(leg) for leg in legs])
+        if len(points) < 2:
+            points = np.concatenate([points, points]) if len(points) else np.zeros((2, 2))
+            segment_leg = np.zeros(2, dtype=np.int64)
+        self.segment_leg = segment_leg[:len(points) - 1]
+        self.points = points
+        self.origin_lat = float(points[:, 0].mean())
+        self.cell_size = cell_size
+
+        xy = self.project(points[:, 0], points[:, 1])
+        self.start = xy[:-1]
+        self.delta = xy[1:] - xy[:-1]
+        self.length2 = np.maximum((self.delta ** 2).sum(axis=1), 1e-9)
+        self._build_grid()
+
+    def __len__(self):
+        return len(self.start)
+
+    def project(self, lats, lons) -> np.ndarray:
+        scale = math.pi / 180 * EARTH_RADIUS_M
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        return np.stack([lons * scale * math.cos(math.radians(self.origin_lat)), lats * scale], axis=-1)
+
+    def _cells(self, xy: np.ndarray) -> np.ndarray:
+        return np.floor(xy / self.cell_size).astype(np.int64)
+
+    def _build_grid(self):
+        low = self._cells(np.minimum(self.start, self.start + self.delta))
+        high = self._cells(np.maximum(self.start, self.start + self.delta))
+        span = high - low + 1
+        count = span[:, 0] * span[:, 1]
+        segment = np.repeat(np.arange(len(self)), count)
+        k = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        cx = low[segment, 0] + k % span[segment, 0]
+        cy = low[segment, 1] + k // span[segment, 0]
+        keys = cx * _CELL_KEY + cy
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._segments = segment[order]
+
+    def _candidates(self, xy: np.ndarray) -> np.ndarray:
+        """Segments registered in the 3x3 cells around any of the points."""
+        cells = (self._cells(xy)[:, None, :] + _NEIGHBOURS).reshape(-1, 2)
+        keys = np.unique(cells[:, 0] * _CELL_KEY + cells[:, 1])
+        lo = np.searchsorted(self._keys, keys, side="left")
+        hi = np.searchsorted(self._keys, keys, side="right")
+        count = hi - lo
+        if not count.sum():
+            return np.empty(0, dtype=np.int64)
+        index = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count) + np.repeat(lo, count)
+        return np.unique(self._segments[index])
+
+    def _nearest_among(self, xy: np.ndarray, segments: np.ndarray):
+        distance = np.empty(len(xy))
+        nearest = np.empty(len(xy), dtype=np.int64)
+        step = max(1, _MAX_PAIRS // len(segments))
+        start, delta, length2 = self.start[segments], self.delta[segments], self.length2[segments]
+        for i in range(0, len(xy), step):
+            offset = xy[i:i + step, None, :] - start
+            t = np.clip((offset * delta).sum(axis=-1) / length2, 0.0, 1.0)
+            d2 = ((offset - t[..., None] * delta) ** 2).sum(axis=-1)
+            best = d2.argmin(axis=1)
+            distance[i:i + step] = np.sqrt(d2[np.arange(len(best)), best])
+            nearest[i:i + step] = segments[best]
+        return distance, nearest
+
+    def nearest(self, lats, lons):
+        """Distance in metres from each point to the route, and the index
+        of the closest segment."""
+        xy = self.project(lats, lons).reshape(-1, 2)
+        distance = np.full(len(xy), np.inf)
+        nearest = np.full(len(xy), -1, dtype=np.int64)
+        candidates = self._candidates(xy)
+        if len(candidates):
+            distance, nearest = self._nearest_among(xy, candidates)
+        # Anything in the neighbouring cells is within one cell size; points
+        # with nothing that close get an exact answer from a full scan.
+        far = distance > self.cell_size
+        if far.any():
+            distance[far], nearest[far] = self._nearest_among(xy[far], np.arange(len(self)))
+        return distance, nearest
+
+
+def route_shape(route: RouteResult, cell_size: float = OFF_ROUTE_CELL_SIZE_M) -> RouteShape:
+    legs = route.data.get("trip", {}).get("legs", [])
+    return RouteShape([leg.get("shape", "") for leg in legs], cell_size=cell_size)
+
+
+class OffRouteTracker:
+    """Follows one live trip against its current route.
+
+    ``update`` checks a batch of GPS fixes in one vectorized pass. After
+    ``min_fixes`` consecutive fixes farther than ``threshold_m`` from the
+    route, it requests a new route from the last fix through the waypoints
+    not yet reached, and from then on tracks against that route.
+    """
+
+    def __init__(self, route_request: RouteRequest, shape: RouteShape,
+                 threshold_m: float = OFF_ROUTE_THRESHOLD_M, min_fixes: int = OFF_ROUTE_MIN_FIXES):
+        self.route_request = route_request
+        self.shape = shape
+        self.threshold_m = threshold_m
+        self.min_fixes = min_fixes
+        self.off_route_fixes = 0
+        self.leg = 0
+        self.last_reroute = None
+        self.reroutes = 0
+
+    @classmethod
+    async def start(cls, route_request: RouteRequest, **kwargs):
+        """Tracker for ``route_request``'s route, or None if it has none.
+
+        Right after ``get_routes`` this is normally a route cache hit.
+        """
+        status_code, route, _cache_status = await fetch_route(route_request, route_payload(route_request))
+        if status_code != 200:
+            return None
+        shape = await asyncio.to_thread(route_shape, route)
+        return cls(route_request, shape, **kwargs)
+
+    def update(self, lats, lons) -> dict:
+        distance, segment = self.shape.nearest(lats, lons)
+        off = distance > self.threshold_m
+        on_route = np.flatnonzero(~off)
+        if len(on_route):
+            self.off_route_fixes = len(off) - 1 - int(on_route[-1])
+            self.leg = max(self.leg, int(self.shape.segment_leg[segment[on_route[-1]]]))
+        else:
+            self.off_route_fixes += len(off)
+        return {
+            "distance_m": float(distance[-1]),
+            "off_route": self.off_route_fixes >= self.min_fixes,
+        }
+
+    async def reroute(self, lat: float, lon: float):
+        """New route from (lat, lon) through the remaining waypoints.
+
+        Returns the RouteResult, or None when still cooling down from the
+        previous reroute or when the routing engine has no route.
+        """
+        now = time.monotonic()
+        if self.last_reroute is not None and now - self.last_reroute < OFF_ROUTE_REROUTE_COOLDOWN:
+            return None
+        self.last_reroute = now
+        remaining = self.route_request.locations[self.leg + 1:]
+        route_request = self.route_request.model_copy(
+            update={"locations": [LocationPoint(lat=lat, lon=lon), *remaining]}
+        )
+        status_code, route, _cache_status = await fetch_route(route_request, route_payload(route_request))
+        if status_code != 200:
+            return None
+        self.shape = await asyncio.to_thread(route_shape, route, self.shape.cell_size)
+        self.route_request = route_request
+        self.off_route_fixes = 0
+        self.leg = 0
+        self.reroutes += 1
+        return route
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import re
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.config import (
+    PARTITION_MONTHS_AHEAD,
+    PARTITION_MAINTENANCE_INTERVAL,
+    API_USAGE_RETENTION_MONTHS,
+    NAVIGATION_LOG_RETENTION_MONTHS,
+)
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Table -> (partition key column, retention in months)
+PARTITIONED_TABLES = {
+    "api_usages": ("timestamp", API_USAGE_RETENTION_MONTHS),
+    "navigation_logs": ("created_at", NAVIGATION_LOG_RETENTION_MONTHS),
+}
+
+# Arbitrary constant so only one worker runs maintenance at a time.
+_ADVISORY_LOCK_ID = 7_310_042
+
+_PARTITION_NAME = re.compile(r"_y(\d{4})m(\d{2})$")
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1, day=1,
+                         hour=0, minute=0, second=0, microsecond=0)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_ddl(table: str, month: datetime) -> str:
+    """CREATE statement for the partition holding ``month`` of ``table``."""
+    start = add_months(month, 0)
+    end = add_months(month, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, start)} "
+        f"PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+    )
+
+
+def partition_month(name: str):
+    match = _PARTITION_NAME.search(name)
+    if not match:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1)
+
+
+async def ensure_partitions(db, months_ahead: int = PARTITION_MONTHS_AHEAD) -> list:
+    """Create partitions from the current month up to ``months_ahead`` ahead."""
+    this_month = add_months(datetime.utcnow(), 0)
+    created = []
+    for table in PARTITIONED_TABLES:
+        for offset in range(months_ahead + 1):
+            month = add_months(this_month, offset)
+            exists = await db.scalar(text("SELECT to_regclass(:name)"), {"name": partition_name(table, month)})
+            if exists is None:
+                await db.execute(text(partition_ddl(table, month)))
+                created.append(partition_name(table, month))
+    return created
+
+
+async def drop_expired_partitions(db) -> list:
+    """Detach and drop whole partitions older than each table's retention.
+
+    Dropping a partition is a metadata change, unlike a bulk DELETE that
+    rewrites and bloats the table.
+    """
+    this_month = add_months(datetime.utcnow(), 0)
+    dropped = []
+    for table, (_column, retention_months) in PARTITIONED_TABLES.items():
+        if not retention_months:
+            continue
+        oldest_kept = add_months(this_month, -retention_months)
+        result = await db.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE parent.relname = :table"
+            ),
+            {"table": table},
+        )
+        for (name,) in result.all():
+            month = partition_month(name)
+            if month is not None and month < oldest_kept:
+                await db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                await db.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+    return dropped
+
+
+async def run_partition_maintenance():
+    async with SessionLocal() as db:
+        locked = await db.scalar(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": _ADVISORY_LOCK_ID})
+        if not locked:
+            return [], []
+        created = await ensure_partitions(db)
+        dropped = await drop_expired_partitions(db)
+        await db.commit()
+    if created or dropped:
+        logger.info("Partition maintenance: created %s, dropped %s", created, dropped)
+    return created, dropped
+
+
+class PartitionMaintainer:
+    """Runs partition maintenance at startup and then periodically."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await run_partition_maintenance()
+            except Exception as e:
+                logger.error("Partition maintenance failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+partition_maintainer = PartitionMaintainer(PARTITION_MAINTENANCE_INTERVAL)
+
+
+if __name__ == "__main__":
+    # For cron: python -m app.partitions
+    print(asyncio.run(run_partition_maintenance()))
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+
+from app.config import QUOTA_FLUSH_INTERVAL
+from app.database import SessionLocal
+from app.memory_cache import SingleFlight
+from app.models import APIUsage, APIUsageMonthly
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(now: datetime = None) -> datetime:
+    now = now or datetime.utcnow()
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month: datetime) -> datetime:
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+class QuotaEngine:
+    """Per-subscription monthly hit counters kept in memory.
+
+    A counter is seeded once from ``api_usage_monthly`` (or, the first time
+    a subscription is seen in a month, from a single COUNT over
+    ``api_usages``). After that every check is a dict lookup. Increments are
+    flushed to the rollup table every ``flush_interval`` seconds as
+    ``hit_count = hit_count + delta``, and the flushed total is read back so
+    counters from other workers converge.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._counters: dict = {}
+        self._pending: dict = {}
+        self._seeding = SingleFlight()
+        self._task = None
+        self._stopping = asyncio.Event()
+        self.seeds = 0
+        self.flushes = 0
+
+    async def _seed(self, key, company_id):
+        subscription_id, month = key
+        async with SessionLocal() as db:
+            hit_count = await db.scalar(
+                select(APIUsageMonthly.hit_count).where(
+                    APIUsageMonthly.subscription_id == subscription_id,
+                    APIUsageMonthly.month == month
+                )
+            )
+            if hit_count is None:
+                raw_count = await db.scalar(
+                    select(func.count()).where(
+                        and_(
+                            APIUsage.subscription_id == subscription_id,
+                            APIUsage.timestamp >= month,
+                            APIUsage.timestamp < next_month(month)
+                        )
+                    )
+                )
+                await db.execute(
+                    pg_insert(APIUsageMonthly)
+                    .values(subscription_id=subscription_id, company_id=company_id,
+                            month=month, hit_count=raw_count)
+                    .on_conflict_do_nothing(index_elements=["subscription_id", "month"])
+                )
+                await db.commit()
+                hit_count = await db.scalar(
+                    select(APIUsageMonthly.hit_count).where(
+                        APIUsageMonthly.subscription_id == subscription_id,
+                        APIUsageMonthly.month == month
+                    )
+                )
+        self.seeds += 1
+        self._counters.setdefault(key, hit_count)
+
+    async def consume(self, subscription_id: int, company_id: int, limit: int = None, count: int = 1) -> bool:
+        """Count ``count`` hits; return False (and count nothing) if that
+        would go over ``limit``."""
+        key = (subscription_id, month_start())
+        if key not in self._counters:
+            await self._seeding.do(key, lambda: self._seed(key, company_id))
+        if limit and self._counters[key] + count > limit:
+            return False
+        self._counters[key] += count
+        pending = self._pending.get(key)
+        self._pending[key] = (company_id, (pending[1] if pending else 0) + count)
+        return True
+
+    def current(self, subscription_id: int):
+        return self._counters.get((subscription_id, month_start()))
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            async with SessionLocal() as db:
+                totals = {}
+                for key, (company_id, delta) in pending.items():
+                    subscription_id, month = key
+                    stmt = pg_insert(APIUsageMonthly).values(
+                        subscription_id=subscription_id, company_id=company_id,
+                        month=month, hit_count=delta
+                    )
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["subscription_id", "month"],
+                        set_={
+                            "hit_count": APIUsageMonthly.hit_count + stmt.excluded.hit_count,
+                            "updated_at": func.now(),
+                        },
+                    ).returning(APIUsageMonthly.hit_count)
+                    totals[key] = (await db.execute(stmt)).scalar_one()
+                await db.commit()
+        except Exception as e:
+            logger.warning("Quota counter flush failed, will retry: %s", e)
+            for key, (company_id, delta) in pending.items():
+                queued = self._pending.get(key)
+                self._pending[key] = (company_id, delta + (queued[1] if queued else 0))
+            return
+        self.flushes += 1
+        current = month_start()
+        for key, total in totals.items():
+            # Hits counted while the flush was running are still pending.
+            queued = self._pending.get(key)
+            self._counters[key] = total + (queued[1] if queued else 0)
+        # Once the month rolls over, old counters are no longer checked.
+        for key in [k for k in self._counters if k[1] != current and k not in self._pending]:
+            del self._counters[key]
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "subscriptions": len(self._counters),
+            "pending_flush": sum(delta for _, delta in self._pending.values()),
+            "seeds": self.seeds,
+            "flushes": self.flushes,
+        }
+
+
+quota_engine = QuotaEngine(QUOTA_FLUSH_INTERVAL)
@@ -0,0 +1,173 @@
+import logging
+import time
+
+from app.config import RATE_LIMIT_BACKEND, RATE_LIMIT_REDIS_URL, RATE_LIMIT_RPS, RATE_LIMIT_BURST
+
+logger = logging.getLogger(__name__)
+
+# Safety net for shared slots: if a worker dies holding slots, the counter
+# expires instead of locking the subscription out forever.
+SLOT_TTL_SECONDS = 300
+
+
+class InProcessLimiterBackend:
+    """Limiter state for a single worker process."""
+
+    def __init__(self):
+        self._slots: dict = {}
+        self._buckets: dict = {}
+
+    async def acquire_slot(self, key, limit: int) -> bool:
+        in_flight = self._slots.get(key, 0)
+        if in_flight >= limit:
+            return False
+        self._slots[key] = in_flight + 1
+        return True
+
+    async def release_slot(self, key):
+        in_flight = self._slots.get(key, 0) - 1
+        if in_flight > 0:
+            self._slots[key] = in_flight
+        else:
+            self._slots.pop(key, None)
+
+    async def take_token(self, key, rate: float, burst: int) -> bool:
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return False
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+    def in_flight(self) -> dict:
+        return dict(self._slots)
+
+
+class LocalSharedStore:
+    """In-process stand-in for a shared key/value store such as Redis.
+
+    Implements the small subset of commands SharedLimiterBackend needs, so
+    the shared code path can run without a store (dev, single box).
+    """
+
+    def __init__(self):
+        self._values: dict = {}
+        self._expiry: dict = {}
+
+    def _live(self, key):
+        expires = self._expiry.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._values.pop(key, None)
+            self._expiry.pop(key, None)
+
+    async def incr(self, key) -> int:
+        self._live(key)
+        self._values[key] = self._values.get(key, 0) + 1
+        return self._values[key]
+
+    async def decr(self, key) -> int:
+        self._live(key)
+        self._values[key] = self._values.get(key, 0) - 1
+        return self._values[key]
+
+    async def expire(self, key, seconds: int):
+        self._expiry[key] = time.monotonic() + seconds
+
+
+class SharedLimiterBackend:
+    """Limiter state in a store shared by all workers (INCR/DECR/EXPIRE).
+
+    The requests-per-second limit uses a one-second fixed window per key,
+    which is what a shared counter can do atomically without scripts.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    async def acquire_slot(self, key, limit: int) -> bool:
+        slot_key = f"conc:{key}"
+        in_flight = await self.store.incr(slot_key)
+        if in_flight == 1:
+            # Only when the counter is created: refreshing it on every
+            # acquire would keep slots leaked by a dead worker alive for as
+            # long as traffic continues.
+            await self.store.expire(slot_key, SLOT_TTL_SECONDS)
+        if in_flight > limit:
+            await self._decr_slot(slot_key)
+            return False
+        return True
+
+    async def release_slot(self, key):
+        await self._decr_slot(f"conc:{key}")
+
+    async def _decr_slot(self, slot_key):
+        # The counter may have expired while requests were in flight; their
+        # releases must not take it below zero and let extra requests in.
+        if await self.store.decr(slot_key) < 0:
+            await self.store.incr(slot_key)
+
+    async def take_token(self, key, rate: float, burst: int) -> bool:
+        window_key = f"rps:{key}:{int(time.time())}"
+        hits = await self.store.incr(window_key)
+        if hits == 1:
+            await self.store.expire(window_key, 2)
+        return hits <= max(rate, burst)
+
+    def in_flight(self) -> dict:
+        return {}
+
+
+class RateLimiter:
+    """Per-subscription in-flight slots plus an optional requests/second cap."""
+
+    def __init__(self, backend, rps: float = 0, burst: int = 0):
+        self.backend = backend
+        self.rps = rps
+        self.burst = burst or max(1, int(rps))
+        self.rejected_concurrency = 0
+        self.rejected_rate = 0
+
+    async def allow_request(self, subscription_id: int) -> bool:
+        if not self.rps:
+            return True
+        if await self.backend.take_token(subscription_id, self.rps, self.burst):
+            return True
+        self.rejected_rate += 1
+        return False
+
+    async def acquire(self, subscription_id: int, max_concurrent: int) -> bool:
+        if await self.backend.acquire_slot(subscription_id, max_concurrent):
+            return True
+        self.rejected_concurrency += 1
+        return False
+
+    async def release(self, subscription_id: int):
+        await self.backend.release_slot(subscription_id)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "rps": self.rps,
+            "burst": self.burst,
+            "in_flight": self.backend.in_flight(),
+            "rejected_concurrency": self.rejected_concurrency,
+            "rejected_rate": self.rejected_rate,
+        }
+
+
+def _build_backend():
+    if RATE_LIMIT_BACKEND == "redis":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            logger.warning("RATE_LIMIT_BACKEND=redis but the 'redis' package is missing; using the local stand-in")
+            return SharedLimiterBackend(LocalSharedStore())
+        return SharedLimiterBackend(redis.from_url(RATE_LIMIT_REDIS_URL))
+    if RATE_LIMIT_BACKEND == "shared-local":
+        return SharedLimiterBackend(LocalSharedStore())
+    return InProcessLimiterBackend()
+
+
+rate_limiter = RateLimiter(_build_backend(), rps=RATE_LIMIT_RPS, burst=RATE_LIMIT_BURST)
@@ -0,0 +1,123 @@
+from app import fast_json
+from app.admission import AdmissionTicket, routing_admission
+from app.config import ROUTE_CACHE_MAX_BYTES, ROUTE_CACHE_TTL, ROUTE_CACHE_PRECISION, ROUTING_DEFAULT_PRIORITY
+from app.http_clients import get_routing_client
+from app.memory_cache import ByteLRUCache, SingleFlight
+from app.schemas import RouteRequest
+
+class RouteResult:
+    """Upstream route payload kept as raw bytes, plus the first leg's
+    maneuvers and encoded shape.
+
+    The payload is parsed once (to pull out what navigation logs need) and
+    is then only ever passed through, never re-encoded.
+    """
+    __slots__ = ("raw", "maneuvers", "shape")
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        route_data = fast_json.loads(raw)
+        leg = route_data.get("trip", {}).get("legs", [])[0]
+        self.maneuvers = leg.get("maneuvers", [])
+        self.shape = leg.get("shape")
+
+    @property
+    def data(self) -> dict:
+        return fast_json.loads(self.raw)
+
+
+route_cache = ByteLRUCache(ROUTE_CACHE_MAX_BYTES)
+route_flight = SingleFlight()  # tagged with the upstream call's AdmissionTicket
+
+
+def route_cache_key(route_request: RouteRequest) -> tuple:
+    """Waypoints rounded to ROUTE_CACHE_PRECISION plus the routing options."""
+    locations = tuple(
+        (round(loc.lat, ROUTE_CACHE_PRECISION), round(loc.lon, ROUTE_CACHE_PRECISION))
+        for loc in route_request.locations
+    )
+    return (locations, route_request.costing, route_request.units, route_request.language)
+
+
+def route_payload(route_request: RouteRequest) -> dict:
+    """Body for the routing engine's /route call."""
+    return {
+        "locations": [
+            {"lat": loc.lat, "lon": loc.lon}
+            for loc in route_request.locations
+        ],
+        "costing": route_request.costing,
+        "directions_options": {
+            "units": route_request.units or "kilometers",
+            "language": route_request.language or "en-US"
+        },
+        "alternatives": {
+            "target_count": 3
+        }
+    }
+
+
+async def _post_route(payload: dict, priority: int, ticket: AdmissionTicket = None):
+    client = get_routing_client()
+    async with routing_admission.slot(priority, ticket=ticket):
+        response = await client.post(
+            "/route",
+            json=payload,
+            headers={"Content-Type": "application/json"}
+        )
+    if response.status_code != 200:
+        return response.status_code, None, 0
+    return response.status_code, RouteResult(response.content), len(response.content)
+
+
+async def fetch_route(route_request: RouteRequest, payload: dict, priority: int = ROUTING_DEFAULT_PRIORITY):
+    """Return (status_code, RouteResult, cache_status) for a route request.
+
+    Successful results are cached for ROUTE_CACHE_TTL seconds and identical
+    requests already in flight share one upstream call. Connection errors
+    and timeouts propagate as httpx exceptions to every waiting caller.
+    Upstream calls go through routing admission at ``priority`` and raise
+    app.admission.Overloaded when no slot is free in time; a coalesced
+    call is promoted to the highest priority among its callers.
+    """
+    if not ROUTE_CACHE_MAX_BYTES:
+        status_code, result, _size = await _post_route(payload, priority)
+        return status_code, result, "BYPASS"
+
+    key = route_cache_key(route_request)
+    entry = route_cache.get(key, max_age=ROUTE_CACHE_TTL)
+    if entry is not None:
+        return 200, entry.value, "HIT"
+
+    was_in_flight = route_flight.in_flight(key)
+    ticket = route_flight.tag(key)
+    if ticket is not None:
+        routing_admission.promote(ticket, priority)
+    else:
+        ticket = AdmissionTicket(priority)
+    status_code, result = await route_flight.do(key, lambda: _store(key, payload, ticket), tag=ticket)
+    return status_code, result, "COALESCED" if was_in_flight else "MISS"
+
+
+async def _store(key, payload: dict, ticket: AdmissionTicket):
+    status_code, result, size = await _post_route(payload, ticket.priority, ticket)
+    if status_code == 200:
+        route_cache.set(key, result, size)
+    return status_code, result
+
+
+def route_cache_stats() -> dict:
+    if not ROUTE_CACHE_MAX_BYTES:
+        return {"enabled": False}
+    stats = route_cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    flight = route_flight.stats()
+    return {
+        "enabled": True,
+        "ttl": ROUTE_CACHE_TTL,
+        "precision": ROUTE_CACHE_PRECISION,
+        **stats,
+        "coalescing": flight,
+        # Coalesced requests never reach the engine either.
+        "upstream_avoided_ratio": (stats["hits"] + flight["coalesced"]) / lookups if lookups else 0.0,
+    }
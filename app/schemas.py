@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
@@ -51,6 +51,7 @@ class PlanCreate(BaseModel):
     api_hit_limit: Optional[int] = None
     concurrent_connections: Optional[int] = None
     per_api_hit_price: Optional[float] = None
+    priority: int = 0
 
 class PlanOut(PlanCreate):
     id: int
@@ -107,6 +108,9 @@ class InvoiceCreate(BaseModel):
     payment_ref: Optional[str]
     due_date: Optional[datetime]
     paid_date: Optional[datetime]
+    period: Optional[datetime] = None
+    api_hits: Optional[int] = None
+    overage_amount: Optional[float] = None
 
 class InvoiceOut(InvoiceCreate):
     id: int
@@ -146,6 +150,34 @@ class RouteResponse(BaseModel):
     data: Optional[dict] = None
     error: Optional[str] = None
     
+class RouteBatchRequest(BaseModel):
+    requests: List[RouteRequest]
+    ordered: bool = True  # False streams results as they complete
+
+class RouteBatchItem(RouteResponse):
+    index: int
+
+class RouteBatchResponse(BaseModel):
+    status: bool
+    msg: str
+    results: List[RouteBatchItem]
+    
+class MatrixRequest(BaseModel):
+    sources: List[LocationPoint]
+    targets: List[LocationPoint]
+    costing: str = "auto"
+    units: Optional[str] = "kilometers"
+
+class MatrixResponse(BaseModel):
+    status: bool
+    msg: str
+    rows: int = 0
+    cols: int = 0
+    # Row-major, rows * cols long; null where no route exists
+    distances: Optional[List[Optional[float]]] = None
+    durations: Optional[List[Optional[float]]] = None
+    error: Optional[str] = None
+    
 class NavigationStatus(str, Enum):
     completed = "completed"
     half_completed = "half_completed"
@@ -158,6 +190,21 @@ class TurnLogCreate(BaseModel):
     longitude: float
     timestamp: datetime
 
+# Live navigation WebSocket messages
+class LivePoint(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+    instruction: Optional[str] = None
+    timestamp: Optional[float] = None  # epoch seconds
+
+class LiveTripStart(BaseModel):
+    start_place: str = ""
+    destination: str = ""
+    start_lat: Optional[float] = Field(None, ge=-90, le=90)
+    start_lng: Optional[float] = Field(None, ge=-180, le=180)
+    end_lat: Optional[float] = Field(None, ge=-90, le=90)
+    end_lng: Optional[float] = Field(None, ge=-180, le=180)
+
 class NavigationLogHistoryCreate(BaseModel):
     navigation_log_id: int | None = None
     start_place: str
@@ -170,4 +217,77 @@ class NavigationLogHistoryCreate(BaseModel):
     end_time: datetime
     status: NavigationStatus
     message: str
-    turn_logs: List[TurnLogCreate] = []
\ No newline at end of file
+    turn_logs: List[TurnLogCreate] = []
+
+class TripIngestRequest(BaseModel):
+    trips: List[NavigationLogHistoryCreate]
+
+class TripIngestResult(BaseModel):
+    index: int
+    status: bool
+    id: Optional[int] = None
+    turn_logs: int = 0
+    error: Optional[str] = None
+
+class TripIngestResponse(BaseModel):
+    status: bool
+    msg: str
+    stored: int = 0
+    rejected: int = 0
+    rows_written: int = 0
+    elapsed_ms: float = 0.0
+    rows_per_second: float = 0.0
+    results: List[TripIngestResult] = []
+
+class TripOut(BaseModel):
+    id: int
+    navigation_log_id: Optional[int] = None
+    start_place: Optional[str] = None
+    destination: Optional[str] = None
+    start_lat: Optional[float] = None
+    start_lng: Optional[float] = None
+    end_lat: Optional[float] = None
+    end_lng: Optional[float] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    status: Optional[NavigationStatus] = None
+    message: Optional[str] = None
+    # Metres from the search centre (radius searches only)
+    distance_m: Optional[float] = None
+
+class TripSearchResponse(BaseModel):
+    status: bool
+    msg: str
+    count: int = 0
+    trips: List[TripOut] = []
+
+class UsageStats(BaseModel):
+    hits: int = 0
+    client_errors: int = 0  # 4xx
+    server_errors: int = 0  # 5xx
+    avg_ms: Optional[float] = None
+    # Approximate (latency histogram, within 12.5%, or 1 ms below 16 ms)
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    p99_ms: Optional[float] = None
+    max_ms: Optional[int] = None
+
+class UsageTimeseriesPoint(UsageStats):
+    bucket: datetime
+
+class UsageEndpointStats(UsageStats):
+    endpoint: str
+
+class UsageTimeseriesResponse(BaseModel):
+    status: bool
+    granularity: str
+    start: datetime
+    end: datetime
+    points: List[UsageTimeseriesPoint] = []
+
+class UsageEndpointsResponse(BaseModel):
+    status: bool
+    start: datetime
+    end: datetime
+    total: UsageStats
+    endpoints: List[UsageEndpointStats] = []
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends
+
+from app.auth import check_authorization_key
+from app.http_clients import pool_stats
+from app.tile_cache import tile_cache_stats
+from app.route_cache import route_cache_stats
+from app.navigation_log import navigation_log_writer, turn_log_writer
+from app.api_usage import api_usage_writer
+from app.quota import quota_engine
+from app.usage_rollups import usage_rollups
+from app.rate_limiter import rate_limiter
+from app.api_key_cache import api_key_cache_stats
+from app.user_cache import user_cache_stats
+from app.user_maps import live_navigation
+from app.email_utils import mailer
+from app.background import background
+from app.admission import routing_admission
+
+router = APIRouter()
+
+# Operational counters; kept outside /api/ so they bypass API-key tracking.
+@router.get("/internal/stats")
+async def service_stats(_auth=Depends(check_authorization_key)):
+    return {
+        "upstream_pools": pool_stats(),
+        "tile_cache": await tile_cache_stats(),
+        "route_cache": route_cache_stats(),
+        "routing_admission": routing_admission.stats(),
+        "quota": quota_engine.stats(),
+        "usage_rollups": usage_rollups.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "api_key_cache": api_key_cache_stats(),
+        "auth_user_cache": user_cache_stats(),
+        "live_navigation": dict(live_navigation),
+        "mailer": mailer.stats(),
+        "background": background.stats(),
+        "log_writers": {
+            "navigation_logs": navigation_log_writer.stats(),
+            "turn_logs": turn_log_writer.stats(),
+            "api_usages": api_usage_writer.stats(),
+        },
+    }
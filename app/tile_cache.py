@@ -0,0 +1,288 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+from app.config import (
+    TILE_CACHE_ENABLED,
+    TILE_CACHE_PATH,
+    TILE_CACHE_MAX_BYTES,
+    TILE_CACHE_DEFAULT_TTL,
+    TILE_CACHE_TTLS,
+    HOT_TILE_CACHE_MAX_BYTES,
+    HOT_TILE_TTL,
+    HOT_TILE_STALE_TTL,
+)
+from app.background import background
+from app.http_clients import get_tile_client
+from app.memory_cache import ByteLRUCache, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Public style name -> style id on the tile server
+TILE_STYLES = {
+    "day": "test-style",
+    "night": "maptiler-basic",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tiles (
+    style TEXT NOT NULL,
+    zoom_level INTEGER NOT NULL,
+    tile_column INTEGER NOT NULL,
+    tile_row INTEGER NOT NULL,
+    tile_data BLOB NOT NULL,
+    content_type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (style, zoom_level, tile_column, tile_row)
+);
+CREATE INDEX IF NOT EXISTS tiles_last_access ON tiles (last_access);
+"""
+
+
+class DiskTileCache:
+    """Tiles stored in a single SQLite file with a byte cap and LRU eviction.
+
+    SQLite calls are blocking, so every operation runs in a worker thread
+    behind one connection guarded by a lock.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttls: dict, default_ttl: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self._conn = None
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.read_errors = 0
+
+    def ttl_for(self, style: str) -> int:
+        return self.ttls.get(style, self.default_ttl)
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+        self._conn = conn
+
+    def _close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # Before open() / after close() the cache is skipped: lookups miss and
+    # tiles are served from upstream without being stored.
+    def _get(self, style, z, x, y):
+        with self._lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT tile_data, content_type, fetched_at FROM tiles "
+                "WHERE style = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (style, z, x, y),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE tiles SET last_access = ? "
+                "WHERE style = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (time.time(), style, z, x, y),
+            )
+            return row
+
+    def _put(self, style, z, x, y, data, content_type):
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                return
+            old = self._conn.execute(
+                "SELECT size FROM tiles "
+                "WHERE style = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (style, z, x, y),
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (style, z, x, y, data, content_type, len(data), now, now),
+            )
+            self._total_bytes += len(data) - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Trim to 90% of the cap so eviction doesn't run on every insert.
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT style, zoom_level, tile_column, tile_row, size FROM tiles "
+                "ORDER BY last_access LIMIT 500"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            self._conn.execute("BEGIN")
+            for style, z, x, y, size in rows:
+                self._conn.execute(
+                    "DELETE FROM tiles "
+                    "WHERE style = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                    (style, z, x, y),
+                )
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= target:
+                    break
+            self._conn.execute("COMMIT")
+
+    def _count(self):
+        with self._lock:
+            if self._conn is None:
+                return 0
+            return self._conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+
+    async def open(self):
+        await asyncio.to_thread(self._open)
+
+    async def close(self):
+        await asyncio.to_thread(self._close)
+
+    async def get(self, style: str, z: int, x: int, y: int):
+        """Return (data, content_type) for a fresh tile, or None.
+
+        A cache file that can't be read (locked, corrupt, disk full) counts
+        as a miss, so the tile is fetched from upstream instead.
+        """
+        try:
+            row = await asyncio.to_thread(self._get, style, z, x, y)
+        except sqlite3.Error as e:
+            logger.warning("Could not read tile %s/%s/%s/%s: %s", style, z, x, y, e)
+            self.read_errors += 1
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        data, content_type, fetched_at = row
+        if time.time() - fetched_at > self.ttl_for(style):
+            self.expired += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data, content_type
+
+    async def put(self, style: str, z: int, x: int, y: int, data: bytes, content_type: str):
+        await asyncio.to_thread(self._put, style, z, x, y, data, content_type)
+
+    async def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": await asyncio.to_thread(self._count),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "read_errors": self.read_errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+disk_tile_cache = DiskTileCache(
+    TILE_CACHE_PATH, TILE_CACHE_MAX_BYTES, TILE_CACHE_TTLS, TILE_CACHE_DEFAULT_TTL
+)
+
+
+async def start_tile_cache():
+    if TILE_CACHE_ENABLED:
+        await disk_tile_cache.open()
+
+
+async def close_tile_cache():
+    if TILE_CACHE_ENABLED:
+        await disk_tile_cache.close()
+
+
+async def fetch_upstream_tile(style: str, z: int, x: int, y: int):
+    client = get_tile_client()
+    response = await client.get(f"/styles/{TILE_STYLES[style]}/256/{z}/{x}/{y}.png")
+    response.raise_for_status()
+    return response.content, response.headers["Content-Type"]
+
+
+hot_tiles = ByteLRUCache(HOT_TILE_CACHE_MAX_BYTES)
+tile_flight = SingleFlight()
+stale_served = 0
+
+
+async def _load_tile(style: str, z: int, x: int, y: int):
+    """Disk, then upstream; whatever is found is promoted to memory."""
+    status = "MISS"
+    cached = None
+    if TILE_CACHE_ENABLED:
+        cached = await disk_tile_cache.get(style, z, x, y)
+    if cached is not None:
+        data, content_type = cached
+        status = "DISK"
+    else:
+        data, content_type = await fetch_upstream_tile(style, z, x, y)
+        if TILE_CACHE_ENABLED:
+            try:
+                await disk_tile_cache.put(style, z, x, y, data, content_type)
+            except sqlite3.Error as e:
+                logger.warning("Could not store tile %s/%s/%s/%s: %s", style, z, x, y, e)
+    if HOT_TILE_CACHE_MAX_BYTES:
+        hot_tiles.set((style, z, x, y), (data, content_type), len(data))
+    return data, content_type, status
+
+
+def _revalidate(style: str, z: int, x: int, y: int):
+    key = (style, z, x, y)
+    if tile_flight.in_flight(key):
+        return
+    # Shed under load: the stale tile has already been served.
+    background.submit("tile_refresh", tile_flight.do, key, lambda: _load_tile(style, z, x, y), key=key)
+
+
+async def get_tile(style: str, z: int, x: int, y: int):
+    """Return (data, content_type, cache_status) for a tile.
+
+    Lookup order is memory, disk, tile server. Concurrent misses for the
+    same tile share one load, and a tile slightly past its memory TTL is
+    served stale while a single background load refreshes it. Upstream
+    errors propagate as httpx exceptions for the caller to map to HTTP
+    responses.
+    """
+    global stale_served
+    key = (style, z, x, y)
+    if HOT_TILE_CACHE_MAX_BYTES:
+        entry = hot_tiles.get(key)
+        if entry is not None:
+            data, content_type = entry.value
+            age = entry.age
+            if age <= HOT_TILE_TTL:
+                return data, content_type, "HIT"
+            if age <= HOT_TILE_TTL + HOT_TILE_STALE_TTL:
+                stale_served += 1
+                _revalidate(style, z, x, y)
+                return data, content_type, "STALE"
+    return await tile_flight.do(key, lambda: _load_tile(style, z, x, y))
+
+
+async def tile_cache_stats() -> dict:
+    stats = {
+        "memory": {**hot_tiles.stats(), "stale_served": stale_served},
+        "coalescing": tile_flight.stats(),
+    }
+    if TILE_CACHE_ENABLED:
+        stats["disk"] = await disk_tile_cache.stats()
+    return stats
@@ -0,0 +1,8 @@
+from datetime import datetime, timezone
+
+
+def naive_utc(value: datetime) -> datetime:
+    """TIMESTAMP columns are stored as naive UTC."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,250 @@
+from datetime import datetime
+import logging
+import math
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, insert, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import TRIP_INGEST_MAX_TRIPS, TRIP_INGEST_MAX_TURN_LOGS, TRIP_INGEST_CHUNK_SIZE
+from app.config import TRIP_SEARCH_MAX_RADIUS_M, TRIP_SEARCH_MAX_RESULTS
+from app.geo_cells import EARTH_RADIUS_M, cell_ranges, encode_cell, radius_bbox
+from app.models import NavigationLogHistory, TurnLog
+from app.schemas import NavigationLogHistoryCreate, TripIngestRequest, TripIngestResponse, TripIngestResult
+from app.schemas import TripOut, TripSearchResponse
+from app.timestamps import naive_utc
+from app.user_cache import AuthUser
+from app.user_maps import get_db, verify_auth
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# VARCHAR(255) columns; longer values would fail the whole batch.
+MAX_TEXT_LENGTH = 255
+
+TURN_LOG_COLUMNS = ("navigation_id", "instruction", "latitude", "longitude", "timestamp")
+
+
+def _trip_error(trip: NavigationLogHistoryCreate):
+    if trip.end_time < trip.start_time:
+        return "end_time is before start_time"
+    for field in ("start_place", "destination", "message"):
+        if len(getattr(trip, field)) > MAX_TEXT_LENGTH:
+            return f"{field} is longer than {MAX_TEXT_LENGTH} characters"
+    for i, turn in enumerate(trip.turn_logs):
+        if len(turn.instruction) > MAX_TEXT_LENGTH:
+            return f"turn_logs[{i}].instruction is longer than {MAX_TEXT_LENGTH} characters"
+    return None
+
+
+def history_row(user_id: int, trip: NavigationLogHistoryCreate) -> dict:
+    start_time, end_time = naive_utc(trip.start_time), naive_utc(trip.end_time)
+    return dict(
+        user_id=user_id,
+        navigation_log_id=trip.navigation_log_id,
+        start_place=trip.start_place,
+        destination=trip.destination,
+        start_lat=trip.start_lat,
+        start_lng=trip.start_lng,
+        end_lat=trip.end_lat,
+        end_lng=trip.end_lng,
+        start_cell=encode_cell(trip.start_lat, trip.start_lng),
+        end_cell=encode_cell(trip.end_lat, trip.end_lng),
+        start_time=start_time,
+        end_time=end_time,
+        trip_duration=end_time - start_time,
+        status=trip.status.value,
+        message=trip.message
+    )
+
+
+async def insert_trips(db: AsyncSession, user_id: int, trips: list) -> list:
+    """Insert trips and all their turn logs; return the new history ids.
+
+    History rows go in as one executemany with RETURNING (ids come back in
+    parameter order). Turn logs are streamed with COPY on the same
+    connection, TRIP_INGEST_CHUNK_SIZE records at a time, so they commit
+    together with their trips.
+    """
+    result = await db.execute(
+        insert(NavigationLogHistory).returning(NavigationLogHistory.id, sort_by_parameter_order=True),
+        [history_row(user_id, trip) for trip in trips]
+    )
+    ids = result.scalars().all()
+    records = [
+        (navigation_id, turn.instruction, turn.latitude, turn.longitude, naive_utc(turn.timestamp))
+        for navigation_id, trip in zip(ids, trips)
+        for turn in trip.turn_logs
+    ]
+    if records:
+        connection = await db.connection()
+        raw = (await connection.get_raw_connection()).driver_connection
+        for start in range(0, len(records), TRIP_INGEST_CHUNK_SIZE):
+            await raw.copy_records_to_table(
+                TurnLog.__tablename__,
+                records=records[start:start + TRIP_INGEST_CHUNK_SIZE],
+                columns=TURN_LOG_COLUMNS
+            )
+    await db.commit()
+    return ids
+
+
+@router.post("/api/trips", response_model=TripIngestResponse)
+async def ingest_trips(
+    request: TripIngestRequest,
+    user: AuthUser = Depends(verify_auth),
+    db: AsyncSession = Depends(get_db)
+):
+    """Store completed trips (navigation history plus turn points) in bulk.
+
+    Trips that fail validation are reported and skipped; the rest are
+    written in one transaction. The response lists a result per trip in
+    request order.
+    """
+    if len(request.trips) > TRIP_INGEST_MAX_TRIPS:
+        raise HTTPException(status_code=413, detail=f"At most {TRIP_INGEST_MAX_TRIPS} trips per request")
+    if sum(len(trip.turn_logs) for trip in request.trips) > TRIP_INGEST_MAX_TURN_LOGS:
+        raise HTTPException(status_code=413, detail=f"At most {TRIP_INGEST_MAX_TURN_LOGS} turn logs per request")
+
+    results = [TripIngestResult(index=i, status=False) for i in range(len(request.trips))]
+    accepted = []
+    for i, trip in enumerate(request.trips):
+        error = _trip_error(trip)
+        if error:
+            results[i].error = error
+        else:
+            accepted.append(i)
+    if not accepted:
+        return TripIngestResponse(status=False, msg="No valid trips", rejected=len(results), results=results)
+
+    trips = [request.trips[i] for i in accepted]
+    started = time.perf_counter()
+    try:
+        ids = await insert_trips(db, user.id, trips)
+    except Exception as e:
+        await db.rollback()
+        logger.error("Trip ingestion of %d trips failed: %s", len(trips), e)
+        return TripIngestResponse(
+            status=False, msg="Failed to store trips", rejected=len(results),
+            results=[TripIngestResult(index=r.index, status=False, error=r.error or "Not stored") for r in results]
+        )
+    elapsed = time.perf_counter() - started
+
+    rows_written = 0
+    for i, trip, navigation_id in zip(accepted, trips, ids):
+        results[i] = TripIngestResult(index=i, status=True, id=navigation_id, turn_logs=len(trip.turn_logs))
+        rows_written += 1 + len(trip.turn_logs)
+    rows_per_second = rows_written / elapsed if elapsed else 0.0
+    logger.info("Stored %d trips, %d rows in %.1f ms (%.0f rows/s)",
+                len(ids), rows_written, elapsed * 1000, rows_per_second)
+    rejected = len(results) - len(ids)
+    return TripIngestResponse(
+        status=rejected == 0,
+        msg=f"{len(ids)} of {len(results)} trips stored",
+        stored=len(ids),
+        rejected=rejected,
+        rows_written=rows_written,
+        elapsed_ms=round(elapsed * 1000, 2),
+        rows_per_second=round(rows_per_second, 1),
+        results=results
+    )
+
+
+# Search point -> (lat, lng, cell) columns
+_POINT_COLUMNS = {
+    "start": (NavigationLogHistory.start_lat, NavigationLogHistory.start_lng, NavigationLogHistory.start_cell),
+    "end": (NavigationLogHistory.end_lat, NavigationLogHistory.end_lng, NavigationLogHistory.end_cell),
+}
+
+
+def _in_cells(column, ranges: list):
+    """Index-friendly filter: one BETWEEN per covering cell range."""
+    return or_(*(column.between(low, high) for low, high in ranges))
+
+
+def _distance_m(lat_column, lng_column, lat: float, lng: float):
+    """Haversine distance in metres from (lat, lng), as a SQL expression."""
+    half_dlat = func.radians(lat_column - lat) / 2
+    half_dlng = func.radians(lng_column - lng) / 2
+    a = (func.power(func.sin(half_dlat), 2)
+         + math.cos(math.radians(lat)) * func.cos(func.radians(lat_column)) * func.power(func.sin(half_dlng), 2))
+    return 2 * EARTH_RADIUS_M * func.asin(func.sqrt(func.least(a, 1.0)))
+
+
+def _trip_out(trip: NavigationLogHistory, distance_m: float = None) -> TripOut:
+    out = TripOut.model_validate(trip, from_attributes=True)
+    if distance_m is not None:
+        out.distance_m = round(distance_m, 1)
+    return out
+
+
+@router.get("/api/trips/nearby", response_model=TripSearchResponse)
+async def trips_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(500, gt=0, le=TRIP_SEARCH_MAX_RADIUS_M),
+    point: str = Query("start", pattern="^(start|end)$"),
+    limit: int = Query(100, ge=1, le=TRIP_SEARCH_MAX_RESULTS),
+    user: AuthUser = Depends(verify_auth),
+    db: AsyncSession = Depends(get_db)
+):
+    """The user's trips that started (or ended) within ``radius_m`` of a
+    point, nearest first.
+
+    The circle's bounding box is covered by a few cell id ranges, scanned
+    on the (user_id, cell) index; only those rows get the exact distance
+    check.
+    """
+    lat_column, lng_column, cell_column = _POINT_COLUMNS[point]
+    distance = _distance_m(lat_column, lng_column, lat, lng)
+    result = await db.execute(
+        select(NavigationLogHistory, distance.label("distance_m"))
+        .where(
+            NavigationLogHistory.user_id == user.id,
+            _in_cells(cell_column, cell_ranges(*radius_bbox(lat, lng, radius_m))),
+            distance <= radius_m
+        )
+        .order_by(distance)
+        .limit(limit)
+    )
+    trips = [_trip_out(trip, distance_m) for trip, distance_m in result.all()]
+    return TripSearchResponse(status=True, msg=f"{len(trips)} trips found", count=len(trips), trips=trips)
+
+
+@router.get("/api/trips/within", response_model=TripSearchResponse)
+async def trips_within(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lng: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lng: float = Query(..., ge=-180, le=180),
+    point: str = Query("start", pattern="^(start|end)$"),
+    limit: int = Query(100, ge=1, le=TRIP_SEARCH_MAX_RESULTS),
+    user: AuthUser = Depends(verify_auth),
+    db: AsyncSession = Depends(get_db)
+):
+    """The user's trips that started (or ended) inside a bounding box, most
+    recent first. ``min_lng > max_lng`` means the box crosses the
+    antimeridian."""
+    if min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="min_lat must not be greater than max_lat")
+    lat_column, lng_column, cell_column = _POINT_COLUMNS[point]
+    if min_lng <= max_lng:
+        in_lng = lng_column.between(min_lng, max_lng)
+    else:
+        in_lng = or_(lng_column >= min_lng, lng_column <= max_lng)
+    result = await db.execute(
+        select(NavigationLogHistory)
+        .where(
+            NavigationLogHistory.user_id == user.id,
+            _in_cells(cell_column, cell_ranges(min_lat, min_lng, max_lat, max_lng)),
+            lat_column.between(min_lat, max_lat),
+            in_lng
+        )
+        .order_by(NavigationLogHistory.date.desc())
+        .limit(limit)
+    )
+    trips = [_trip_out(trip) for trip in result.scalars().all()]
+    return TripSearchResponse(status=True, msg=f"{len(trips)} trips found", count=len(trips), trips=trips)
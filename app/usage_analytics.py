@@ -0,0 +1,208 @@
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy import and_, case, func, or_, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.api_key_cache import SubscriptionSnapshot, resolve_api_key
+from app.config import USAGE_ANALYTICS_MAX_POINTS
+from app.latency_histogram import LatencyHistogram
+from app.models import APIUsageRollup
+from app.schemas import UsageEndpointStats, UsageEndpointsResponse, UsageStats
+from app.schemas import UsageTimeseriesPoint, UsageTimeseriesResponse
+from app.timestamps import naive_utc
+from app.usage_rollups import GRANULARITIES, bucket_start
+from app.database import SessionLocal
+
+# Usage analytics for the caller's company. Everything is read from
+# api_usage_rollups (never from the raw api_usages rows), so a query costs
+# the number of buckets in range, not the number of hits.
+router = APIRouter()
+
+
+async def get_subscription(x_api_key: str = Header(..., alias="X-API-Key")) -> SubscriptionSnapshot:
+    subscription = await resolve_api_key(x_api_key)
+    if not subscription:
+        raise HTTPException(status_code=401, detail="Invalid or expired API key")
+    return subscription
+
+
+async def get_snapshot_db():
+    # One REPEATABLE READ snapshot per request: the counters and histogram
+    # queries must see the same rollup rows even if a flush commits between them.
+    async with SessionLocal() as session:
+        await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        yield session
+
+
+def _bucket_end(timestamp: datetime, granularity: str) -> datetime:
+    """Start of the first bucket at or after ``timestamp``."""
+    start = bucket_start(timestamp, granularity)
+    return start if start == timestamp else start + GRANULARITIES[granularity]
+
+
+def _range(start: datetime, end: datetime, granularity: str):
+    end = naive_utc(end) if end else datetime.utcnow()
+    start = naive_utc(start) if start else end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return bucket_start(start, granularity), _bucket_end(end, granularity)
+
+
+def _cover(start: datetime, end: datetime, levels=("day", "hour", "minute")) -> list:
+    """(granularity, start, end) pieces covering [start, end) with the
+    fewest buckets: whole days in the middle, hours and minutes at the
+    edges. ``start`` and ``end`` are whole minutes."""
+    granularity, *finer = levels
+    if not finer:
+        return [(granularity, start, end)] if start < end else []
+    first, last = _bucket_end(start, granularity), bucket_start(end, granularity)
+    if first >= last:
+        return _cover(start, end, finer)
+    return _cover(start, first, finer) + [(granularity, first, last)] + _cover(last, end, finer)
+
+
+async def _aggregate(db: AsyncSession, key, where: list) -> dict:
+    """Counters and merged latency histogram per ``key`` value.
+
+    Runs two queries, so ``db`` must read from one snapshot (get_snapshot_db).
+    """
+    result = await db.execute(
+        select(
+            key,
+            func.sum(APIUsageRollup.hits),
+            func.sum(case((APIUsageRollup.status_class == 4, APIUsageRollup.hits), else_=0)),
+            func.sum(case((APIUsageRollup.status_class == 5, APIUsageRollup.hits), else_=0)),
+            func.sum(APIUsageRollup.latency_sum_ms),
+            func.max(APIUsageRollup.latency_max_ms),
+        )
+        .where(*where)
+        .group_by(key)
+    )
+    groups = {
+        value: {
+            "hits": int(hits), "client_errors": int(client_errors), "server_errors": int(server_errors),
+            "latency_sum_ms": int(latency_sum_ms), "max_ms": max_ms, "histogram": LatencyHistogram(),
+        }
+        for value, hits, client_errors, server_errors, latency_sum_ms, max_ms in result.all()
+    }
+    # Histograms are merged in the database: one (key, bucket index) row
+    # each, instead of every rollup row's array.
+    counts = func.unnest(APIUsageRollup.latency_histogram).table_valued("count", with_ordinality="i").render_derived()
+    result = await db.execute(
+        select(key, counts.c.i, func.sum(counts.c.count))
+        .select_from(APIUsageRollup)
+        .join(counts, true())
+        .where(*where)
+        .group_by(key, counts.c.i)
+    )
+    for value, i, count in result.all():
+        histogram = groups[value]["histogram"]
+        if len(histogram.counts) < i:
+            histogram.counts.extend([0] * (i - len(histogram.counts)))
+        histogram.counts[i - 1] = int(count)
+    return groups
+
+
+def _merge(groups) -> dict:
+    total = {"hits": 0, "client_errors": 0, "server_errors": 0, "latency_sum_ms": 0,
+             "max_ms": None, "histogram": LatencyHistogram()}
+    for group in groups:
+        for field in ("hits", "client_errors", "server_errors", "latency_sum_ms"):
+            total[field] += group[field]
+        if group["max_ms"] is not None:
+            total["max_ms"] = max(total["max_ms"] or 0, group["max_ms"])
+        total["histogram"].merge(group["histogram"])
+    return total
+
+
+def _stats(group: dict) -> dict:
+    histogram = group["histogram"]
+
+    def percentile(q):
+        value = histogram.percentile(q)
+        return None if value is None else round(value, 1)
+
+    return dict(
+        hits=group["hits"],
+        client_errors=group["client_errors"],
+        server_errors=group["server_errors"],
+        avg_ms=round(group["latency_sum_ms"] / group["hits"], 1) if group["hits"] else None,
+        p50_ms=percentile(50),
+        p95_ms=percentile(95),
+        p99_ms=percentile(99),
+        max_ms=group["max_ms"],
+    )
+
+
+def _filters(subscription: SubscriptionSnapshot, subscription_id: int, endpoint: str) -> list:
+    where = [APIUsageRollup.company_id == subscription.company_id]
+    if subscription_id is not None:
+        where.append(APIUsageRollup.subscription_id == subscription_id)
+    if endpoint is not None:
+        where.append(APIUsageRollup.endpoint == endpoint)
+    return where
+
+
+@router.get("/api/usage/timeseries", response_model=UsageTimeseriesResponse)
+async def usage_timeseries(
+    granularity: str = Query("hour", pattern="^(minute|hour|day)$"),
+    start: datetime = Query(None, description="Defaults to 24 hours before end"),
+    end: datetime = Query(None, description="Defaults to now"),
+    endpoint: str = Query(None, description="Route template, e.g. /api/trips/nearby"),
+    subscription_id: int = Query(None),
+    subscription: SubscriptionSnapshot = Depends(get_subscription),
+    db: AsyncSession = Depends(get_snapshot_db)
+):
+    """Hits, errors and latency percentiles of the company's API usage per
+    minute, hour or day. Minute and hour buckets are only kept for a
+    limited time (ROLLUP_*_RETENTION_DAYS)."""
+    start, end = _range(start, end, granularity)
+    if (end - start) / GRANULARITIES[granularity] > USAGE_ANALYTICS_MAX_POINTS:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {USAGE_ANALYTICS_MAX_POINTS} {granularity} buckets per request")
+    where = _filters(subscription, subscription_id, endpoint) + [
+        APIUsageRollup.granularity == granularity,
+        APIUsageRollup.bucket >= start,
+        APIUsageRollup.bucket < end,
+    ]
+    groups = await _aggregate(db, APIUsageRollup.bucket, where)
+    points = [UsageTimeseriesPoint(bucket=bucket, **_stats(groups[bucket])) for bucket in sorted(groups)]
+    return UsageTimeseriesResponse(status=True, granularity=granularity, start=start, end=end, points=points)
+
+
+@router.get("/api/usage/endpoints", response_model=UsageEndpointsResponse)
+async def usage_by_endpoint(
+    start: datetime = Query(None, description="Defaults to 24 hours before end"),
+    end: datetime = Query(None, description="Defaults to now"),
+    subscription_id: int = Query(None),
+    subscription: SubscriptionSnapshot = Depends(get_subscription),
+    db: AsyncSession = Depends(get_snapshot_db)
+):
+    """Per-endpoint totals and latency percentiles over [start, end),
+    rounded out to whole minutes.
+
+    The range is read as whole days plus the hours and minutes at its
+    edges, so a long range touches few rows.
+    """
+    start, end = _range(start, end, "minute")
+    pieces = _cover(start, end)
+    where = _filters(subscription, subscription_id, None) + [or_(*(
+        and_(APIUsageRollup.granularity == granularity,
+             APIUsageRollup.bucket >= piece_start,
+             APIUsageRollup.bucket < piece_end)
+        for granularity, piece_start, piece_end in pieces
+    ))]
+    groups = await _aggregate(db, APIUsageRollup.endpoint, where)
+    endpoints = sorted(
+        (UsageEndpointStats(endpoint=endpoint, **_stats(group)) for endpoint, group in groups.items()),
+        key=lambda stats: -stats.hits
+    )
+    return UsageEndpointsResponse(
+        status=True,
+        start=start,
+        end=end,
+        total=UsageStats(**_stats(_merge(groups.values()))),
+        endpoints=endpoints
+    )
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+
+from app.config import (
+    ROLLUP_FLUSH_INTERVAL,
+    ROLLUP_PRUNE_INTERVAL,
+    ROLLUP_MINUTE_RETENTION_DAYS,
+    ROLLUP_HOUR_RETENTION_DAYS,
+)
+from app.database import SessionLocal
+from app.latency_histogram import LatencyHistogram
+from app.models import APIUsage, APIUsageRollup
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+# Granularity -> days of buckets to keep (0 keeps everything)
+RETENTION_DAYS = {
+    "minute": ROLLUP_MINUTE_RETENTION_DAYS,
+    "hour": ROLLUP_HOUR_RETENTION_DAYS,
+    "day": 0,
+}
+
+_UNIQUE_COLUMNS = ["subscription_id", "granularity", "bucket", "endpoint", "status_class"]
+
+# Element-wise sum of the stored and incoming histograms; unnest pads the
+# shorter array with NULLs.
+_MERGE_HISTOGRAMS = literal_column(
+    "ARRAY(SELECT COALESCE(a, 0) + COALESCE(b, 0) "
+    "FROM unnest(api_usage_rollups.latency_histogram, excluded.latency_histogram) "
+    "WITH ORDINALITY AS merged(a, b, i) ORDER BY i)"
+)
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class _Rollup:
+    __slots__ = ("company_id", "hits", "latency_sum_ms", "latency_max_ms", "histogram")
+
+    def __init__(self, company_id: int):
+        self.company_id = company_id
+        self.hits = 0
+        self.latency_sum_ms = 0
+        self.latency_max_ms = 0
+        self.histogram = LatencyHistogram()
+
+    def add(self, response_time_ms: int, count: int = 1):
+        self.hits += count
+        self.latency_sum_ms += response_time_ms * count
+        self.latency_max_ms = max(self.latency_max_ms, response_time_ms)
+        self.histogram.record(response_time_ms, count)
+
+    def merge(self, other: "_Rollup"):
+        self.hits += other.hits
+        self.latency_sum_ms += other.latency_sum_ms
+        self.latency_max_ms = max(self.latency_max_ms, other.latency_max_ms)
+        self.histogram.merge(other.histogram)
+
+
+async def _upsert(db, pending: dict) -> int:
+    rows = [
+        dict(subscription_id=subscription_id, granularity=granularity, bucket=bucket,
+             endpoint=endpoint, status_class=status_class, company_id=rollup.company_id,
+             hits=rollup.hits, latency_sum_ms=rollup.latency_sum_ms,
+             latency_max_ms=rollup.latency_max_ms, latency_histogram=rollup.histogram.to_list())
+        # Same row order in every worker, so concurrent flushes cannot deadlock.
+        for (granularity, subscription_id, endpoint, status_class, bucket), rollup
+        in sorted(pending.items(), key=lambda item: (item[0][1], item[0][0], item[0][4], item[0][2], item[0][3]))
+    ]
+    if not rows:
+        return 0
+    stmt = pg_insert(APIUsageRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=_UNIQUE_COLUMNS,
+        set_={
+            "hits": APIUsageRollup.hits + stmt.excluded.hits,
+            "latency_sum_ms": APIUsageRollup.latency_sum_ms + stmt.excluded.latency_sum_ms,
+            "latency_max_ms": func.greatest(APIUsageRollup.latency_max_ms, stmt.excluded.latency_max_ms),
+            "latency_histogram": _MERGE_HISTOGRAMS,
+            "updated_at": func.now(),
+        },
+    )
+    # executemany: compiled once; with no RETURNING, asyncpg's executemany
+    # runs the prepared upsert for every row in one pipelined call.
+    await db.execute(stmt, rows)
+    return len(rows)
+
+
+class UsageRollups:
+    """API usage pre-aggregated into minute, hour and day buckets.
+
+    Every hit is added to the in-memory bucket of each granularity, keyed by
+    subscription, endpoint and status class. Every ``flush_interval``
+    seconds the deltas are upserted into ``api_usage_rollups``: counters are
+    added and latency histograms merged element-wise, so several workers can
+    write the same bucket. Old minute and hour buckets are pruned
+    periodically; day buckets are kept.
+    """
+
+    def __init__(self, flush_interval: float, prune_interval: float):
+        self.flush_interval = flush_interval
+        self.prune_interval = prune_interval
+        self._pending: dict = {}
+        self._task = None
+        self._stopping = asyncio.Event()
+        self._last_prune = 0.0
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_pruned = 0
+
+    def add(self, company_id: int, subscription_id: int, endpoint: str,
+            status_code: int, response_time_ms: int, timestamp: datetime, count: int = 1):
+        status_class = status_code // 100
+        for granularity in GRANULARITIES:
+            key = (granularity, subscription_id, endpoint, status_class, bucket_start(timestamp, granularity))
+            rollup = self._pending.get(key)
+            if rollup is None:
+                rollup = self._pending[key] = _Rollup(company_id)
+            rollup.add(response_time_ms, count)
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            async with SessionLocal() as db:
+                written = await _upsert(db, pending)
+                await db.commit()
+        except Exception as e:
+            logger.warning("Usage rollup flush failed, will retry: %s", e)
+            for key, rollup in pending.items():
+                queued = self._pending.get(key)
+                if queued is not None:
+                    rollup.merge(queued)
+                self._pending[key] = rollup
+            return
+        self.flushes += 1
+        self.rows_written += written
+
+    async def prune(self) -> int:
+        now = datetime.utcnow()
+        pruned = 0
+        async with SessionLocal() as db:
+            for granularity, days in RETENTION_DAYS.items():
+                if not days:
+                    continue
+                result = await db.execute(
+                    delete(APIUsageRollup).where(
+                        APIUsageRollup.granularity == granularity,
+                        APIUsageRollup.bucket < bucket_start(now - timedelta(days=days), "day")
+                    )
+                )
+                pruned += result.rowcount
+            await db.commit()
+        self.rows_pruned += pruned
+        return pruned
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+            if self.prune_interval and time.monotonic() - self._last_prune >= self.prune_interval:
+                self._last_prune = time.monotonic()
+                try:
+                    await self.prune()
+                except Exception as e:
+                    logger.error("Usage rollup pruning failed: %s", e)
+
+    async def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending_buckets": len(self._pending),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "rows_pruned": self.rows_pruned,
+        }
+
+
+usage_rollups = UsageRollups(ROLLUP_FLUSH_INTERVAL, ROLLUP_PRUNE_INTERVAL)
+
+
+async def rebuild_rollups(start: datetime, end: datetime) -> int:
+    """Recompute the rollups of whole days [start, end) from ``api_usages``.
+
+    For usage recorded before rollups existed. The days' rollups are
+    deleted and rebuilt in one transaction, so a rerun gives the same
+    result; don't include days still being recorded live. Raw rows carry
+    the request path rather than the route template, so endpoints are
+    rolled up as recorded.
+    """
+    start, end = bucket_start(start, "day"), bucket_start(end, "day")
+    minute = func.date_trunc("minute", APIUsage.timestamp)
+    query = (
+        select(APIUsage.company_id, APIUsage.subscription_id, APIUsage.endpoint, APIUsage.status_code,
+               minute, APIUsage.response_time_ms, func.count())
+        .where(APIUsage.timestamp >= start, APIUsage.timestamp < end, APIUsage.subscription_id.isnot(None))
+        .group_by(APIUsage.company_id, APIUsage.subscription_id, APIUsage.endpoint, APIUsage.status_code,
+                  minute, APIUsage.response_time_ms)
+        .order_by(minute)
+    )
+    rollups = UsageRollups(0, 0)
+    written = 0
+    current_minute = None
+    async with SessionLocal() as db:
+        await db.execute(delete(APIUsageRollup).where(APIUsageRollup.bucket >= start, APIUsageRollup.bucket < end))
+        result = await db.stream(query.execution_options(yield_per=10000))
+        async for company_id, subscription_id, endpoint, status_code, bucket, response_time_ms, count in result:
+            # Rows arrive in minute order: write each minute out once it is complete.
+            if bucket != current_minute:
+                closed = {key: rollup for key, rollup in rollups._pending.items() if key[0] == "minute"}
+                written += await _upsert(db, closed)
+                for key in closed:
+                    del rollups._pending[key]
+                current_minute = bucket
+            rollups.add(company_id, subscription_id, endpoint or "", status_code or 0,
+                        response_time_ms or 0, bucket, count)
+        written += await _upsert(db, rollups._pending)
+        await db.commit()
+    return written
+
+
+if __name__ == "__main__":
+    # python -m app.usage_rollups 2026-01-01 2026-10-01
+    print(asyncio.run(rebuild_rollups(datetime.fromisoformat(sys.argv[1]), datetime.fromisoformat(sys.argv[2]))))
@@ -0,0 +1,65 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.future import select
+
+from app.config import AUTH_USER_CACHE_TTL, AUTH_USER_CACHE_MAX_ENTRIES
+from app.database import SessionLocal
+from app.memory_cache import ByteLRUCache, SingleFlight
+from app.models import User
+
+
+@dataclass(frozen=True)
+class AuthUser:
+    """The slice of a User that authenticated endpoints need."""
+    id: int
+    name: str
+    email: str
+    is_active: bool
+
+
+# Each entry has weight 1, so the byte bound acts as an entry bound.
+_users = ByteLRUCache(AUTH_USER_CACHE_MAX_ENTRIES)
+_lookups = SingleFlight()
+
+
+async def _load(email: str) -> Optional[AuthUser]:
+    async with SessionLocal() as db:
+        q = await db.execute(
+            select(User.id, User.name, User.email, User.is_active).where(User.email == email)
+        )
+        row = q.one_or_none()
+    if row is None:
+        # Not cached: a user who registers right after should get in at once.
+        return None
+    user = AuthUser(id=row.id, name=row.name, email=row.email, is_active=row.is_active)
+    _users.set(email, user, 1)
+    return user
+
+
+async def get_auth_user(email: str) -> Optional[AuthUser]:
+    """Return the user for a token subject, hitting the database at most
+    once per AUTH_USER_CACHE_TTL seconds per subject."""
+    entry = _users.get(email, max_age=AUTH_USER_CACHE_TTL)
+    if entry is not None:
+        return entry.value
+    return await _lookups.do(email, lambda: _load(email))
+
+
+def invalidate_user(email: str):
+    _users.delete(email)
+
+
+def user_cache_stats() -> dict:
+    return {"ttl": AUTH_USER_CACHE_TTL, **_users.stats(), "coalescing": _lookups.stats()}
+
+
+# Deactivation (or any other change) takes effect immediately in this
+# process; other workers pick it up within AUTH_USER_CACHE_TTL.
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    old_emails = inspect(target).attrs.email.history.deleted or ()
+    for email in (target.email, *old_emails):
+        invalidate_user(email)
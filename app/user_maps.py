@@ -1,15 +1,29 @@
-from fastapi import APIRouter,Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter,Depends, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from fastapi.responses import Response, StreamingResponse
 from jose import jwt, JWTError
 from app.models import User, NavigationLog
-from app.schemas import RouteRequest, RouteResponse
-from app.config import SECRET_KEY, ALGORITHM
+from app.schemas import RouteRequest, RouteResponse, RouteBatchRequest, RouteBatchResponse, MatrixRequest, MatrixResponse
+from app.config import SECRET_KEY, ALGORITHM, ROUTE_BATCH_CONCURRENCY, ROUTE_BATCH_MAX_SIZE, MATRIX_MAX_CELLS
+from app.config import ROUTING_DEFAULT_PRIORITY
+from app.config import LIVE_NAV_HEARTBEAT_INTERVAL, LIVE_NAV_IDLE_TIMEOUT, LIVE_NAV_MAX_CONNECTIONS, LIVE_NAV_MAX_POINTS_PER_MESSAGE
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, update
 from sqlalchemy.future import select
 from fastapi.security import OAuth2PasswordBearer
 from app.database import SessionLocal
 from app.auth import check_authorization_key
-from app.navigation_log import save_navigation_log
+from app.admission import Overloaded
+from app.api_key_cache import resolve_api_key
+from app.api_key_middleware import charge_api_hits
+from app.navigation_log import save_navigation_log, save_navigation_logs, navigation_log_row, save_turn_logs
+from app.user_cache import AuthUser, get_auth_user
+from app.route_cache import fetch_route, route_payload
+from app import fast_json
+from app.matrix import MatrixUpstreamError, compute_matrix, tile_count, to_little_endian_bytes, to_json_list
+from app.tile_cache import TILE_STYLES, get_tile
+from app.off_route import OffRouteTracker
+from app.geo_cells import encode_cell
 from app import models, schemas
 from datetime import datetime 
 import logging
@@ -27,9 +41,11 @@ async def get_db():
         
 async def verify_auth(
     token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db),
     _auth=Depends(check_authorization_key)
-):
+) -> AuthUser:
+    return await authenticate_token(token)
+
+async def authenticate_token(token: str) -> AuthUser:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -38,14 +54,33 @@ async def verify_auth(
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    q = await db.execute(select(User).where(User.email == email))
-    user = q.scalar_one_or_none()
+    # Cached per subject; tile and route requests normally skip the database.
+    user = await get_auth_user(email)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
+    # Deactivation reaches this worker at once and others within
+    # AUTH_USER_CACHE_TTL (see app.user_cache).
+    if not user.is_active:
+        raise HTTPException(status_code=403, detail="User is inactive")
     return user
 
+async def routing_priority(x_api_key: str = Header(None)) -> int:
+    """Routing admission priority of the plan behind ``X-API-Key``."""
+    if x_api_key:
+        subscription = await resolve_api_key(x_api_key)
+        if subscription is not None and subscription.priority is not None:
+            return subscription.priority
+    return ROUTING_DEFAULT_PRIORITY
+
+def overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Routing service is overloaded, try again later",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
 @router.get("/api/user")
-async def user_details(user: User = Depends(verify_auth)):
+async def user_details(user: AuthUser = Depends(verify_auth)):
     return {"status": True, "msg": "Authenticated", "user": {
         "id": user.id,
         "name": user.name,
@@ -53,12 +88,22 @@ async def user_details(user: User = Depends(verify_auth)):
         "is_active": user.is_active
     }}
 
-@router.post("/api/get-route", response_model=RouteResponse)
-async def get_routes(route_request: RouteRequest, user: User = Depends(verify_auth), db: AsyncSession = Depends(get_db)):
+def encode_route_response(route_response: RouteResponse, raw_data: bytes = None, **extra) -> bytes:
+    envelope = {**route_response.model_dump(exclude={"data"}), **extra}
+    return fast_json.splice(envelope, "data", raw_data)
+
+async def calculate_route(route_request: RouteRequest, priority: int = ROUTING_DEFAULT_PRIORITY):
+    """Route one request against the routing engine.
+
+    Returns the RouteResponse (without ``data``), the navigation log
+    fields for it (None when the attempt should not be logged) and the raw
+    upstream route JSON on success. Saving the log is left to the caller
+    so batches can write all their logs at once; the raw JSON is meant to
+    be spliced into the response with ``encode_route_response``. Raises
+    Overloaded when routing admission turns the request away.
+    """
     if len(route_request.locations) < 2:
-        await save_navigation_log(
-            db=db,
-            user_id=user.id,
+        log = dict(
             start_place="",
             destination="",
             start_time=datetime.utcnow(),
@@ -72,59 +117,34 @@ async def get_routes(route_request: RouteRequest, user: User = Depends(verify_au
             status=False,
             msg="At least 2 locations required for routing",
             error="Insufficient locations"
-        )
-    external_payload = {
-        "locations": [
-            {"lat": loc.lat, "lon": loc.lon} 
-            for loc in route_request.locations
-        ],
-        "costing": route_request.costing,
-        "alternatives": True,
-        "directions_options": {
-            "units": "kilometers",
-            "language": "en-US"
-        },
-        "alternatives": {
-            "target_count": 3
-        }
-    }
+        ), log, None
+    external_payload = route_payload(route_request)
     start_loc = route_request.locations[0]
     end_loc = route_request.locations[-1]
     start_time = datetime.utcnow()
     try:
-        # Make HTTP request to external routing service
-        # Using httpx for async HTTP requests
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "http://192.168.1.110:3095/route",
-                json=external_payload,
-                headers={"Content-Type": "application/json"}
-            )
-            end_time = datetime.utcnow()
-            # Check if the response is successful
-            if response.status_code == 200:
-                route_data = response.json()
-                maneuvers = route_data.get("trip", {}).get("legs", [])[0].get("maneuvers", [])
-                await save_navigation_log(
-                db=db,
-                user_id=user.id,
+        # Served from the route cache when the same quantized request was
+        # computed recently; the navigation log is written either way.
+        status_code, route, _cache_status = await fetch_route(route_request, external_payload, priority)
+        end_time = datetime.utcnow()
+        # Check if the response is successful
+        if status_code == 200:
+            log = dict(
                 start_place=f"{start_loc.lat},{start_loc.lon}",
                 destination=f"{end_loc.lat},{end_loc.lon}",
                 start_time=start_time,
                 end_time=end_time,
-                directions=maneuvers,
+                directions=route.maneuvers,
+                shape=route.shape,
                 status=True,
                 message="Route calculated successfully"
-                )
-                return RouteResponse(
-                    status=True,
-                    msg="Route calculated successfully",
-                    data=route_data
-                )
-            else:
-                await save_navigation_log(
-                db=db,
-                user_id=user.id,
+            )
+            return RouteResponse(
+                status=True,
+                msg="Route calculated successfully"
+            ), log, route.raw
+        else:
+            log = dict(
                 start_place=f"{start_loc.lat},{start_loc.lon}",
                 destination=f"{end_loc.lat},{end_loc.lon}",
                 start_time=start_time,
@@ -132,32 +152,33 @@ async def get_routes(route_request: RouteRequest, user: User = Depends(verify_au
                 directions=[],
                 status=False,
                 message="Failed to calculate route",
-                error=f"Status code {response.status_code}"
-                )
-                return RouteResponse(
-                    status=False,
-                    msg="Failed to calculate route",
-                    error=f"External service returned status {response.status_code}"
-                )
-                
+                error=f"Status code {status_code}"
+            )
+            return RouteResponse(
+                status=False,
+                msg="Failed to calculate route",
+                error=f"External service returned status {status_code}"
+            ), log, None
+
     except httpx.TimeoutException:
         return RouteResponse(
             status=False,
             msg="Request timeout",
             error="Routing service took too long to respond"
-        )
-        
+        ), None, None
+
     except httpx.ConnectError:
         return RouteResponse(
             status=False,
             msg="Service unavailable",
             error="Could not connect to routing service"
-        )
-        
+        ), None, None
+
+    except Overloaded:
+        raise
+
     except Exception as e:
-        await save_navigation_log(
-            db=db,
-            user_id=user.id,
+        log = dict(
             start_place=f"{start_loc.lat},{start_loc.lon}",
             destination=f"{end_loc.lat},{end_loc.lon}",
             start_time=start_time,
@@ -171,22 +192,385 @@ async def get_routes(route_request: RouteRequest, user: User = Depends(verify_au
             status=False,
             msg="Internal server error",
             error="An unexpected error occurred"
+        ), log, None
+
+@router.post("/api/get-route", response_model=RouteResponse)
+async def get_routes(
+    route_request: RouteRequest,
+    user: AuthUser = Depends(verify_auth),
+    db: AsyncSession = Depends(get_db),
+    priority: int = Depends(routing_priority)
+):
+    try:
+        route_response, log, raw_data = await calculate_route(route_request, priority)
+    except Overloaded as e:
+        raise overloaded(e)
+    if log is not None:
+        await save_navigation_log(db=db, user_id=user.id, **log)
+    # The routing payload is passed through as received, not re-encoded.
+    return Response(content=encode_route_response(route_response, raw_data), media_type="application/json")
+
+@router.post("/api/get-routes/batch", response_model=RouteBatchResponse)
+async def get_routes_batch(
+    request: Request,
+    batch: RouteBatchRequest,
+    stream: bool = Query(False, description="Stream NDJSON lines as results become available"),
+    user: AuthUser = Depends(verify_auth),
+    priority: int = Depends(routing_priority)
+):
+    """Route many requests with one authentication and one log insert.
+
+    Requests fan out to the routing engine at most ROUTE_BATCH_CONCURRENCY
+    at a time. Results come back in request order, or in completion order
+    when ``ordered`` is false; each carries the index of its request.
+    Requests turned away by routing admission fail individually. Billed
+    as one API hit per route.
+    """
+    if len(batch.requests) > ROUTE_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {ROUTE_BATCH_MAX_SIZE} routes per batch")
+    await charge_api_hits(request, len(batch.requests))
+    semaphore = asyncio.Semaphore(ROUTE_BATCH_CONCURRENCY)
+    logs = []
+
+    async def run(index: int, route_request: RouteRequest):
+        async with semaphore:
+            try:
+                route_response, log, raw_data = await calculate_route(route_request, priority)
+            except Overloaded:
+                route_response, log, raw_data = RouteResponse(
+                    status=False,
+                    msg="Service overloaded",
+                    error="Routing service is overloaded, try again later"
+                ), None, None
+        if log is not None:
+            logs.append(navigation_log_row(user_id=user.id, **log))
+        return route_response.status, encode_route_response(route_response, raw_data, index=index)
+
+    tasks = [asyncio.create_task(run(i, r)) for i, r in enumerate(batch.requests)]
+
+    async def results():
+        try:
+            if batch.ordered:
+                for task in tasks:
+                    yield await task
+            else:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            if logs:
+                # The routes are already out; a failed log write must not
+                # fail the batch or cut the stream short.
+                try:
+                    await save_navigation_logs(logs)
+                except Exception:
+                    logger.exception("Saving %d batch navigation logs failed", len(logs))
+
+    if stream:
+        async def ndjson():
+            async for _ok, item in results():
+                yield item + b"\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    items = [item async for item in results()]
+    succeeded = sum(ok for ok, _ in items)
+    envelope = {"status": succeeded == len(items), "msg": f"{succeeded} of {len(items)} routes calculated"}
+    body = fast_json.splice(envelope, "results", b"[" + b",".join(item for _, item in items) + b"]")
+    return Response(content=body, media_type="application/json")
+
+@router.post("/api/get-matrix")
+async def get_matrix(
+    request: Request,
+    matrix_request: MatrixRequest,
+    format: str = Query("json", pattern="^(json|binary)$"),
+    user: AuthUser = Depends(verify_auth),
+    priority: int = Depends(routing_priority)
+):
+    """Origin x destination distance/time matrix.
+
+    ``format=binary`` returns float32 little-endian bytes: all distances,
+    then all durations, row-major, NaN where unreachable, so
+    ``numpy.frombuffer(body, "<f4").reshape(2, rows, cols)`` loads it.
+    Billed as one API hit per upstream tile (see compute_matrix).
+    """
+    rows, cols = len(matrix_request.sources), len(matrix_request.targets)
+    if not rows or not cols:
+        return MatrixResponse(status=False, msg="At least one source and one target required", error="Empty matrix")
+    if rows * cols > MATRIX_MAX_CELLS:
+        raise HTTPException(status_code=413, detail=f"Matrix may have at most {MATRIX_MAX_CELLS} cells")
+    await charge_api_hits(request, tile_count(rows, cols))
+    try:
+        distances, durations = await compute_matrix(matrix_request, priority)
+    except Overloaded as e:
+        raise overloaded(e)
+    except MatrixUpstreamError as e:
+        return MatrixResponse(status=False, msg="Failed to calculate matrix", error=str(e))
+    except httpx.TimeoutException:
+        return MatrixResponse(status=False, msg="Request timeout", error="Routing service took too long to respond")
+    except httpx.ConnectError:
+        return MatrixResponse(status=False, msg="Service unavailable", error="Could not connect to routing service")
+    except httpx.HTTPError as e:
+        # Connection dropped mid-response, protocol errors, ...
+        logger.warning("Matrix request to routing service failed: %r", e)
+        return MatrixResponse(status=False, msg="Failed to calculate matrix", error="Routing service request failed")
+
+    if format == "binary":
+        return Response(
+            content=to_little_endian_bytes(distances, durations),
+            media_type="application/octet-stream",
+            headers={"X-Matrix-Rows": str(rows), "X-Matrix-Cols": str(cols), "X-Matrix-Dtype": "<f4"}
         )
+    return MatrixResponse(
+        status=True,
+        msg="Matrix calculated successfully",
+        rows=rows,
+        cols=cols,
+        distances=to_json_list(distances),
+        durations=to_json_list(durations)
+    )
 
 @router.get("/api/map-tiles/{z}/{x}/{y}.png")
-async def get_map_tile(z: int, x: int, y: int, style: str = "day", user: User = Depends(verify_auth)):
-    if style == "day":
-        tile_url = f"http://192.168.1.110:4090/styles/test-style/256/{z}/{x}/{y}.png"
-    elif style == "night":
-        tile_url = f"http://192.168.1.110:4090/styles/maptiler-basic/256/{z}/{x}/{y}.png"
-    else:
+async def get_map_tile(z: int, x: int, y: int, style: str = "day", user: AuthUser = Depends(verify_auth)):
+    if style not in TILE_STYLES:
         raise HTTPException(status_code=400, detail="Invalid style parameter. Use 'day' or 'night'.")
     try:
-        async with httpx.AsyncClient(timeout=12.0) as client:
-            response = await client.get(tile_url)
-            response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-            return StreamingResponse(response.iter_bytes(), media_type=response.headers['Content-Type'])
+        data, content_type, cache_status = await get_tile(style, z, x, y)
+        return Response(content=data, media_type=content_type, headers={"X-Cache": cache_status})
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail=f"Failed to fetch tile: {e.response.status_code} {e.response.text}")
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"Could not connect to map tile server: {e}")
+
+# Live navigation telemetry
+live_navigation = {"connections": 0, "rejected": 0, "points": 0}
+
+async def _websocket_user(websocket: WebSocket):
+    """Same checks as verify_auth, from headers or (for clients that can't
+    set headers on a WebSocket) the ``authorization_key``/``token`` query
+    parameters."""
+    authorization_key = (websocket.headers.get("authorization-key")
+                         or websocket.query_params.get("authorization_key"))
+    scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer":
+        token = websocket.query_params.get("token", "")
+    try:
+        check_authorization_key(authorization_key)
+        return await authenticate_token(token)
+    except HTTPException:
+        return None
+
+def _turn_log_row(navigation_id: int, point: schemas.LivePoint) -> dict:
+    return dict(
+        navigation_id=navigation_id,
+        instruction=point.instruction[:255] if point.instruction else None,
+        latitude=point.lat,
+        longitude=point.lng,
+        timestamp=datetime.utcfromtimestamp(point.timestamp) if point.timestamp is not None else datetime.utcnow()
+    )
+
+async def _start_trip(user_id: int, trip: schemas.LiveTripStart) -> int:
+    async with SessionLocal() as db:
+        navigation_id = await db.scalar(
+            insert(models.NavigationLogHistory).values(
+                user_id=user_id,
+                start_place=trip.start_place[:255],
+                destination=trip.destination[:255],
+                start_lat=trip.start_lat,
+                start_lng=trip.start_lng,
+                end_lat=trip.end_lat,
+                end_lng=trip.end_lng,
+                start_cell=encode_cell(trip.start_lat, trip.start_lng),
+                end_cell=encode_cell(trip.end_lat, trip.end_lng),
+                start_time=datetime.utcnow()
+            ).returning(models.NavigationLogHistory.id)
+        )
+        await db.commit()
+    return navigation_id
+
+async def _end_trip(user_id: int, navigation_id: int, trip_status: models.NavigationStatus, message: str):
+    history = models.NavigationLogHistory
+    async with SessionLocal() as db:
+        await db.execute(
+            update(history)
+            .where(history.id == navigation_id, history.user_id == user_id)
+            .values(
+                end_time=datetime.utcnow(),
+                trip_duration=datetime.utcnow() - history.start_time,
+                status=trip_status,
+                message=message[:255]
+            )
+        )
+        await db.commit()
+
+async def _owns_trip(user_id: int, navigation_id: int) -> bool:
+    history = models.NavigationLogHistory
+    async with SessionLocal() as db:
+        found = await db.scalar(
+            select(history.id).where(history.id == navigation_id, history.user_id == user_id)
+        )
+    return found is not None
+
+async def _receive_json(websocket: WebSocket):
+    """Next message from the client, or None if nothing arrived within one
+    heartbeat interval."""
+    try:
+        frame = await asyncio.wait_for(websocket.receive(), LIVE_NAV_HEARTBEAT_INTERVAL)
+    except asyncio.TimeoutError:
+        return None
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", status.WS_1000_NORMAL_CLOSURE))
+    text = frame.get("text")
+    if text is None:
+        # Binary frames aren't part of the protocol.
+        return {"type": "invalid"}
+    try:
+        message = fast_json.loads(text)
+    except ValueError:
+        message = None
+    return message if isinstance(message, dict) else {"type": "invalid"}
+
+async def _track_route(websocket: WebSocket, route: dict):
+    """OffRouteTracker for a RouteRequest sent by the client, or None."""
+    try:
+        route_request = RouteRequest(**route)
+    except (TypeError, ValueError):
+        await websocket.send_json({"type": "error", "error": "Invalid route"})
+        return None
+    if len(route_request.locations) < 2:
+        await websocket.send_json({"type": "error", "error": "At least 2 locations required for routing"})
+        return None
+    try:
+        tracker = await OffRouteTracker.start(route_request)
+    except (httpx.HTTPError, Overloaded):
+        tracker = None
+    except (ValueError, IndexError):
+        # The engine answered with an empty or undecodable shape.
+        logger.warning("Route for live tracking has no usable shape", exc_info=True)
+        tracker = None
+    if tracker is None:
+        await websocket.send_json({"type": "error", "error": "Route could not be calculated"})
+    return tracker
+
+async def _check_route(websocket: WebSocket, tracker: OffRouteTracker, rows: list):
+    check = tracker.update([row["latitude"] for row in rows], [row["longitude"] for row in rows])
+    if not check["off_route"]:
+        return
+    try:
+        route = await tracker.reroute(rows[-1]["latitude"], rows[-1]["longitude"])
+    except (httpx.HTTPError, Overloaded, ValueError, IndexError) as e:
+        logger.warning("Reroute failed: %s", e)
+        return
+    if route is not None:
+        envelope = {"type": "reroute", "distance_m": round(check["distance_m"], 1)}
+        await websocket.send_text(fast_json.splice(envelope, "data", route.raw).decode())
+
+async def _live_session(websocket: WebSocket, user: AuthUser, navigation_id):
+    loop = asyncio.get_running_loop()
+    last_seen = loop.time()
+    received = 0
+    tracker = None
+    while True:
+        message = await _receive_json(websocket)
+        if message is None:
+            if loop.time() - last_seen > LIVE_NAV_IDLE_TIMEOUT:
+                await websocket.close(code=status.WS_1001_GOING_AWAY)
+                return
+            await websocket.send_json({"type": "ping"})
+            continue
+        last_seen = loop.time()
+        kind = message.get("type")
+
+        if kind == "ping":
+            await websocket.send_json({"type": "pong"})
+        elif kind == "pong":
+            pass
+        elif kind == "start":
+            if navigation_id is not None:
+                await websocket.send_json({"type": "error", "error": "Trip already started"})
+                continue
+            try:
+                trip = schemas.LiveTripStart.model_validate(message)
+            except ValidationError:
+                await websocket.send_json({"type": "error", "error": "Invalid trip start"})
+                continue
+            navigation_id = await _start_trip(user.id, trip)
+            await websocket.send_json({"type": "started", "navigation_id": navigation_id})
+            if isinstance(message.get("route"), dict):
+                tracker = await _track_route(websocket, message["route"])
+        elif kind == "route":
+            tracker = await _track_route(websocket, message.get("route") or {})
+        elif kind in ("position", "maneuver", "positions"):
+            if navigation_id is None:
+                await websocket.send_json({"type": "error", "error": "Send 'start' or connect with navigation_id first"})
+                continue
+            points = message.get("points", []) if kind == "positions" else [message]
+            if not isinstance(points, list):
+                await websocket.send_json({"type": "error", "error": "'points' must be a list"})
+                continue
+            if len(points) > LIVE_NAV_MAX_POINTS_PER_MESSAGE:
+                await websocket.send_json({"type": "error", "error": f"At most {LIVE_NAV_MAX_POINTS_PER_MESSAGE} points per message"})
+                continue
+            try:
+                rows = [_turn_log_row(navigation_id, schemas.LivePoint.model_validate(point)) for point in points]
+            except (ValidationError, ValueError, OverflowError, OSError):
+                # OverflowError/OSError: timestamps outside what datetime can hold
+                await websocket.send_json({"type": "error", "error": "Points need numeric lat, lng and optional epoch timestamp"})
+                continue
+            # Waits while the writer is behind; meanwhile nothing more is read
+            # from this socket, so the client is slowed down by TCP flow control.
+            await save_turn_logs(rows)
+            received += len(rows)
+            live_navigation["points"] += len(rows)
+            if tracker is not None and rows:
+                await _check_route(websocket, tracker, rows)
+        elif kind == "end":
+            try:
+                trip_status = models.NavigationStatus(message.get("status", "completed"))
+            except ValueError:
+                await websocket.send_json({"type": "error", "error": "Invalid status"})
+                continue
+            if navigation_id is not None:
+                await _end_trip(user.id, navigation_id, trip_status, str(message.get("message", "")))
+            await websocket.send_json({"type": "ended", "navigation_id": navigation_id, "received": received})
+            await websocket.close()
+            return
+        else:
+            await websocket.send_json({"type": "error", "error": "Unknown message type"})
+
+@router.websocket("/ws/navigation")
+async def live_navigation_socket(websocket: WebSocket, navigation_id: int = None):
+    """Stream positions and maneuvers for a trip in progress.
+
+    Authenticates once on connect. The client either sends ``start`` (which
+    creates the trip history row) or reconnects with ``?navigation_id=``.
+    ``position``/``maneuver`` messages (``lat``, ``lng``, optional
+    ``instruction`` and epoch ``timestamp``) and ``positions`` batches become
+    TurnLog rows written in micro-batches by the turn log writer; ``end``
+    closes the trip. When the client passes the route it is following
+    (a RouteRequest as ``route`` on ``start``, or a ``route`` message),
+    positions are checked against it and a ``reroute`` message carrying the
+    new route follows once the driver has left it. The server pings after each quiet heartbeat interval
+    and drops connections idle for longer than LIVE_NAV_IDLE_TIMEOUT.
+    """
+    user = await _websocket_user(websocket)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if live_navigation["connections"] >= LIVE_NAV_MAX_CONNECTIONS:
+        live_navigation["rejected"] += 1
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    # Counted before anything is awaited, so concurrent handshakes can't
+    # all pass the check above.
+    live_navigation["connections"] += 1
+    try:
+        if navigation_id is not None and not await _owns_trip(user.id, navigation_id):
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        await websocket.accept()
+        await _live_session(websocket, user, navigation_id)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_navigation["connections"] -= 1
@@ -0,0 +1,136 @@
+"""Per-request overhead of the API-key middleware: raw ASGI vs BaseHTTPMiddleware.
+
+Both variants run the same admission checks (``admit_api_key``) against an
+in-memory subscription snapshot, so the difference is the middleware
+machinery itself plus where usage is recorded. No database or network is
+touched; requests are driven straight through the ASGI interface.
+
+    python -m benchmarks.bench_api_key_middleware [requests]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from app import api_key_cache, api_usage
+from app.api_key_cache import CompanyInfo, PlanLimits, SubscriptionSnapshot
+from app.api_key_middleware import (
+    APIKeyRejected,
+    APIKeyTrackingAndRateLimitMiddleware,
+    admit_api_key,
+    release_api_key,
+)
+from app.quota import quota_engine, month_start
+
+SNAPSHOT = SubscriptionSnapshot(
+    id=1, company_id=1, plan_id=1, api_key="bench-key", status="active",
+    start_date=None, end_date=None,
+    plan=PlanLimits(id=1, name="bench", price_monthly=0, api_hit_limit=10 ** 9,
+                    concurrent_connections=1000, per_api_hit_price=None, priority=0),
+    company=CompanyInfo(id=1, name="bench", contact_email="", country=None, is_active=True),
+)
+
+
+class LegacyAPIKeyMiddleware(BaseHTTPMiddleware):
+    """The previous shape: BaseHTTPMiddleware, usage written before returning."""
+
+    async def dispatch(self, request, call_next):
+        if not request.url.path.startswith("/api/"):
+            return await call_next(request)
+        try:
+            subscription = await admit_api_key(request.headers.get("x-api-key"))
+        except APIKeyRejected as e:
+            return JSONResponse({"detail": e.detail}, status_code=e.status_code)
+        start_time = time.monotonic()
+        try:
+            response = await call_next(request)
+        finally:
+            await release_api_key(subscription)
+        await api_usage.record_api_usage(
+            company_id=subscription.company_id,
+            subscription_id=subscription.id,
+            endpoint=request.url.path,
+            status_code=response.status_code,
+            response_time_ms=int((time.monotonic() - start_time) * 1000),
+        )
+        return response
+
+
+async def ping(request):
+    return PlainTextResponse("pong")
+
+
+def build_app(middleware_cls=None):
+    app = Starlette(routes=[Route("/api/ping", ping)])
+    return middleware_cls(app) if middleware_cls else app
+
+
+async def call(app):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/api/ping", "raw_path": b"/api/ping",
+        "query_string": b"", "root_path": "", "server": ("bench", 80), "client": ("bench", 1),
+        "headers": [(b"host", b"bench"), (b"x-api-key", b"bench-key")],
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    assert sent[0]["status"] == 200, sent[0]
+
+
+async def measure(app, requests: int):
+    for _ in range(200):
+        await call(app)
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await call(app)
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return {
+        "mean_us": statistics.fmean(timings),
+        "p50_us": timings[len(timings) // 2],
+        "p99_us": timings[int(len(timings) * 0.99)],
+    }
+
+
+async def main(requests: int):
+    # Serve the subscription from the snapshot cache and keep usage in memory.
+    api_key_cache._snapshots.set("bench-key", SNAPSHOT, 1)
+    api_key_cache.API_KEY_CACHE_TTL = float("inf")
+    quota_engine._counters[(SNAPSHOT.id, month_start())] = 0
+    recorded = []
+
+    async def record(**row):
+        recorded.append(row)
+
+    api_usage.record_api_usage = record
+    import app.api_key_middleware as middleware_module
+    middleware_module.record_api_usage = record
+
+    variants = {
+        "no middleware": build_app(),
+        "BaseHTTPMiddleware": build_app(LegacyAPIKeyMiddleware),
+        "raw ASGI": build_app(APIKeyTrackingAndRateLimitMiddleware),
+    }
+    results = {name: await measure(app, requests) for name, app in variants.items()}
+    baseline = results["no middleware"]["mean_us"]
+    print(f"{'variant':<20}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'overhead us':>13}")
+    for name, r in results.items():
+        print(f"{name:<20}{r['mean_us']:>10.1f}{r['p50_us']:>10.1f}{r['p99_us']:>10.1f}"
+              f"{r['mean_us'] - baseline:>13.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
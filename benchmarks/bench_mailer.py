@@ -0,0 +1,123 @@
+"""OTP email delivery: pooled SMTPMailer vs a new connection per message.
+
+Runs against benchmarks.smtp_standin over implicit TLS with AUTH, with
+every server reply delayed by ``--rtt-ms`` to stand in for a remote mail
+host, and
+
+* sends a burst of messages the old way (one ``aiosmtplib.send``, i.e.
+  one TLS handshake and login, per email), first all at once as during a
+  login spike and then with the pool's concurrency, and through the
+  mailer's bounded queue and connection pool,
+* checks that the mailer retries transient 451s, reconnects when the
+  server drops a reused connection, does not retry a 550 and gives up
+  once a message's deadline has passed.
+
+    python -m benchmarks.bench_mailer [--messages 200] [--rtt-ms 20]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import aiosmtplib
+
+from benchmarks.smtp_standin import SMTPStandIn
+
+USERNAME, PASSWORD = "otp@example.com", "secret"
+
+
+async def wait_until(predicate, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        await asyncio.sleep(0.005)
+
+
+async def main(messages: int, rtt_ms: float, pool_size: int):
+    server = await SMTPStandIn(tls=True, username=USERNAME, password=PASSWORD).start()
+    server.reply_delay = rtt_ms / 1000
+    # app.config reads these at import time.
+    os.environ.update(EMAIL_HOST="127.0.0.1", EMAIL_PORT=str(server.port), MAIL_TLS="True",
+                      EMAIL_HOST_USER=USERNAME, EMAIL_HOST_PASSWORD=PASSWORD, DEFAULT_FROM_EMAIL=USERNAME,
+                      SSL_CERT_FILE=server.cert_path)
+    from app import email_utils
+    from app.email_utils import SMTPMailer, build_message
+
+    def burst(n, prefix):
+        return [build_message(f"{prefix}{i}@example.com", "Your OTP Code", f"Your OTP is: {i:06d}") for i in range(n)]
+
+    async def send_direct(msg, limit):
+        async with limit:
+            await aiosmtplib.send(msg, hostname=email_utils.SMTP_HOST, port=email_utils.SMTP_PORT,
+                                  use_tls=True, username=USERNAME, password=PASSWORD)
+
+    # Old path: one connection per email, all at once and with the pool's concurrency.
+    for concurrency in (messages, pool_size):
+        limit = asyncio.Semaphore(concurrency)
+        connections_before, batch = server.connections, burst(messages, "direct")
+        started = time.monotonic()
+        await asyncio.gather(*(send_direct(msg, limit) for msg in batch))
+        direct_s = time.monotonic() - started
+        print(f"per-message connections, {concurrency} at a time: {messages} emails in {direct_s:.2f} s, "
+              f"{server.connections - connections_before} connections")
+
+    mailer = SMTPMailer(pool_size=pool_size, max_queue=10_000, max_attempts=4, retry_backoff=0.05,
+                        send_deadline=30, idle_timeout=60)
+    await mailer.start()
+    connections_before, delivered_before = server.connections, len(server.messages)
+    batch = burst(messages, "pooled")
+    started = time.monotonic()
+    for msg in batch:
+        mailer.enqueue(msg)
+    enqueue_ms = (time.monotonic() - started) * 1000
+    await wait_until(lambda: mailer.sent == messages)
+    pooled_s = time.monotonic() - started
+    assert len(server.messages) - delivered_before == messages
+    print(f"pooled mailer ({pool_size} connections): {messages} emails in {pooled_s:.2f} s, "
+          f"{server.connections - connections_before} connections, enqueueing took {enqueue_ms:.1f} ms")
+    print(f"  {mailer.stats()}")
+
+    # Transient 451s are retried with backoff.
+    server.fail_data = 3
+    sent = mailer.sent
+    for msg in burst(5, "retry"):
+        mailer.enqueue(msg)
+    await wait_until(lambda: mailer.sent == sent + 5)
+    assert mailer.retries == 3 and mailer.failed == 0, mailer.stats()
+
+    # A server dropping reused connections costs a reconnect, not an attempt.
+    server.drop_after = 2
+    sent, retries = mailer.sent, mailer.retries
+    for msg in burst(10, "dropped"):
+        mailer.enqueue(msg)
+    await wait_until(lambda: mailer.sent == sent + 10)
+    assert mailer.retries == retries and mailer.failed == 0, mailer.stats()
+    server.drop_after = 0
+
+    # 550 is permanent: no retry.
+    server.reject.add("rejected0@example.com")
+    retries = mailer.retries
+    mailer.enqueue(burst(1, "rejected")[0])
+    await wait_until(lambda: mailer.failed == 1)
+    assert mailer.retries == retries
+
+    # Past the deadline the message is dropped instead of retried forever.
+    await mailer.stop()
+    await server.stop()
+    mailer = SMTPMailer(pool_size=1, max_queue=10, max_attempts=100, retry_backoff=0.05,
+                        send_deadline=0.5, idle_timeout=60)
+    await mailer.start()
+    mailer.enqueue(burst(1, "late")[0])
+    await wait_until(lambda: mailer.expired == 1, timeout=5)
+    await mailer.stop()
+    print("retry, reconnect, permanent failure and deadline checks passed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=20)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.rtt_ms, args.pool_size))
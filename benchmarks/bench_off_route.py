@@ -0,0 +1,107 @@
+"""Off-route detection: vectorized RouteShape vs a per-point Python scan.
+
+Builds a synthetic drive (a random walk of short segments, like a routing
+engine shape) and times
+
+* decoding the encoded polyline into arrays,
+* building the projected segments and the grid index,
+* checking GPS batches of 1, 10 and 100 fixes near the route,
+* the same checks done the straightforward way: for each fix, loop over
+  every segment in Python,
+
+and verifies that the indexed distances match an exact full scan.
+
+    python -m benchmarks.bench_off_route [shape_points ...]
+"""
+import math
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from app.off_route import RouteShape, decode_polyline
+
+
+def encode_polyline(points, precision: int = 6) -> str:
+    factor = 10 ** precision
+    out, last_lat, last_lon = [], 0, 0
+    for lat, lon in points:
+        lat, lon = round(lat * factor), round(lon * factor)
+        for value in (lat - last_lat, lon - last_lon):
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        last_lat, last_lon = lat, lon
+    return "".join(out)
+
+
+def synthetic_route(n: int, rng: np.random.Generator) -> np.ndarray:
+    heading = np.cumsum(rng.normal(0, 0.25, n))
+    step_m = rng.uniform(5, 40, n)
+    lat = 12.97 + np.cumsum(step_m * np.cos(heading)) / 111_195
+    lon = 77.59 + np.cumsum(step_m * np.sin(heading)) / (111_195 * math.cos(math.radians(12.97)))
+    return np.stack([lat, lon], axis=1)
+
+
+def fixes_near(route: np.ndarray, count: int, rng: np.random.Generator) -> np.ndarray:
+    start = rng.integers(0, len(route) - count)
+    noise = rng.normal(0, 40, (count, 2)) / 111_195
+    return route[start:start + count] + noise
+
+
+def python_scan(shape: RouteShape, lats, lons):
+    xy = shape.project(lats, lons).tolist()
+    segments = [(ax, ay, dx, dy, l2) for (ax, ay), (dx, dy), l2 in
+                zip(shape.start.tolist(), shape.delta.tolist(), shape.length2.tolist())]
+    result = []
+    for px, py in xy:
+        best = math.inf
+        for ax, ay, dx, dy, l2 in segments:
+            t = min(1.0, max(0.0, ((px - ax) * dx + (py - ay) * dy) / l2))
+            ex, ey = px - ax - t * dx, py - ay - t * dy
+            best = min(best, ex * ex + ey * ey)
+        result.append(math.sqrt(best))
+    return result
+
+
+def timed(fn, rounds: int) -> float:
+    fn()
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(sizes):
+    rng = np.random.default_rng(7)
+    for n in sizes:
+        route = synthetic_route(n, rng)
+        encoded = encode_polyline(route.tolist())
+        decoded = decode_polyline(encoded)
+        assert np.allclose(decoded, route, atol=1e-6)
+
+        decode_ms = timed(lambda: decode_polyline(encoded), 20)
+        build_ms = timed(lambda: RouteShape([encoded]), 10)
+        shape = RouteShape([encoded])
+        print(f"{n} shape points ({len(encoded) / 1024:.0f} KiB polyline): "
+              f"decode {decode_ms:.2f} ms, decode+index {build_ms:.2f} ms")
+
+        for batch in (1, 10, 100):
+            fixes = fixes_near(route, batch, rng)
+            lats, lons = fixes[:, 0], fixes[:, 1]
+            distance, _ = shape.nearest(lats, lons)
+            exact, _ = shape._nearest_among(shape.project(lats, lons), np.arange(len(shape)))
+            assert np.allclose(distance, exact)
+            indexed_ms = timed(lambda: shape.nearest(lats, lons), 50)
+            scan_ms = timed(lambda: python_scan(shape, lats, lons), 3 if batch < 100 else 1)
+            print(f"  batch {batch:>3}: indexed {indexed_ms:8.3f} ms   python scan {scan_ms:9.1f} ms   "
+                  f"speed-up {scan_ms / indexed_ms:7.0f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 50_000])
@@ -0,0 +1,101 @@
+"""Route response encoding: parse + pydantic + re-serialize vs raw passthrough.
+
+Builds a synthetic routing payload shaped like the engine's (a trip plus
+alternates, each with maneuvers and an encoded shape) and times what
+get_routes does with it per request:
+
+* legacy:      response.json() -> RouteResponse(data=...) -> FastAPI
+               jsonable_encoder -> JSONResponse.render
+* passthrough: one fast parse to pull out maneuvers for the log, then the
+               upstream bytes are spliced into the envelope unchanged
+
+    python -m benchmarks.bench_route_passthrough [alternates] [maneuvers_per_leg]
+"""
+import json
+import random
+import statistics
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import fast_json
+from app.route_cache import RouteResult
+from app.schemas import RouteResponse
+from app.user_maps import encode_route_response
+
+
+def synthetic_trip(maneuvers: int, rng: random.Random) -> dict:
+    alphabet = "".join(chr(c) for c in range(63, 127) if chr(c) != "\\")
+    return {
+        "locations": [{"type": "break", "lat": 12.97, "lon": 77.59}, {"type": "break", "lat": 13.03, "lon": 77.64}],
+        "legs": [{
+            "maneuvers": [{
+                "type": rng.randint(1, 30),
+                "instruction": f"Turn right onto Street {i}. Continue for {rng.randint(1, 900)} meters.",
+                "verbal_pre_transition_instruction": f"Turn right onto Street {i}.",
+                "street_names": [f"Street {i}"],
+                "time": rng.random() * 60,
+                "length": rng.random(),
+                "cost": rng.random() * 80,
+                "begin_shape_index": i * 8,
+                "end_shape_index": i * 8 + 8,
+                "travel_mode": "drive",
+                "travel_type": "car",
+            } for i in range(maneuvers)],
+            "summary": {"time": 1800.0, "length": 12.4, "cost": 2000.0},
+            "shape": "".join(rng.choice(alphabet) for _ in range(maneuvers * 40)),
+        }],
+        "summary": {"time": 1800.0, "length": 12.4, "cost": 2000.0},
+        "status_message": "Found route between points",
+        "status": 0,
+        "units": "kilometers",
+        "language": "en-US",
+    }
+
+
+def legacy(raw: bytes) -> bytes:
+    route_data = json.loads(raw)
+    maneuvers = route_data.get("trip", {}).get("legs", [])[0].get("maneuvers", [])
+    model = RouteResponse(status=True, msg="Route calculated successfully", data=route_data)
+    assert maneuvers
+    return JSONResponse(content=jsonable_encoder(model)).body
+
+
+def passthrough(raw: bytes) -> bytes:
+    route = RouteResult(raw)
+    assert route.maneuvers
+    return encode_route_response(RouteResponse(status=True, msg="Route calculated successfully"), route.raw)
+
+
+def measure(fn, raw: bytes, rounds: int):
+    fn(raw)
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn(raw)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.fmean(timings), sorted(timings)[len(timings) // 2]
+
+
+def main(alternates: int, maneuvers: int):
+    rng = random.Random(7)
+    payload = {"trip": synthetic_trip(maneuvers, rng),
+               "alternates": [{"trip": synthetic_trip(maneuvers, rng)} for _ in range(alternates)]}
+    raw = json.dumps(payload).encode()
+    assert json.loads(passthrough(raw))["data"] == json.loads(legacy(raw))["data"]
+
+    rounds = 50
+    print(f"payload {len(raw) / 1024:.0f} KiB, json backend: {'orjson' if fast_json.orjson else 'stdlib json'}")
+    results = {name: measure(fn, raw, rounds) for name, fn in (("legacy", legacy), ("passthrough", passthrough))}
+    for name, (mean_ms, p50_ms) in results.items():
+        print(f"{name:<12} mean {mean_ms:8.2f} ms   p50 {p50_ms:8.2f} ms")
+    print(f"speed-up {results['legacy'][0] / results['passthrough'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 400,
+    )
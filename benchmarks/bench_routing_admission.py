@@ -0,0 +1,133 @@
+"""Routing under overload: no admission control vs AdmissionController.
+
+A stand-in routing engine computes ``--capacity`` routes at a time, each
+taking ``--service-ms``; requests beyond that queue inside the engine, as
+they do on a real one. Route requests arrive at ``--overload`` times the
+engine's throughput for ``--seconds``, a ``--high-share`` of them from a
+high priority plan, and go through app.route_cache.fetch_route (which
+calls the engine with a ``--timeout`` client timeout, standing in for
+ROUTING_TIMEOUT) with
+
+* no admission control: every request waits on the engine, until it
+  answers or the timeout fires,
+* routing admission: ``--capacity`` calls in flight, the rest queued by
+  priority for at most ``--max-wait``, shed early with Overloaded.
+
+For each run prints, per priority, how many requests got a route, timed
+out or were turned away, the latency of those served, and the peak number
+of requests in the process.
+
+    python -m benchmarks.bench_routing_admission [--capacity 8] [--service-ms 50] [--overload 2]
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import httpx
+
+from app import http_clients, route_cache
+from app.admission import AdmissionController, Overloaded
+from app.schemas import RouteRequest
+
+HIGH, LOW = 10, 0
+ROUTE = json.dumps({"trip": {"legs": [{"maneuvers": [{"instruction": "Go"}], "shape": "_p~iF~ps|U"}]}}).encode()
+
+
+def engine(capacity: int, service_s: float):
+    slots = asyncio.Semaphore(capacity)
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        async with slots:
+            await asyncio.sleep(service_s)
+        return httpx.Response(200, content=ROUTE)
+
+    return handle
+
+
+def percentile(values, q):
+    return sorted(values)[min(int(len(values) * q / 100), len(values) - 1)] if values else None
+
+
+async def run(name: str, controller: AdmissionController, args):
+    route_cache.routing_admission = controller
+    route_cache.route_cache.clear()
+    http_clients._clients["routing"] = httpx.AsyncClient(
+        base_url="http://engine", transport=httpx.MockTransport(engine(args.capacity, args.service_ms / 1000)))
+    rng = random.Random(1)
+    # Fresh coordinates per run, so no request is a route cache hit.
+    coordinates = random.Random(name)
+    outcomes = {HIGH: [], LOW: []}
+    in_process = peak = 0
+
+    async def one(priority: int):
+        nonlocal in_process, peak
+        in_process += 1
+        peak = max(peak, in_process)
+        route_request = RouteRequest(locations=[
+            {"lat": coordinates.uniform(-80, 80), "lon": coordinates.uniform(-170, 170)} for _ in range(2)
+        ], costing="auto")
+        started = time.monotonic()
+        try:
+            _status, _route, cache_status = await asyncio.wait_for(
+                route_cache.fetch_route(route_request, route_cache.route_payload(route_request), priority),
+                args.timeout)
+            assert cache_status == "MISS"
+            outcomes[priority].append(("ok", time.monotonic() - started))
+        except asyncio.TimeoutError:
+            outcomes[priority].append(("timeout", time.monotonic() - started))
+        except Overloaded:
+            outcomes[priority].append(("rejected", time.monotonic() - started))
+        finally:
+            in_process -= 1
+
+    rate = args.overload * args.capacity / (args.service_ms / 1000)
+    tasks = []
+    started = time.monotonic()
+    for i in range(int(rate * args.seconds)):
+        # Open loop: arrivals don't slow down when responses do.
+        await asyncio.sleep(max(started + i / rate - time.monotonic(), 0))
+        tasks.append(asyncio.create_task(one(HIGH if rng.random() < args.high_share else LOW)))
+    await asyncio.gather(*tasks)
+    await http_clients._clients.pop("routing").aclose()
+
+    print(f"{name}: {len(tasks)} requests at {rate:.0f}/s, peak {peak} in the process")
+    for priority, label in ((HIGH, "high"), (LOW, "low")):
+        results = outcomes[priority]
+        served = [elapsed * 1000 for outcome, elapsed in results if outcome == "ok"]
+        rejected = [elapsed * 1000 for outcome, elapsed in results if outcome == "rejected"]
+        timeouts = sum(outcome == "timeout" for outcome, _ in results)
+        line = f"  {label:<4} served {len(served):5}  timed out {timeouts:5}  rejected {len(rejected):5}"
+        if served:
+            line += f"  served p50 {statistics.median(served):6.0f} ms  p99 {percentile(served, 99):6.0f} ms"
+        if rejected:
+            line += f"  rejected after p99 {percentile(rejected, 99):5.0f} ms"
+        print(line)
+    return outcomes
+
+
+async def main(args):
+    await run("no admission control", AdmissionController(limit=0, max_queue=0, max_wait=0), args)
+    controller = AdmissionController(limit=args.capacity, max_queue=args.max_queue, max_wait=args.max_wait)
+    outcomes = await run(f"admission ({args.capacity} in flight, wait <= {args.max_wait}s)", controller, args)
+    print(f"  {controller.stats()}")
+
+    high_served = [elapsed for outcome, elapsed in outcomes[HIGH] if outcome == "ok"]
+    assert not any(outcome == "timeout" for results in outcomes.values() for outcome, _ in results)
+    assert max(high_served) < args.max_wait + args.service_ms / 1000 * 2
+    assert controller.stats()["in_flight"] == 0 and controller.stats()["waiting"] == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capacity", type=int, default=8)
+    parser.add_argument("--service-ms", type=float, default=50)
+    parser.add_argument("--overload", type=float, default=2.0)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--high-share", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=3.0)
+    parser.add_argument("--max-wait", type=float, default=0.5)
+    parser.add_argument("--max-queue", type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,205 @@
+"""Query-plan and latency check for the lookups made on every request.
+
+Seeds a realistic number of rows into the database at DATABASE_URL (which
+must already be migrated to head), then runs EXPLAIN (ANALYZE) for each hot
+lookup and checks that
+
+* none of the listed tables is read with a sequential scan, and
+* the best of a few runs finishes inside its latency budget.
+
+Everything happens in one transaction that is rolled back at the end, so
+it can be pointed at a development database. Exits non-zero on any
+failure, which makes it usable as a CI step after migrations.
+
+    python -m benchmarks.check_query_plans [scale]
+"""
+import asyncio
+import sys
+from datetime import datetime
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.future import select
+
+from app.database import DATABASE_URL
+from app.models import APIUsage, AllowedDomain, Company, CompanySubscription, NavigationLog, Plan
+from app.partitions import PARTITIONED_TABLES, add_months, partition_ddl
+from app.quota import month_start, next_month
+
+DAYS_OF_HISTORY = 90
+RUNS = 5
+
+# Row counts at scale 1
+ROWS = {
+    "users": 5_000,
+    "companies": 500,
+    "subscriptions": 5_000,
+    "api_usages": 300_000,
+    "navigation_logs": 100_000,
+}
+
+
+async def _seed(conn, scale: float) -> dict:
+    counts = {name: max(10, int(rows * scale)) for name, rows in ROWS.items()}
+    this_month = add_months(datetime.utcnow(), 0)
+    for table in PARTITIONED_TABLES:
+        for offset in range(-(DAYS_OF_HISTORY // 28) - 1, 2):
+            await conn.execute(text(partition_ddl(table, add_months(this_month, offset))))
+
+    first_user = (await conn.execute(text(
+        "INSERT INTO users (name, email, is_active) "
+        "SELECT 'bench user ' || g, 'bench-' || g || '@example.com', true "
+        "FROM generate_series(1, :n) g RETURNING id"
+    ), {"n": counts["users"]})).scalars().all()[0]
+    first_company = (await conn.execute(text(
+        "INSERT INTO companies (name, contact_email, is_active) "
+        "SELECT 'bench company ' || g, 'company-' || g || '@example.com', true "
+        "FROM generate_series(1, :n) g RETURNING id"
+    ), {"n": counts["companies"]})).scalars().all()[0]
+    plan_id = (await conn.execute(text(
+        "INSERT INTO plans (name, price_monthly, api_hit_limit, concurrent_connections) "
+        "VALUES ('bench plan', 0, 1000000, 10) RETURNING id"
+    ))).scalar_one()
+    params = {
+        "first_user": first_user, "first_company": first_company, "plan_id": plan_id,
+        "users": counts["users"], "companies": counts["companies"], "subscriptions": counts["subscriptions"],
+        "days": DAYS_OF_HISTORY,
+    }
+    # One in five subscriptions is expired, so the active-only index matters.
+    first_subscription = (await conn.execute(text(
+        "INSERT INTO company_subscriptions (company_id, plan_id, api_key, start_date, end_date, status) "
+        "SELECT :first_company + g % :companies, :plan_id, 'bench-key-' || g, "
+        "now() - interval '30 days', now() + interval '335 days', "
+        "CASE WHEN g % 5 = 0 THEN 'expired' ELSE 'active' END "
+        "FROM generate_series(1, :subscriptions) g RETURNING id"
+    ), params)).scalars().all()[0]
+    params["first_subscription"] = first_subscription
+    await conn.execute(text(
+        "INSERT INTO allowed_domains (company_id, api_key, domain_name, is_active) "
+        "SELECT :first_company + g % :companies, 'bench-key-' || g, "
+        "'host-' || g || '-' || d || '.example.com', d <> 4 "
+        "FROM generate_series(1, :subscriptions) g, generate_series(1, 4) d"
+    ), params)
+    await conn.execute(text(
+        "INSERT INTO api_usages (company_id, subscription_id, endpoint, timestamp, status_code, response_time_ms) "
+        "SELECT :first_company + (g % :subscriptions) % :companies, :first_subscription + g % :subscriptions, "
+        "'/api/get-routes', now() - random() * :days * interval '1 day', 200, (random() * 300)::int "
+        "FROM generate_series(1, :n) g"
+    ), {**params, "n": counts["api_usages"]})
+    await conn.execute(text(
+        "INSERT INTO navigation_logs (user_id, start_place, destination, status, message, created_at) "
+        "SELECT :first_user + g % :users, 'A', 'B', true, 'Route calculated successfully', "
+        "now() - random() * :days * interval '1 day' "
+        "FROM generate_series(1, :n) g"
+    ), {**params, "n": counts["navigation_logs"]})
+    for table in ("users", "companies", "plans", "company_subscriptions", "allowed_domains",
+                  "api_usages", "navigation_logs"):
+        await conn.execute(text(f"ANALYZE {table}"))
+    return {**counts, "first_user": first_user, "first_subscription": first_subscription}
+
+
+def _checks(seeded: dict) -> list:
+    """(name, statement, tables that must not be seq-scanned, budget in ms)"""
+    api_key = "bench-key-42"
+    this_month = month_start()
+    return [
+        (
+            "api key -> subscription, plan, company",
+            select(CompanySubscription, Plan, Company)
+            .outerjoin(Plan, Plan.id == CompanySubscription.plan_id)
+            .outerjoin(Company, Company.id == CompanySubscription.company_id)
+            .where(CompanySubscription.api_key == api_key, CompanySubscription.status == "active"),
+            {"company_subscriptions", "companies"},
+            2.0,
+        ),
+        (
+            "allowed domain check",
+            select(AllowedDomain).where(
+                AllowedDomain.api_key == api_key,
+                AllowedDomain.domain_name == "host-42-1.example.com",
+                AllowedDomain.is_active == True
+            ),
+            {"allowed_domains"},
+            2.0,
+        ),
+        (
+            "monthly usage count (quota seed)",
+            select(func.count()).where(
+                APIUsage.subscription_id == seeded["first_subscription"] + 42,
+                APIUsage.timestamp >= this_month,
+                APIUsage.timestamp < next_month(this_month)
+            ),
+            {"api_usages"},
+            5.0,
+        ),
+        (
+            "recent navigation logs for a user",
+            select(NavigationLog.id, NavigationLog.created_at, NavigationLog.status)
+            .where(NavigationLog.user_id == seeded["first_user"] + 42)
+            .order_by(NavigationLog.created_at.desc())
+            .limit(20),
+            {"navigation_logs"},
+            5.0,
+        ),
+    ]
+
+
+def _scans(plan: dict):
+    """(node type, relation, index, rows read) for every node of a plan."""
+    rows_read = plan.get("Actual Rows", 0) + plan.get("Rows Removed by Filter", 0)
+    yield plan.get("Node Type"), plan.get("Relation Name"), plan.get("Index Name"), rows_read
+    for child in plan.get("Plans", []):
+        yield from _scans(child)
+
+
+def _parent_table(relation: str) -> str:
+    for table in PARTITIONED_TABLES:
+        if relation and relation.startswith(f"{table}_y"):
+            return table
+    return relation
+
+
+async def _explain(conn, statement):
+    sql = str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    best_ms, plan = None, None
+    for _ in range(RUNS):
+        result = (await conn.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}"))).scalar_one()
+        elapsed = result[0]["Execution Time"]
+        if best_ms is None or elapsed < best_ms:
+            best_ms, plan = elapsed, result[0]["Plan"]
+    return best_ms, plan
+
+
+async def main(scale: float) -> int:
+    engine = create_async_engine(DATABASE_URL)
+    failures = 0
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            seeded = await _seed(conn, scale)
+            print("seeded " + ", ".join(f"{name}={seeded[name]}" for name in ROWS))
+            for name, statement, tables, budget_ms in _checks(seeded):
+                best_ms, plan = await _explain(conn, statement)
+                scans = list(_scans(plan))
+                # Empty partitions (months ahead) are always seq-scanned; that's free.
+                seq_scanned = sorted({
+                    _parent_table(rel) for node, rel, _, rows_read in scans if node == "Seq Scan" and rows_read
+                } & tables)
+                indexes = sorted({index for _, _, index, _ in scans if index})
+                problems = []
+                if seq_scanned:
+                    problems.append(f"seq scan on {', '.join(seq_scanned)}")
+                if best_ms > budget_ms:
+                    problems.append(f"over budget ({budget_ms} ms)")
+                failures += bool(problems)
+                print(f"{'FAIL' if problems else 'ok  '} {name:<40} {best_ms:7.3f} ms  "
+                      f"{'; '.join(problems) or ', '.join(indexes[:3])}")
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)))
@@ -0,0 +1,82 @@
+"""Check of route request coalescing across the end of an upstream call.
+
+Starts one route request against a stand-in routing engine, then keeps
+starting identical ones, one per event loop step, from before the engine
+answers until well after it has. Every step in between is covered,
+including the one where the upstream call has finished but route_flight
+has not yet dropped it. Run once with the engine answering 200 (the route
+gets cached) and once with it answering 503 (nothing is cached, so later
+requests start new upstream calls). Checks that
+
+* no request fails, and each gets the engine's status,
+* with a 200, the engine is called exactly once, and
+* nothing is left in flight afterwards.
+
+A follower's priority promotion is exercised on every COALESCED request.
+Exits non-zero on any failure.
+
+    python -m benchmarks.check_route_coalescing [steps]
+"""
+import asyncio
+import json
+import sys
+from collections import Counter
+
+import httpx
+
+from app import http_clients, route_cache
+from app.admission import AdmissionController
+from app.schemas import RouteRequest
+
+ROUTE = json.dumps({"trip": {"legs": [{"maneuvers": [{"instruction": "Go"}], "shape": "_p~iF~ps|U"}]}}).encode()
+
+
+async def run(steps: int, status_code: int) -> bool:
+    calls = 0
+
+    async def engine(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        for _ in range(steps // 4):
+            await asyncio.sleep(0)
+        return httpx.Response(status_code, content=ROUTE)
+
+    route_cache.route_cache.clear()
+    route_cache.routing_admission = AdmissionController(limit=1, max_queue=steps, max_wait=5)
+    http_clients._clients["routing"] = httpx.AsyncClient(
+        base_url="http://engine", transport=httpx.MockTransport(engine))
+    route_request = RouteRequest(locations=[{"lat": 1.0, "lon": 2.0}, {"lat": 3.0, "lon": 4.0}], costing="auto")
+    payload = route_cache.route_payload(route_request)
+
+    tasks = []
+    for step in range(steps):
+        tasks.append(asyncio.create_task(route_cache.fetch_route(route_request, payload, priority=step % 3)))
+        await asyncio.sleep(0)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    await http_clients._clients.pop("routing").aclose()
+
+    failures = [result for result in results if isinstance(result, BaseException)]
+    statuses = Counter(result[2] for result in results if not isinstance(result, BaseException))
+    print(f"{status_code}, {steps} requests: {dict(statuses)}, {calls} upstream call(s), {len(failures)} failed")
+    for failure in failures[:5]:
+        print(f"  {failure!r}")
+
+    ok = (
+        not failures
+        and all(result[0] == status_code for result in results)
+        and statuses["COALESCED"] > 0
+        and (calls == 1 and statuses["HIT"] > 0 if status_code == 200 else calls > 1)
+        and not route_cache.route_flight.in_flight(route_cache.route_cache_key(route_request))
+        and route_cache.routing_admission.stats()["in_flight"] == 0
+    )
+    print("  OK" if ok else "  FAILED")
+    return ok
+
+
+async def main(steps: int) -> int:
+    results = [await run(steps, status_code) for status_code in (200, 503)]
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)))
@@ -0,0 +1,176 @@
+"""Minimal local SMTP server for exercising app.email_utils without a mail host.
+
+Speaks enough ESMTP for aiosmtplib (EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT,
+DATA, RSET, NOOP, QUIT), optionally over implicit TLS with a throwaway
+self-signed certificate, and can inject faults:
+
+* ``fail_data``: reply 451 to the next N DATA commands (transient failure),
+* ``drop_after``: close each connection after it has taken N messages,
+  like a server expiring idle or long-lived sessions,
+* ``reject``: recipients answered with 550,
+
+and can delay every reply by ``reply_delay`` seconds to stand in for the
+round trips to a remote mail host.
+
+Accepted messages are kept in ``messages``.
+
+    python -m benchmarks.smtp_standin [port]
+"""
+import asyncio
+import base64
+import datetime
+import ipaddress
+import os
+import ssl
+import sys
+import tempfile
+
+
+def self_signed_context():
+    """(server SSLContext, path of the certificate to trust) for 127.0.0.1."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))
+        ]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    directory = tempfile.mkdtemp(prefix="smtp-standin-")
+    cert_path, key_path = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    return context, cert_path
+
+
+class SMTPStandIn:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, tls: bool = False,
+                 username: str = None, password: str = None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.ssl_context, self.cert_path = self_signed_context() if tls else (None, None)
+        self.messages = []
+        self.connections = 0
+        self.fail_data = 0
+        self.drop_after = 0
+        self.reject = set()
+        self.reply_delay = 0.0
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._session, self.host, self.port, ssl=self.ssl_context)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def _check_auth(self, username: str, password: str) -> bool:
+        return self.username is None or (username, password) == (self.username, self.password)
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        taken = 0
+        authenticated = self.username is None
+
+        async def reply(line: str):
+            if self.reply_delay:
+                await asyncio.sleep(self.reply_delay)
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        try:
+            await reply("220 localhost SMTP stand-in")
+            sender, recipients = None, []
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command, _, argument = line.decode().rstrip("\r\n").partition(" ")
+                command = command.upper()
+                if command in ("EHLO", "HELO"):
+                    await reply("250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+                elif command == "AUTH":
+                    mechanism, _, initial = argument.partition(" ")
+                    if mechanism.upper() == "PLAIN":
+                        if not initial:
+                            await reply("334 ")
+                            initial = (await reader.readline()).decode().strip()
+                        _, username, password = base64.b64decode(initial).decode().split("\0")
+                    else:
+                        await reply("334 VXNlcm5hbWU6")
+                        username = base64.b64decode(await reader.readline()).decode()
+                        await reply("334 UGFzc3dvcmQ6")
+                        password = base64.b64decode(await reader.readline()).decode()
+                    authenticated = self._check_auth(username, password)
+                    await reply("235 Authenticated" if authenticated else "535 Authentication failed")
+                elif command == "MAIL":
+                    if not authenticated:
+                        await reply("530 Authentication required")
+                        continue
+                    sender, recipients = argument, []
+                    await reply("250 OK")
+                elif command == "RCPT":
+                    address = argument.split(":", 1)[-1].strip(" <>")
+                    if address in self.reject:
+                        await reply("550 No such user")
+                    else:
+                        recipients.append(address)
+                        await reply("250 OK")
+                elif command == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = []
+                    while (chunk := await reader.readline()) not in (b".\r\n", b""):
+                        data.append(chunk)
+                    if self.fail_data:
+                        self.fail_data -= 1
+                        await reply("451 Try again later")
+                        continue
+                    self.messages.append((sender, recipients, b"".join(data)))
+                    taken += 1
+                    await reply("250 Queued")
+                    if self.drop_after and taken >= self.drop_after:
+                        break
+                elif command == "RSET":
+                    sender, recipients = None, []
+                    await reply("250 OK")
+                elif command == "NOOP":
+                    await reply("250 OK")
+                elif command == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _serve(port: int):
+    server = await SMTPStandIn(port=port).start()
+    print(f"SMTP stand-in listening on 127.0.0.1:{server.port} (no TLS, any credentials)")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(_serve(int(sys.argv[1]) if len(sys.argv) > 1 else 2525))